@@ -5,21 +5,22 @@ SQLite-backed, swap to PostgreSQL via env var
 Fix: unixepoch() requires SQLite >= 3.38.
      Use strftime('%s','now') for compatibility with SQLite 3.37+.
 """
-import sqlite3, json, os, time
+import sqlite3, json, os, re, time, threading, weakref, hashlib, zlib, ipaddress
+from functools import lru_cache
 from pathlib import Path
 from contextlib import contextmanager
 from dataclasses import dataclass, asdict
-from typing import Optional, List
+from typing import Optional, Dict, List, Iterable, Iterator, Union
+from urllib.parse import urlsplit, parse_qsl
 from datetime import datetime
 
 DB_PATH = Path(os.getenv("SROF_DB", str(Path(__file__).parent.parent / "data" / "srof.db")))
 
 
 # ─── SCHEMA ──────────────────────────────────────────────────────────────────
+# Baseline schema (migration 1). Never edit it to change existing tables:
+# add a numbered migration below instead.
 SCHEMA = """
-PRAGMA journal_mode=WAL;
-PRAGMA foreign_keys=ON;
-
 CREATE TABLE IF NOT EXISTS workspaces (
     id          INTEGER PRIMARY KEY AUTOINCREMENT,
     name        TEXT NOT NULL UNIQUE,
@@ -107,26 +108,1107 @@ CREATE INDEX IF NOT EXISTS idx_jobs_status       ON scan_jobs(status);
 """
 
 
+# ─── MIGRATIONS ──────────────────────────────────────────────────────────────
+# Each migration upgrades the database by one step and is recorded in
+# PRAGMA user_version, so existing data/srof.db files are upgraded in place.
+MIGRATIONS: List[tuple] = []     # (version, description, fn(db))
+
+
+def migration(version: int, description: str):
+    """Register fn(db) as schema migration number `version`."""
+    def deco(fn):
+        if MIGRATIONS and version != MIGRATIONS[-1][0] + 1:
+            raise ValueError(f"Migration {version} out of order")
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return deco
+
+
+def _exec_script(db: sqlite3.Connection, script: str):
+    """Run a multi-statement script inside the current transaction
+    (executescript() would commit first)."""
+    stmt = ""
+    for line in script.splitlines(keepends=True):
+        stmt += line
+        if sqlite3.complete_statement(stmt):
+            db.execute(stmt)
+            stmt = ""
+    if stmt.strip():
+        db.execute(stmt)
+
+
+def _has_column(db: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(r[1] == column for r in db.execute(f"PRAGMA table_info({table})"))
+
+
+def schema_version(db: sqlite3.Connection) -> int:
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db: sqlite3.Connection) -> int:
+    """Apply pending migrations, one transaction each; return the new version."""
+    if schema_version(db) >= MIGRATIONS[-1][0]:
+        return schema_version(db)
+    for version, description, fn in MIGRATIONS:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock: another process may have won.
+            if schema_version(db) >= version:
+                db.rollback()
+                continue
+            fn(db)
+            db.execute(f"PRAGMA user_version={version}")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return schema_version(db)
+
+
+@migration(1, "baseline schema")
+def _m001_baseline(db):
+    _exec_script(db, SCHEMA)
+
+
+@migration(2, "dedup assets on (target_id, type, value); track last_seen and sources")
+def _m002_asset_dedup(db):
+    if not _has_column(db, "assets", "last_seen"):
+        db.execute("ALTER TABLE assets ADD COLUMN last_seen INTEGER")
+    if not _has_column(db, "assets", "sources"):
+        db.execute("ALTER TABLE assets ADD COLUMN sources TEXT DEFAULT '[]'")
+    db.execute("UPDATE assets SET last_seen = discovered_at,"
+               " sources = CASE WHEN source IS NULL OR source = '' THEN '[]'"
+               " ELSE json_array(source) END")
+
+    # Fold duplicates into the oldest row: merge metadata (later wins),
+    # union sources, widen the seen window and repoint vulnerabilities.
+    dupes = db.execute(
+        """SELECT target_id, type, value FROM assets
+           GROUP BY target_id, type, value HAVING COUNT(*) > 1"""
+    ).fetchall()
+    for key in dupes:
+        rows = db.execute(
+            """SELECT id, source, metadata, discovered_at FROM assets
+               WHERE target_id IS ? AND type=? AND value=? ORDER BY id""",
+            tuple(key)
+        ).fetchall()
+        keep, drop = rows[0]["id"], [r["id"] for r in rows[1:]]
+        meta, sources = {}, []
+        for r in rows:
+            try:
+                meta.update(json.loads(r["metadata"] or "{}"))
+            except ValueError:
+                pass
+            if r["source"] and r["source"] not in sources:
+                sources.append(r["source"])
+        db.execute(
+            "UPDATE assets SET metadata=?, sources=?, discovered_at=?, last_seen=? WHERE id=?",
+            (json.dumps(meta), json.dumps(sources),
+             min(r["discovered_at"] or 0 for r in rows),
+             max(r["discovered_at"] or 0 for r in rows), keep)
+        )
+        marks = ",".join("?" * len(drop))
+        db.execute(f"UPDATE vulnerabilities SET asset_id=? WHERE asset_id IN ({marks})",
+                   (keep, *drop))
+        db.execute(f"DELETE FROM assets WHERE id IN ({marks})", drop)
+
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_assets_key"
+               " ON assets(target_id, type, value)")
+
+
+SEVERITY_RANK = {"critical": 1, "high": 2, "medium": 3, "low": 4, "info": 5}
+
+
+@migration(3, "severity_rank column, denormalized workspace_id and listing indexes")
+def _m003_vuln_listing_indexes(db):
+    rank = " ".join(f"WHEN '{k}' THEN {v}" for k, v in SEVERITY_RANK.items())
+    if not _has_column(db, "vulnerabilities", "severity_rank"):
+        db.execute("ALTER TABLE vulnerabilities ADD COLUMN severity_rank INTEGER"
+                   f" GENERATED ALWAYS AS (CASE severity {rank} ELSE 6 END) VIRTUAL")
+    # Vulns are always listed per workspace; carrying workspace_id on the row
+    # lets one index serve filter + sort without touching targets first.
+    if not _has_column(db, "vulnerabilities", "workspace_id"):
+        db.execute("ALTER TABLE vulnerabilities ADD COLUMN workspace_id INTEGER"
+                   " REFERENCES workspaces(id) ON DELETE CASCADE")
+    db.execute("UPDATE vulnerabilities SET workspace_id ="
+               " (SELECT workspace_id FROM targets WHERE targets.id = target_id)")
+    _exec_script(db, """
+        CREATE INDEX IF NOT EXISTS idx_vulns_target_rank ON vulnerabilities(target_id, severity_rank, id);
+        CREATE INDEX IF NOT EXISTS idx_vulns_ws_rank     ON vulnerabilities(workspace_id, severity_rank, id);
+        CREATE INDEX IF NOT EXISTS idx_vulns_ws_severity ON vulnerabilities(workspace_id, severity);
+        CREATE INDEX IF NOT EXISTS idx_vulns_workspace   ON vulnerabilities(workspace_id);
+    """)
+
+
+# Hot keys emitted by httpx / nmap / nuclei, exposed as indexable columns.
+ASSET_JSON_COLUMNS = {
+    "status_code": ("$.status_code", "INTEGER"),
+    "port":        ("$.port",        "INTEGER"),
+    "service":     ("$.service",     "TEXT"),
+    "is_cdn":      ("$.is_cdn",      "INTEGER"),
+}
+VULN_JSON_COLUMNS = {
+    "template_id": ("$.template_id", "TEXT"),
+}
+
+
+def _add_json_column(db, table: str, source: str, name: str, path: str, sqltype: str):
+    if not _has_column(db, table, name):
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sqltype} GENERATED ALWAYS AS"
+                   f" (CASE WHEN json_valid({source})"
+                   f" THEN json_extract({source}, '{path}') END) VIRTUAL")
+
+
+@migration(4, "generated columns and indexes for hot metadata/evidence keys")
+def _m004_json_columns(db):
+    for name, (path, sqltype) in ASSET_JSON_COLUMNS.items():
+        _add_json_column(db, "assets", "metadata", name, path, sqltype)
+        db.execute(f"CREATE INDEX IF NOT EXISTS idx_assets_{name} ON assets(target_id, {name})"
+                   f" WHERE {name} IS NOT NULL")
+    for name, (path, sqltype) in VULN_JSON_COLUMNS.items():
+        _add_json_column(db, "vulnerabilities", "evidence", name, path, sqltype)
+        db.execute(f"CREATE INDEX IF NOT EXISTS idx_vulns_{name}"
+                   f" ON vulnerabilities(workspace_id, {name}) WHERE {name} IS NOT NULL")
+
+    # technologies is an array, so membership needs a side table rather
+    # than an expression index; triggers keep it in step with metadata.
+    _exec_script(db, """
+        CREATE TABLE IF NOT EXISTS asset_technologies (
+            asset_id INTEGER NOT NULL REFERENCES assets(id) ON DELETE CASCADE,
+            tech     TEXT NOT NULL COLLATE NOCASE,
+            PRIMARY KEY (tech, asset_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_asset_tech_asset ON asset_technologies(asset_id);
+
+        CREATE TRIGGER IF NOT EXISTS trg_assets_tech_ins AFTER INSERT ON assets
+        WHEN json_valid(NEW.metadata) BEGIN
+            INSERT OR IGNORE INTO asset_technologies(asset_id, tech)
+            SELECT NEW.id, value FROM json_each(NEW.metadata, '$.technologies')
+            WHERE json_type(NEW.metadata, '$.technologies') = 'array';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_assets_tech_upd AFTER UPDATE OF metadata ON assets
+        WHEN json_valid(NEW.metadata) BEGIN
+            DELETE FROM asset_technologies WHERE asset_id = NEW.id;
+            INSERT OR IGNORE INTO asset_technologies(asset_id, tech)
+            SELECT NEW.id, value FROM json_each(NEW.metadata, '$.technologies')
+            WHERE json_type(NEW.metadata, '$.technologies') = 'array';
+        END;
+
+        INSERT OR IGNORE INTO asset_technologies(asset_id, tech)
+        SELECT a.id, j.value FROM assets a, json_each(a.metadata, '$.technologies') j
+        WHERE json_valid(a.metadata) AND json_type(a.metadata, '$.technologies') = 'array';
+    """)
+
+
+# Full-text indexes. Each FTS table carries the owning workspace as an
+# indexed `ws` column, so a workspace-scoped search is a single FTS lookup
+# (ws AND text) instead of a MATCH followed by joins and filtering.
+FTS_TABLES = {
+    # kind:  (fts table,    base table,        indexed text columns)
+    "vuln":  ("fts_vulns",  "vulnerabilities", ("name", "description", "evidence")),
+    "asset": ("fts_assets", "assets",          ("value", "metadata")),
+    "log":   ("fts_logs",   "plugin_logs",     ("message",)),
+}
+_FTS_WS = {
+    "vuln":  "NEW.workspace_id",
+    "asset": "(SELECT workspace_id FROM targets WHERE id = NEW.target_id)",
+    "log":   "(SELECT workspace_id FROM scan_jobs WHERE id = NEW.job_id)",
+}
+
+
+def _fts5_available(db) -> bool:
+    try:
+        db.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        db.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _fts_triggers(db, kind: str) -> str:
+    """
+    The triggers that keep one FTS table in step with its base table. They
+    are plain SQL, so any connection (the sqlite3 CLI, a backup tool, an
+    older SROF) can still write the base tables. For vulnerabilities they
+    index the row's inline evidence keys; VulnRepo adds the full evidence
+    text from Python (see _fts_put_evidence).
+    """
+    fts, base, cols = FTS_TABLES[kind]
+    col_list = ", ".join(cols)
+    new_vals = ", ".join(f"NEW.{c}" for c in cols)
+    ws = _FTS_WS[kind]
+    # evidence_ref arrives with migration 10; before it the UPDATE trigger
+    # must not name it (SQLite only resolves the column when it fires).
+    watched = cols + (("evidence_ref",) if _has_column(db, base, "evidence_ref") else ())
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_ins AFTER INSERT ON {base} BEGIN
+            INSERT INTO {fts}(rowid, ws, {col_list}) VALUES(NEW.id, {ws}, {new_vals});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_del AFTER DELETE ON {base} BEGIN
+            DELETE FROM {fts} WHERE rowid = OLD.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_upd AFTER UPDATE OF {", ".join(watched)} ON {base}
+        WHEN {" OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in watched)} BEGIN
+            DELETE FROM {fts} WHERE rowid = OLD.id;
+            INSERT INTO {fts}(rowid, ws, {col_list}) VALUES(NEW.id, {ws}, {new_vals});
+        END;
+    """
+
+
+def _fts_fill(db, kind: str):
+    """Index every row of the kind's base table into its (empty) FTS table."""
+    fts, base, cols = FTS_TABLES[kind]
+    col_list = ", ".join(cols)
+    ws = _FTS_WS[kind].replace("NEW.", f"{base}.")
+    db.execute(f"INSERT INTO {fts}(rowid, ws, {col_list}) SELECT id, {ws}, {col_list} FROM {base}")
+    if kind == "vuln" and _has_column(db, base, "evidence_ref"):
+        SearchRepo.index_evidence_in(db)
+
+
+def _fts_create(db, kind: str):
+    """Create one FTS table, its ranking and its triggers."""
+    fts, _, cols = FTS_TABLES[kind]
+    # Regular (not external-content) tables: deletes only need the
+    # rowid, so cascading deletes of targets/jobs stay consistent.
+    _exec_script(db, f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            ws, {", ".join(cols)}, tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3');
+        INSERT INTO {fts}({fts}, rank)
+            VALUES('rank', 'bm25(0{", 1" * len(cols)})');
+    """ + _fts_triggers(db, kind))
+
+
+def _ensure_fts(db) -> bool:
+    """
+    Create and fill the FTS tables a database lacks. Migration 5 skips them
+    under an SQLite without FTS5; this runs on each database's first
+    connection (and SearchRepo.rebuild), so they appear once FTS5 does.
+    Returns False while FTS5 is unavailable.
+    """
+    def missing():
+        have = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        return [k for k, (fts, _, _) in FTS_TABLES.items() if fts not in have]
+
+    if not missing():
+        return True
+    if not _fts5_available(db):
+        return False
+    own = not db.in_transaction
+    if own:
+        db.execute("BEGIN IMMEDIATE")
+    try:
+        for kind in missing():              # re-check under the write lock
+            _fts_create(db, kind)
+            _fts_fill(db, kind)
+        if own:
+            db.commit()
+    except Exception:
+        if own:
+            db.rollback()
+        raise
+    return True
+
+
+@migration(5, "FTS5 search over vulnerabilities, assets and plugin_logs")
+def _m005_fts(db):
+    if not _fts5_available(db):
+        return      # _ensure_fts creates them once SQLite has FTS5
+    for kind in FTS_TABLES:
+        _fts_create(db, kind)
+        _fts_fill(db, kind)
+
+
+# Counters behind dashboards and reports, kept current by triggers so
+# reading them never scans vulnerabilities or assets.
+STATS_DIMENSIONS = {
+    # dimension:  (base table,       column,     workspace expression)
+    "severity":   ("vulnerabilities", "severity",  "{row}.workspace_id"),
+    "plugin":     ("vulnerabilities", "plugin_id", "{row}.workspace_id"),
+    "status":     ("vulnerabilities", "status",    "{row}.workspace_id"),
+    "asset_type": ("assets",          "type",
+                   "(SELECT workspace_id FROM targets WHERE id = {row}.target_id)"),
+}
+
+
+def _stats_bump(dimension: str, row: str, delta: int) -> str:
+    base, col, ws = STATS_DIMENSIONS[dimension]
+    ws = ws.format(row=row)
+    return f"""
+        INSERT INTO workspace_stats(workspace_id, dimension, key, count)
+        SELECT {ws}, '{dimension}', {row}.{col}, {delta} WHERE {ws} IS NOT NULL
+        ON CONFLICT(workspace_id, dimension, key) DO UPDATE SET count = count + ({delta});"""
+
+
+@migration(6, "trigger-maintained workspace_stats summary table")
+def _m006_workspace_stats(db):
+    _exec_script(db, """
+        CREATE TABLE IF NOT EXISTS workspace_stats (
+            workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+            dimension    TEXT NOT NULL,    -- severity|plugin|status|asset_type
+            key          TEXT NOT NULL,
+            count        INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (workspace_id, dimension, key)
+        ) WITHOUT ROWID;
+    """)
+    for base in ("vulnerabilities", "assets"):
+        dims = [d for d, spec in STATS_DIMENSIONS.items() if spec[0] == base]
+        cols = [STATS_DIMENSIONS[d][1] for d in dims]
+        ins = "".join(_stats_bump(d, "NEW", 1) for d in dims)
+        dele = "".join(_stats_bump(d, "OLD", -1) for d in dims)
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in cols)
+        ws_col = "workspace_id, " if base == "vulnerabilities" else "target_id, "
+        _exec_script(db, f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{base}_stats_ins AFTER INSERT ON {base}
+            BEGIN {ins}
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{base}_stats_del AFTER DELETE ON {base}
+            BEGIN {dele}
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{base}_stats_upd
+            AFTER UPDATE OF {ws_col}{", ".join(cols)} ON {base}
+            WHEN {changed} OR OLD.{ws_col.strip(", ")} IS NOT NEW.{ws_col.strip(", ")}
+            BEGIN {dele} {ins}
+            END;
+        """)
+    # Cascaded asset deletes run after their target row is gone, when the
+    # workspace can no longer be looked up; settle those counts up front.
+    _exec_script(db, """
+        CREATE TRIGGER IF NOT EXISTS trg_targets_stats_del BEFORE DELETE ON targets
+        BEGIN
+            UPDATE workspace_stats SET count = count - (
+                SELECT COUNT(*) FROM assets
+                WHERE target_id = OLD.id AND type = workspace_stats.key)
+            WHERE workspace_id = OLD.workspace_id AND dimension = 'asset_type';
+        END;
+    """)
+    _rebuild_stats(db)
+
+
+def _rebuild_stats(db, workspace_id: int = None):
+    where = "" if workspace_id is None else f" WHERE workspace_id = {int(workspace_id)}"
+    db.execute("DELETE FROM workspace_stats" + where)
+    for dimension, (base, col, ws) in STATS_DIMENSIONS.items():
+        ws = ws.format(row=base)
+        q = (f"SELECT {ws} AS ws, '{dimension}', {col}, COUNT(*) FROM {base}"
+             f" GROUP BY ws, {col} HAVING ws IS NOT NULL")
+        if workspace_id is not None:
+            q += f" AND ws = {int(workspace_id)}"
+        db.execute("INSERT INTO workspace_stats(workspace_id, dimension, key, count) " + q)
+
+
+# ─── FINGERPRINTS ────────────────────────────────────────────────────────────
+def normalize_location(location: str) -> str:
+    """
+    Canonical form of where a finding was seen: lower-cased scheme/host,
+    default ports dropped, query reduced to its sorted parameter names,
+    fragment and trailing slash removed. Non-URLs are lower-cased.
+    """
+    location = (location or "").strip()
+    if "://" not in location:
+        return location.lower().rstrip("/")
+    u = urlsplit(location)
+    host = (u.hostname or "").lower()
+    try:
+        port = u.port
+    except ValueError:
+        port = None
+    if port and (u.scheme.lower(), port) not in (("http", 80), ("https", 443)):
+        host += f":{port}"
+    params = sorted({k for k, _ in parse_qsl(u.query, keep_blank_values=True)})
+    path = u.path.rstrip("/") or "/"
+    return f"{u.scheme.lower()}://{host}{path}" + (f"?{'&'.join(params)}" if params else "")
+
+
+def vuln_fingerprint(plugin_id: str, name: str, location: str = "",
+                     evidence: dict = None, metadata: dict = None) -> str:
+    """
+    Stable identity of a finding across runs: plugin + what was found
+    (template id, vuln type or name) + normalized location.
+    """
+    evidence, metadata = evidence or {}, metadata or {}
+    kind = (evidence.get("template_id") or metadata.get("vuln_type")
+            or metadata.get("detector") or name)
+    key = "\x1f".join((plugin_id or "", str(kind), normalize_location(location)))
+    return hashlib.sha1(key.encode("utf-8", "replace")).hexdigest()
+
+
+# Evidence keys tools used for the place a finding was seen.
+_LEGACY_LOCATION_KEYS = ("matched-at", "matched_at", "url", "location", "host")
+# Columns that differ between repeats of one finding from separate runs.
+_VULN_ROW_VOLATILE = {"id", "found_at", "location", "fingerprint", "last_seen",
+                      "occurrences", "first_job_id", "job_id"}
+
+
+def _legacy_location(db, row, evidence: dict) -> tuple:
+    """(location, metadata) of a row written before vulns stored them."""
+    for k in _LEGACY_LOCATION_KEYS:
+        if isinstance(evidence.get(k), str) and evidence[k]:
+            return evidence[k], {}
+    return "", {}
+
+
+def _legacy_xray(db, row, evidence: dict) -> tuple:
+    # Written as name "Xray: <TYPE> at <url>", description "Xray detected <type>".
+    detail = evidence.get("detail") if isinstance(evidence.get("detail"), dict) else {}
+    url = detail.get("addr") or (row["name"] or "").partition(" at ")[2]
+    desc = row["description"] or ""
+    vuln_type = desc[len("Xray detected "):] if desc.startswith("Xray detected ") else ""
+    return url, ({"vuln_type": vuln_type} if vuln_type else {})
+
+
+def _legacy_nuclei(db, row, evidence: dict) -> tuple:
+    # matched-at was not kept; rebuild it from the raw request and the target's scheme.
+    head, _, headers = str(evidence.get("request") or "").partition("\n")
+    parts = head.split()
+    host = re.search(r"(?im)^host:\s*(\S+)", headers)
+    if len(parts) < 2 or not host:
+        return _legacy_location(db, row, evidence)
+    if "://" in parts[1]:
+        return parts[1], {}
+    target = db.execute("SELECT scheme FROM targets WHERE id=?", (row["target_id"],)).fetchone()
+    return f"{(target and target['scheme']) or 'https'}://{host.group(1)}{parts[1]}", {}
+
+
+_LEGACY_EXTRACTORS = {"scan.xray": _legacy_xray, "scan.nuclei": _legacy_nuclei}
+
+
+@migration(7, "vulnerability fingerprints, occurrence tracking and job provenance")
+def _m007_vuln_fingerprints(db):
+    for col, sqltype in (("location", "TEXT"), ("fingerprint", "TEXT"),
+                         ("last_seen", "INTEGER"), ("occurrences", "INTEGER DEFAULT 1"),
+                         ("first_job_id", "INTEGER"), ("job_id", "INTEGER")):
+        if not _has_column(db, "vulnerabilities", col):
+            db.execute(f"ALTER TABLE vulnerabilities ADD COLUMN {col} {sqltype}")
+
+    # Rows written before this migration never stored where they were found
+    # (nor the finding's metadata); recover both from what the tools wrote,
+    # so the backfilled fingerprints match the ones the next scan computes.
+    seen, kept = {}, {}
+    for r in db.execute("SELECT * FROM vulnerabilities ORDER BY id").fetchall():
+        try:
+            evidence = json.loads(r["evidence"] or "{}")
+        except ValueError:
+            evidence = {}
+        location, metadata = r["location"], {}
+        if not location:
+            extract = _LEGACY_EXTRACTORS.get(r["plugin_id"], _legacy_location)
+            location, metadata = extract(db, r, evidence)
+        fp = vuln_fingerprint(r["plugin_id"], r["name"], location, evidence, metadata)
+        same = tuple(r[k] for k in r.keys() if k not in _VULN_ROW_VOLATILE)
+        key = (r["target_id"], fp)
+        if kept.get(key) == same:
+            # An identical row from an earlier scan run: fold it into the first.
+            db.execute("UPDATE vulnerabilities SET occurrences = occurrences + 1,"
+                       " last_seen = max(coalesce(last_seen, 0), ?) WHERE id=?",
+                       (r["found_at"] or 0, seen[key]))
+            db.execute("DELETE FROM vulnerabilities WHERE id=?", (r["id"],))
+            continue
+        if key in seen:
+            # Same fingerprint but not the same finding: keep it under one of
+            # its own; the first row keeps the fingerprint rescans will match.
+            fp = hashlib.sha1(f"{fp}\x1f{r['id']}".encode()).hexdigest()
+        else:
+            seen[key], kept[key] = r["id"], same
+        db.execute("UPDATE vulnerabilities SET location=?, fingerprint=?, occurrences=1,"
+                   " last_seen=found_at WHERE id=?", (location, fp, r["id"]))
+
+    _exec_script(db, """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_vulns_fingerprint ON vulnerabilities(target_id, fingerprint);
+        CREATE INDEX IF NOT EXISTS idx_vulns_job       ON vulnerabilities(job_id);
+        CREATE INDEX IF NOT EXISTS idx_vulns_first_job ON vulnerabilities(first_job_id);
+    """)
+
+
+@migration(8, "job provenance on assets; workspace-scoped provenance indexes")
+def _m008_asset_provenance(db):
+    for col in ("first_job_id", "job_id"):
+        if not _has_column(db, "assets", col):
+            db.execute(f"ALTER TABLE assets ADD COLUMN {col} INTEGER")
+    _exec_script(db, """
+        CREATE INDEX IF NOT EXISTS idx_assets_job       ON assets(target_id, job_id);
+        CREATE INDEX IF NOT EXISTS idx_assets_first_job ON assets(target_id, first_job_id);
+        CREATE INDEX IF NOT EXISTS idx_vulns_ws_job       ON vulnerabilities(workspace_id, job_id);
+        CREATE INDEX IF NOT EXISTS idx_vulns_ws_first_job ON vulnerabilities(workspace_id, first_job_id);
+    """)
+
+
+@migration(9, "plugin_logs indexes for retention and per-job access")
+def _m009_log_indexes(db):
+    _exec_script(db, """
+        CREATE INDEX IF NOT EXISTS idx_logs_job ON plugin_logs(job_id);
+        CREATE INDEX IF NOT EXISTS idx_logs_ts  ON plugin_logs(ts);
+    """)
+
+
+# ─── EVIDENCE ────────────────────────────────────────────────────────────────
+# Evidence (full HTTP requests/responses, scanner detail dicts) lives in
+# evidence_blobs, keyed by the sha256 of its canonical JSON, so identical
+# evidence is stored once and vulnerabilities rows stay small. The row
+# keeps the hash in evidence_ref plus the keys behind VULN_JSON_COLUMNS.
+EVIDENCE_COMPRESS_MIN = 256         # bytes; smaller blobs are stored raw
+
+
+def _evidence_json(evidence: dict) -> str:
+    return json.dumps(evidence, sort_keys=True, separators=(",", ":"))
+
+
+def _evidence_pack(text: str) -> tuple:
+    """(codec, size, data) for a canonical evidence JSON string."""
+    raw = text.encode("utf-8")
+    if len(raw) >= EVIDENCE_COMPRESS_MIN:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return "zlib", len(raw), packed
+    return "raw", len(raw), raw
+
+
+def _evidence_text(codec: str, data: bytes) -> Optional[str]:
+    """
+    Inverse of _evidence_pack; registered as SQL function evidence_text()
+    on SROF's own connections (for queries only, never in triggers).
+    """
+    if data is None:
+        return None
+    if codec == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+
+def _evidence_index_keys(evidence: dict) -> dict:
+    """The evidence keys behind VULN_JSON_COLUMNS, kept inline on the row."""
+    keys = (path[2:] for path, _ in VULN_JSON_COLUMNS.values())
+    return {k: evidence[k] for k in keys if k in evidence}
+
+
+def _fts_put_evidence(db, pairs: list):
+    """
+    Index the full evidence of freshly written vulnerabilities, given as
+    (evidence dict, vuln id), over what the triggers indexed.
+    """
+    rows = [(_evidence_json(ev), vid) for ev, vid in pairs if ev]
+    if rows and db.execute("SELECT 1 FROM sqlite_master WHERE name='fts_vulns'").fetchone():
+        db.executemany("UPDATE fts_vulns SET evidence=? WHERE rowid=?", rows)
+
+
+@migration(10, "content-addressed, compressed evidence store")
+def _m010_evidence_store(db):
+    _exec_script(db, """
+        CREATE TABLE IF NOT EXISTS evidence_blobs (
+            hash  TEXT PRIMARY KEY,        -- sha256 of the canonical JSON
+            codec TEXT NOT NULL,           -- zlib|raw
+            size  INTEGER NOT NULL,        -- uncompressed bytes
+            data  BLOB NOT NULL
+        );
+    """)
+    if not _has_column(db, "vulnerabilities", "evidence_ref"):
+        db.execute("ALTER TABLE vulnerabilities ADD COLUMN evidence_ref TEXT")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_vulns_evidence_ref"
+               " ON vulnerabilities(evidence_ref) WHERE evidence_ref IS NOT NULL")
+
+    # The old FTS triggers read NEW.evidence; the FTS rows already hold the
+    # same text, so drop them while the JSON moves out and recreate below.
+    fts = db.execute("SELECT 1 FROM sqlite_master WHERE name='fts_vulns'").fetchone()
+    db.execute("DROP TRIGGER IF EXISTS trg_fts_vulns_ins")
+    db.execute("DROP TRIGGER IF EXISTS trg_fts_vulns_upd")
+
+    last = 0
+    while True:
+        rows = db.execute(
+            "SELECT id, evidence FROM vulnerabilities WHERE id > ? AND evidence_ref IS NULL"
+            " AND evidence IS NOT NULL AND evidence NOT IN ('', '{}') ORDER BY id LIMIT 1000",
+            (last,)).fetchall()
+        if not rows:
+            break
+        last = rows[-1]["id"]
+        moved = []
+        for r in rows:
+            try:
+                evidence = json.loads(r["evidence"])
+            except ValueError:
+                continue
+            if isinstance(evidence, dict) and evidence:
+                moved.append((r["id"], evidence))
+        refs = EvidenceStore.put_many(db, [ev for _, ev in moved])
+        db.executemany("UPDATE vulnerabilities SET evidence=?, evidence_ref=? WHERE id=?",
+                       [(json.dumps(_evidence_index_keys(ev)), ref, vid)
+                        for (vid, ev), ref in zip(moved, refs)])
+
+    if fts:
+        _exec_script(db, _fts_triggers(db, "vuln"))
+
+
+@migration(11, "scan_jobs.spool_seq: last findings-spool line committed")
+def _m011_spool_seq(db):
+    if not _has_column(db, "scan_jobs", "spool_seq"):
+        db.execute("ALTER TABLE scan_jobs ADD COLUMN spool_seq INTEGER DEFAULT 0")
+
+
+# ─── INVENTORY ───────────────────────────────────────────────────────────────
+# Hosts, addresses, services and URLs normalized out of asset values such
+# as "host:port" or "host → ip", so correlation ("HTTP services on hosts
+# resolving into 10.0.0.0/8") is indexed SQL rather than string parsing.
+# Addresses are stored as 16-byte BLOBs (IPv4 mapped into ::ffff:0:0/96):
+# BLOBs compare bytewise, so a CIDR is a BETWEEN range on an index.
+_FSCAN_OPEN = re.compile(r"^(?:\[[^\]]*\]\s*)?(\S+?):(\d+)\s+open\b", re.I)
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def ip_key(addr: str) -> bytes:
+    """16-byte sort key of an IPv4/IPv6 address."""
+    ip = ipaddress.ip_address(addr)
+    return ip.packed if ip.version == 6 else b"\0" * 10 + b"\xff\xff" + ip.packed
+
+
+def cidr_range(cidr: str) -> tuple:
+    """(low, high) ip_key bounds of a network."""
+    net = ipaddress.ip_network(cidr, strict=False)
+    return ip_key(str(net.network_address)), ip_key(str(net.broadcast_address))
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def inventory_facts(asset_type: str, value: str, metadata: dict = None) -> dict:
+    """
+    What an asset says about the inventory: any of host, ip, port,
+    protocol, service, product, version, url, status_code.
+    """
+    meta, value = metadata or {}, (value or "").strip()
+    fact = {}
+    if asset_type == "dns":                               # DnsResolvePlugin
+        fact = {"host": meta.get("host"), "ip": meta.get("ip")}
+    elif asset_type == "service" and meta.get("port"):     # NmapPlugin
+        fact = {"host": value.rpartition(":")[0].strip("[]"), "port": meta.get("port"),
+                "protocol": meta.get("protocol") or "tcp", "service": meta.get("service"),
+                "product": meta.get("product"), "version": meta.get("version")}
+    elif "://" in value:                                  # httpx, ffuf, ...
+        u = urlsplit(value)
+        scheme = u.scheme.lower()
+        try:
+            port = u.port or _DEFAULT_PORTS.get(scheme)
+        except ValueError:
+            port = None
+        fact = {"host": u.hostname, "port": port, "protocol": "tcp", "service": scheme,
+                "url": value, "status_code": meta.get("status_code")}
+    elif asset_type == "subdomain":                       # SubfinderPlugin
+        fact = {"host": value}
+    else:
+        m = _FSCAN_OPEN.match(value)                      # FscanPlugin "ip:port open"
+        if m:
+            fact = {"host": m.group(1), "port": int(m.group(2)), "protocol": "tcp"}
+    host = (fact.get("host") or "").strip().lower().rstrip(".")
+    if not host:
+        return {}
+    fact["host"] = host
+    if not fact.get("ip") and _is_ip(host):
+        fact["ip"] = host
+    if fact.get("ip") and not _is_ip(fact["ip"]):
+        fact.pop("ip")
+    return {k: v for k, v in fact.items() if v not in (None, "")}
+
+
+@migration(12, "normalized host/ip/service/url inventory tables")
+def _m012_inventory(db):
+    _exec_script(db, """
+        CREATE TABLE IF NOT EXISTS hosts (
+            id           INTEGER PRIMARY KEY,
+            workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+            name         TEXT NOT NULL,          -- lower-case DNS name or IP literal
+            first_seen   INTEGER DEFAULT (strftime('%s', 'now')),
+            last_seen    INTEGER DEFAULT (strftime('%s', 'now')),
+            UNIQUE(workspace_id, name)
+        );
+        CREATE TABLE IF NOT EXISTS ips (
+            id           INTEGER PRIMARY KEY,
+            workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+            addr         TEXT NOT NULL,
+            ip_key       BLOB NOT NULL,          -- see ip_key()
+            UNIQUE(workspace_id, ip_key)
+        );
+        CREATE TABLE IF NOT EXISTS host_ips (
+            host_id INTEGER NOT NULL REFERENCES hosts(id) ON DELETE CASCADE,
+            ip_id   INTEGER NOT NULL REFERENCES ips(id) ON DELETE CASCADE,
+            PRIMARY KEY (host_id, ip_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_host_ips_ip ON host_ips(ip_id, host_id);
+        CREATE TABLE IF NOT EXISTS services (
+            id           INTEGER PRIMARY KEY,
+            workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+            host_id      INTEGER NOT NULL REFERENCES hosts(id) ON DELETE CASCADE,
+            port         INTEGER NOT NULL,
+            protocol     TEXT NOT NULL DEFAULT 'tcp',
+            name         TEXT,                   -- http|https|ssh|...
+            product      TEXT,
+            version      TEXT,
+            last_seen    INTEGER DEFAULT (strftime('%s', 'now')),
+            UNIQUE(host_id, port, protocol)
+        );
+        CREATE INDEX IF NOT EXISTS idx_services_ws_name ON services(workspace_id, name, port);
+        CREATE INDEX IF NOT EXISTS idx_services_ws_port ON services(workspace_id, port);
+        CREATE TABLE IF NOT EXISTS urls (
+            id           INTEGER PRIMARY KEY,
+            workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+            host_id      INTEGER NOT NULL REFERENCES hosts(id) ON DELETE CASCADE,
+            service_id   INTEGER REFERENCES services(id) ON DELETE SET NULL,
+            asset_id     INTEGER REFERENCES assets(id) ON DELETE SET NULL,
+            url          TEXT NOT NULL,
+            status_code  INTEGER,
+            last_seen    INTEGER DEFAULT (strftime('%s', 'now')),
+            UNIQUE(workspace_id, url)
+        );
+        CREATE INDEX IF NOT EXISTS idx_urls_host   ON urls(host_id);
+        CREATE INDEX IF NOT EXISTS idx_urls_status ON urls(workspace_id, status_code);
+        CREATE INDEX IF NOT EXISTS idx_urls_asset  ON urls(asset_id);
+    """)
+    InventoryRepo.rebuild_in(db)
+
+
+@migration(13, "job_targets: per-target progress of multi-target jobs")
+def _m013_job_targets(db):
+    _exec_script(db, """
+        CREATE TABLE IF NOT EXISTS job_targets (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id       INTEGER NOT NULL REFERENCES scan_jobs(id) ON DELETE CASCADE,
+            target_id    INTEGER NOT NULL REFERENCES targets(id) ON DELETE CASCADE,
+            status       TEXT DEFAULT 'queued',  -- queued|running|done|error|cancelled
+            findings     INTEGER DEFAULT 0,
+            started_at   INTEGER,
+            finished_at  INTEGER,
+            error_msg    TEXT,
+            UNIQUE(job_id, target_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_job_targets_status ON job_targets(job_id, status);
+        CREATE INDEX IF NOT EXISTS idx_job_targets_target ON job_targets(target_id);
+    """)
+
+
+@migration(14, "FTS triggers on vulnerabilities in plain SQL")
+def _m014_plain_fts_triggers(db):
+    # The old ones called the evidence_text() UDF, so connections without
+    # it could not write vulnerabilities. The indexed text stays as it is.
+    db.execute("DROP TRIGGER IF EXISTS trg_fts_vulns_ins")
+    db.execute("DROP TRIGGER IF EXISTS trg_fts_vulns_upd")
+    if db.execute("SELECT 1 FROM sqlite_master WHERE name='fts_vulns'").fetchone():
+        _exec_script(db, _fts_triggers(db, "vuln"))
+
+
 # ─── CONNECTION ──────────────────────────────────────────────────────────────
-def get_connection() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.executescript(SCHEMA)
-    return conn
+# Connections are long-lived and kept per thread: opening a connection and
+# replaying SCHEMA used to happen on every repository call, which dominated
+# the cost of persisting findings. Migrations now run once per process per
+# database file; PRAGMAs run once per connection.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous":  os.getenv("SROF_DB_SYNCHRONOUS", "NORMAL"),
+    "cache_size":   int(os.getenv("SROF_DB_CACHE_SIZE", "-65536")),      # KiB when negative
+    "mmap_size":    int(os.getenv("SROF_DB_MMAP_SIZE", str(256 << 20))),
+    "busy_timeout": int(os.getenv("SROF_DB_BUSY_TIMEOUT", "10000")),     # ms
+    "temp_store":   "MEMORY",
+}
+
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection subclass so the pool can track it by weakref."""
+
+
+class ConnectionManager:
+    """
+    Hands out one persistent connection per (thread, database file).
+    Connections die with their thread; close_all() closes every live one.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized = set()
+        self._live = weakref.WeakSet()
+
+    def configure(self, **pragmas):
+        """Override PRAGMAs for connections opened after this call."""
+        unknown = set(pragmas) - set(PRAGMAS)
+        if unknown:
+            raise ValueError(f"Unknown PRAGMA(s): {', '.join(sorted(unknown))}")
+        PRAGMAS.update(pragmas)
+
+    def _conns(self) -> dict:
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+            self._local.depth = {}
+        return conns
+
+    def get(self, path: Path = None) -> sqlite3.Connection:
+        path = str(path or DB_PATH)
+        conns = self._conns()
+        conn = conns.get(path)
+        if conn is None:
+            conn = conns[path] = self._open(path)
+        return conn
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False,
+                               factory=_PooledConnection)
+        conn.row_factory = sqlite3.Row
+        conn.create_function("evidence_text", 2, _evidence_text, deterministic=True)
+        conn.execute("PRAGMA foreign_keys=ON")
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        # Every :memory: connection is a fresh database, so it always needs
+        # the schema; files only need it once per process.
+        with self._lock:
+            if path == ":memory:" or path not in self._initialized:
+                migrate(conn)
+                _ensure_fts(conn)
+                self._initialized.add(path)
+        self._live.add(conn)
+        return conn
+
+    def enter(self, path: Path = None) -> int:
+        self._conns()
+        key = str(path or DB_PATH)
+        self._local.depth[key] = self._local.depth.get(key, 0) + 1
+        return self._local.depth[key]
+
+    def leave(self, path: Path = None) -> int:
+        key = str(path or DB_PATH)
+        self._local.depth[key] -= 1
+        return self._local.depth[key]
+
+    def close_thread(self):
+        """Close the calling thread's connections."""
+        for conn in self._conns().values():
+            conn.close()
+        self._local.conns = {}
+        self._local.depth = {}
+
+    def close_all(self):
+        """Close every pooled connection and forget schema initialization."""
+        with self._lock:
+            for conn in list(self._live):
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._live = weakref.WeakSet()
+            self._initialized.clear()
+        self._local = threading.local()
+
+
+_pool = ConnectionManager()
+
+
+def configure_db(**pragmas):
+    """Set PRAGMAs (synchronous, cache_size, mmap_size, busy_timeout, temp_store)."""
+    _pool.configure(**pragmas)
+
+
+def close_connections():
+    _pool.close_all()
+
+
+def get_connection(path: Path = None) -> sqlite3.Connection:
+    """Return the calling thread's pooled connection."""
+    return _pool.get(path)
 
 
 @contextmanager
-def get_db():
-    conn = get_connection()
+def get_db(path: Path = None):
+    conn = get_connection(path)
+    # Nested get_db() blocks share the connection; only the outermost
+    # block commits or rolls back.
+    outermost = _pool.enter(path) == 1
     try:
         yield conn
-        conn.commit()
+        if outermost:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if outermost:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        _pool.leave(path)
+
+
+def _begin_write(db: sqlite3.Connection):
+    """Take the write lock now rather than at the first INSERT."""
+    if not db.in_transaction:
+        db.execute("BEGIN IMMEDIATE")
+
+
+# ─── SHARDING ────────────────────────────────────────────────────────────────
+# Optional one-file-per-workspace layout (SROF_SHARDS=<dir> or =1 for
+# data/workspaces/). DB_PATH becomes the catalog: it lists workspaces, and
+# every other row lives in <dir>/ws-<id>.db, so a busy workspace has its
+# own writer lock and cache. Each shard allocates row ids from
+# workspace_id << 32, so any target/asset/vuln/job id names its shard and
+# the repositories route by id without a lookup. Sharding starts from an
+# empty catalog: rows already in the main database would not be routed to,
+# so move workspaces over with core.snapshot (export, then import).
+SHARD_ID_SHIFT = 32
+SHARDED_TABLES = ("targets", "assets", "vulnerabilities", "scan_jobs",
+                  "plugin_logs", "attack_chains", "job_targets")
+
+
+class ShardRouter:
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory) if directory else None
+        self._ready = set()
+        self._checked = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def enable(self, directory: Path = None):
+        self.directory = Path(directory or DB_PATH.parent / "workspaces")
+        self._ready.clear()
+        self._checked = False
+
+    def disable(self):
+        self.directory = None
+        self._ready.clear()
+
+    def check(self):
+        """Raise RuntimeError if the main database holds workspace rows."""
+        with self._lock:
+            if self._checked:
+                return
+            with get_db() as db:
+                held = [t for t in SHARDED_TABLES
+                        if db.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone()]
+            if held:
+                raise RuntimeError(f"Cannot shard {DB_PATH}: it already holds {', '.join(held)};"
+                                   " move its workspaces with python -m core.snapshot"
+                                   " into a new, sharded database")
+            self._checked = True
+
+    def for_workspace(self, workspace_id: Optional[int]) -> Optional[Path]:
+        """Shard file of a workspace (None → the main database)."""
+        if self.directory is None or workspace_id is None:
+            return None
+        path = self.directory / f"ws-{int(workspace_id)}.db"
+        if path not in self._ready:
+            self.check()
+            with self._lock:
+                if path not in self._ready:
+                    self._prepare(int(workspace_id), path)
+                    self._ready.add(path)
+        return path
+
+    def for_id(self, row_id: Optional[int]) -> Optional[Path]:
+        """Shard holding a target/asset/vuln/job id."""
+        if self.directory is None or not row_id:
+            return None
+        workspace_id = int(row_id) >> SHARD_ID_SHIFT
+        return self.for_workspace(workspace_id) if workspace_id else None
+
+    def paths(self) -> List[Path]:
+        """Existing shard files in workspace order."""
+        if self.directory is None or not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("ws-*.db"),
+                      key=lambda p: int(p.stem.split("-", 1)[1]))
+
+    def _prepare(self, workspace_id: int, path: Path):
+        # Copy the workspace row (foreign keys point at it) and start every
+        # AUTOINCREMENT sequence at the workspace's id range.
+        with get_db() as catalog:
+            ws = catalog.execute("SELECT * FROM workspaces WHERE id=?",
+                                 (workspace_id,)).fetchone()
+        if ws is None:
+            raise ValueError(f"Unknown workspace {workspace_id}")
+        base = workspace_id << SHARD_ID_SHIFT
+        with get_db(path) as db:
+            _begin_write(db)
+            db.execute("INSERT OR IGNORE INTO workspaces(id, name, description, created_at)"
+                       " VALUES(?,?,?,?)",
+                       (ws["id"], ws["name"], ws["description"], ws["created_at"]))
+            for table in SHARDED_TABLES:
+                db.execute("UPDATE sqlite_sequence SET seq=? WHERE name=? AND seq < ?",
+                           (base, table, base))
+                db.execute("INSERT INTO sqlite_sequence(name, seq) SELECT ?, ?"
+                           " WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name=?)",
+                           (table, base, table))
+
+
+_shards = ShardRouter()
+if os.getenv("SROF_SHARDS"):
+    _shards.enable(None if os.getenv("SROF_SHARDS") == "1" else Path(os.getenv("SROF_SHARDS")))
+
+
+def enable_sharding(directory: Path = None):
+    """
+    Store each workspace in its own file (see ShardRouter). Raises
+    RuntimeError, leaving sharding off, if the main database already
+    holds workspace rows.
+    """
+    _shards.enable(directory)
+    try:
+        _shards.check()
+    except RuntimeError:
+        _shards.disable()
+        raise
+
+
+def disable_sharding():
+    _shards.disable()
+
+
+def database_paths() -> List[Optional[Path]]:
+    """Every database file in use: the main one (None) plus any shards."""
+    return [None, *_shards.paths()]
+
+
+def workspace_path(workspace_id: Optional[int]) -> Optional[Path]:
+    """Database file holding a workspace's rows (None → the main database)."""
+    return _shards.for_workspace(workspace_id)
+
+
+def _ws_db(workspace_id: Optional[int]) -> Optional[Path]:
+    return _shards.for_workspace(workspace_id)
+
+
+def _id_db(row_id: Optional[int]) -> Optional[Path]:
+    return _shards.for_id(row_id)
+
+
+def group_by_shard(items: list, row_id) -> dict:
+    """{shard path: [index, ...]} for items, keyed by row_id(item)."""
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(_id_db(row_id(item)), []).append(i)
+    return groups
+
+
+def _attached(per: int = 8):
+    """
+    Yield (connection, [schema, ...]) covering every database: 'main' in
+    the first group, and shards attached to the main connection up to
+    `per` at a time (SQLite allows 10).
+    """
+    conn = get_connection()
+    paths = _shards.paths()
+    for i in range(0, max(len(paths), 1), per):
+        names = []
+        try:
+            for path in paths[i:i + per]:
+                name = f"shard{len(names)}"
+                conn.execute(f"ATTACH DATABASE ? AS {name}", (str(path),))
+                names.append(name)
+            yield conn, ["main", *names] if i == 0 else names
+        finally:
+            for name in names:
+                conn.execute(f"DETACH DATABASE {name}")
 
 
 # ─── DATACLASSES ─────────────────────────────────────────────────────────────
@@ -160,6 +1242,7 @@ class Asset:
     source: str = ""
     metadata: dict = None
     id: Optional[int] = None
+    job_id: Optional[int] = None
 
     def __post_init__(self):
         if self.metadata is None:
@@ -178,10 +1261,148 @@ class Vulnerability:
     cvss: float = 0.0
     asset_id: Optional[int] = None
     id: Optional[int] = None
+    location: str = ""
+    fingerprint: str = ""              # derived from plugin/name/location if empty
+    job_id: Optional[int] = None
 
     def __post_init__(self):
         if self.evidence is None:
             self.evidence = {}
+        if not self.fingerprint:
+            self.fingerprint = vuln_fingerprint(self.plugin_id, self.name,
+                                                self.location, self.evidence)
+
+
+# ─── STREAMING ───────────────────────────────────────────────────────────────
+class LazyRecord(dict):
+    """
+    Row dict whose JSON columns stay as strings until first read through
+    [] or get(). items()/values() see the raw strings.
+    """
+    __slots__ = ("_pending", "_loaders")
+
+    def __init__(self, row, json_cols: dict, loaders: dict = None):
+        super().__init__(row)
+        self._pending = {c: d for c, d in json_cols.items() if c in self}
+        self._loaders = loaders or {}
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if key in self._pending:
+            default = self._pending.pop(key)
+            loader = self._loaders.get(key)
+            value = loader(self, value) if loader else json.loads(value or default)
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+def _decode(row, json_cols: dict, decode, loaders: dict = None) -> dict:
+    """
+    decode: True → parse JSON now, 'lazy' → LazyRecord, False → raw strings.
+    loaders maps a column to fn(row, raw) for values not stored inline.
+    """
+    if decode == "lazy":
+        return LazyRecord(row, json_cols, loaders)
+    d = dict(row)
+    if decode:
+        loaders = loaders or {}
+        for col, default in json_cols.items():
+            if col in d:
+                loader = loaders.get(col)
+                d[col] = loader(d, d[col]) if loader else json.loads(d[col] or default)
+    return d
+
+
+def _keyset(sql: str, params: list, id_col: str, after_id: int,
+            limit: Optional[int], chunk: int, path: Path = None):
+    """
+    Yield rows of `sql` (which must end in a WHERE clause) in id order,
+    one `id_col > last` query per chunk, so no read transaction or cursor
+    stays open while the caller consumes rows.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        n = chunk if remaining is None else min(chunk, remaining)
+        with get_db(path) as db:
+            rows = db.execute(f"{sql} AND {id_col} > ? ORDER BY {id_col} LIMIT ?",
+                              (*params, after_id, n)).fetchall()
+        yield from rows
+        if len(rows) < n:
+            return
+        after_id = rows[-1]["id"]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+# ─── TARGET PARSING ──────────────────────────────────────────────────────────
+MAX_CIDR_HOSTS = 1 << 16        # refuse to expand larger networks
+
+
+def parse_targets(entry: str, scheme: str = "https") -> Iterator[tuple]:
+    """
+    Yield normalized (host, port, scheme) for one scope-file entry: a host,
+    host:port, [v6]:port, URL (with or without its scheme) or CIDR. Hosts
+    are lower-cased with trailing dots and wildcard prefixes dropped; blanks
+    and # comments yield nothing. Raises ValueError, before yielding, for an
+    entry it cannot use (bad port, network over MAX_CIDR_HOSTS).
+    """
+    entry = entry.split("#", 1)[0].strip()
+    if not entry:
+        return
+    port = None
+    if "://" in entry:
+        u = urlsplit(entry)
+        scheme, host = u.scheme.lower() or scheme, u.hostname or ""
+        try:
+            port = u.port
+        except ValueError:
+            port = None
+    else:
+        if "/" in entry:
+            try:
+                net = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                net = None                  # host/path: keep the host
+            if net is not None:
+                if net.num_addresses > MAX_CIDR_HOSTS:
+                    raise ValueError(f"{entry}: more than {MAX_CIDR_HOSTS} addresses")
+                hosts = list(net.hosts()) or [net.network_address]
+                for ip in hosts:
+                    yield str(ip), None, scheme
+                return
+            entry = entry.split("/", 1)[0]
+        if entry.startswith("["):
+            host, _, rest = entry[1:].partition("]")
+            port = _parse_port(rest[1:], entry) if rest.startswith(":") else None
+        elif entry.count(":") == 1:
+            host, _, p = entry.partition(":")
+            port = _parse_port(p, entry)
+        else:
+            host = entry                    # bare name, IPv4 or IPv6
+    host = host.strip().lower().rstrip(".")
+    if host.startswith("*."):
+        host = host[2:]
+    if host:
+        yield host, port, scheme
+
+
+def _parse_port(text: str, entry: str) -> Optional[int]:
+    if not text:
+        return None
+    if not text.isdigit() or not 0 < int(text) < 65536:
+        raise ValueError(f"{entry}: bad port {text!r}")
+    return int(text)
+
+
+def _scope_lines(source) -> Iterator[str]:
+    if isinstance(source, (str, Path)):
+        with open(source, encoding="utf-8", errors="replace") as f:
+            yield from f
+    else:
+        yield from source
 
 
 # ─── REPOSITORY ──────────────────────────────────────────────────────────────
@@ -193,10 +1414,15 @@ class WorkspaceRepo:
                 "INSERT OR IGNORE INTO workspaces(name, description) VALUES(?,?)",
                 (name, description)
             )
-            if cur.lastrowid:
-                return cur.lastrowid
-            row = db.execute("SELECT id FROM workspaces WHERE name=?", (name,)).fetchone()
-            return row["id"]
+            # lastrowid is connection-wide and the connection is pooled, so
+            # an ignored INSERT would report some earlier row's id.
+            if cur.rowcount:
+                workspace_id = cur.lastrowid
+            else:
+                workspace_id = db.execute("SELECT id FROM workspaces WHERE name=?",
+                                          (name,)).fetchone()["id"]
+        _ws_db(workspace_id)        # create the workspace's shard when sharded
+        return workspace_id
 
     @staticmethod
     def list_all() -> list:
@@ -216,15 +1442,19 @@ class WorkspaceRepo:
 class TargetRepo:
     @staticmethod
     def add(t: Target) -> int:
-        with get_db() as db:
+        with get_db(_ws_db(t.workspace_id)) as db:
             tags_json = json.dumps(t.tags or [])
+            # UNIQUE(workspace_id, host, port) treats NULL ports as distinct,
+            # so the conflict check has to be spelled out with IS.
             cur = db.execute(
-                """INSERT OR IGNORE INTO targets
+                """INSERT INTO targets
                    (workspace_id, host, port, protocol, scheme, tags)
-                   VALUES(?,?,?,?,?,?)""",
+                   SELECT ?1, ?2, ?3, ?4, ?5, ?6
+                   WHERE NOT EXISTS (SELECT 1 FROM targets
+                                     WHERE workspace_id=?1 AND host=?2 AND port IS ?3)""",
                 (t.workspace_id, t.host, t.port, t.protocol, t.scheme, tags_json)
             )
-            if cur.lastrowid:
+            if cur.rowcount:
                 return cur.lastrowid
             row = db.execute(
                 "SELECT id FROM targets WHERE workspace_id=? AND host=? AND port IS ?",
@@ -232,9 +1462,72 @@ class TargetRepo:
             ).fetchone()
             return row["id"]
 
+    @staticmethod
+    def bulk_add(workspace_id: int, source: Union[str, Path, Iterable[str]],
+                 scheme: str = "https", protocol: str = "tcp",
+                 tags: List[str] = None, chunk: int = 50000,
+                 errors: list = None) -> dict:
+        """
+        Import targets from a scope file path or an iterable of entries
+        (see parse_targets). Each chunk is staged in a temp table, deduplicated
+        against itself and the workspace in SQL, and committed on its own.
+        Returns {(host, port): target_id} for every target in the input.
+        Entries parse_targets rejects are skipped; pass a list as `errors`
+        to collect them as (line number, entry, reason).
+        """
+        ids = {}
+        batch = []
+        for n, line in enumerate(_scope_lines(source), 1):
+            try:
+                batch.extend(list(parse_targets(line, scheme)))
+            except ValueError as e:
+                if errors is not None:
+                    errors.append((n, line.strip(), str(e)))
+                continue
+            if len(batch) >= chunk:
+                ids.update(TargetRepo._import_chunk(workspace_id, batch, protocol, tags))
+                batch = []
+        if batch:
+            ids.update(TargetRepo._import_chunk(workspace_id, batch, protocol, tags))
+        return ids
+
+    @staticmethod
+    def _import_chunk(workspace_id: int, batch: List[tuple], protocol: str,
+                      tags: List[str]) -> dict:
+        with get_db(_ws_db(workspace_id)) as db:
+            _begin_write(db)
+            # Port 0 stands in for "no port" so the staging key dedups it.
+            db.execute("""CREATE TEMP TABLE IF NOT EXISTS target_stage (
+                              host   TEXT NOT NULL,
+                              port   INTEGER NOT NULL,
+                              scheme TEXT,
+                              PRIMARY KEY (host, port)
+                          ) WITHOUT ROWID""")
+            db.execute("DELETE FROM temp.target_stage")
+            db.executemany("INSERT OR IGNORE INTO temp.target_stage(host, port, scheme)"
+                           " VALUES(?,?,?)",
+                           ((h, p or 0, sch) for h, p, sch in batch))
+            db.execute(
+                """INSERT INTO targets(workspace_id, host, port, protocol, scheme, tags)
+                   SELECT ?1, s.host, nullif(s.port, 0), ?2, s.scheme, ?3
+                   FROM temp.target_stage s
+                   WHERE NOT EXISTS (SELECT 1 FROM targets t WHERE t.workspace_id=?1
+                                     AND t.host=s.host AND t.port IS nullif(s.port, 0))""",
+                (workspace_id, protocol, json.dumps(tags or [])))
+            # CROSS JOIN keeps the stage as the outer loop: one index probe
+            # per staged host instead of a walk over the whole workspace.
+            rows = db.execute(
+                """SELECT s.host, nullif(s.port, 0) AS port, min(t.id) AS id
+                   FROM temp.target_stage s
+                   CROSS JOIN targets t ON t.workspace_id=? AND t.host=s.host
+                                 AND t.port IS nullif(s.port, 0)
+                   GROUP BY s.host, s.port""", (workspace_id,)).fetchall()
+            db.execute("DELETE FROM temp.target_stage")
+        return {(r["host"], r["port"]): r["id"] for r in rows}
+
     @staticmethod
     def list_by_workspace(workspace_id: int) -> list:
-        with get_db() as db:
+        with get_db(_ws_db(workspace_id)) as db:
             rows = db.execute(
                 "SELECT * FROM targets WHERE workspace_id=? ORDER BY created_at DESC",
                 (workspace_id,)
@@ -246,36 +1539,102 @@ class TargetRepo:
                 result.append(d)
             return result
 
+    @staticmethod
+    def select_ids(workspace_id: int, status: str = None, tag: str = None,
+                   host: str = None) -> List[int]:
+        """
+        Ids of a workspace's targets, optionally only those with `status`,
+        tagged `tag`, or whose host matches the GLOB `host` ("*.example.com").
+        """
+        q, params = "SELECT id FROM targets WHERE workspace_id=?", [workspace_id]
+        if status is not None:
+            q += " AND status=?"
+            params.append(status)
+        if tag is not None:
+            q += " AND EXISTS (SELECT 1 FROM json_each(targets.tags) WHERE value=?)"
+            params.append(tag)
+        if host is not None:
+            q += " AND host GLOB ?"
+            params.append(host)
+        with get_db(_ws_db(workspace_id)) as db:
+            return [r[0] for r in db.execute(q + " ORDER BY id", params)]
+
+    @staticmethod
+    def get_many(target_ids: List[int]) -> Dict[int, dict]:
+        """{id: target row} for the given ids (missing ids are left out)."""
+        out = {}
+        for path, idx in group_by_shard(target_ids, lambda t: t).items():
+            ids = [target_ids[i] for i in idx]
+            with get_db(path) as db:
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    for r in db.execute(f"SELECT * FROM targets WHERE id IN"
+                                        f" ({','.join('?' * len(chunk))})", chunk):
+                        out[r["id"]] = dict(r)
+        return out
+
     @staticmethod
     def update_status(target_id: int, status: str):
-        with get_db() as db:
+        with get_db(_id_db(target_id)) as db:
             db.execute("UPDATE targets SET status=? WHERE id=?", (status, target_id))
 
 
 class AssetRepo:
+    # One row per (target_id, type, value). A repeat sighting merges its
+    # metadata into the stored JSON, bumps last_seen, records the source and
+    # the job; discovered_at and first_job_id keep the first sighting.
+    UPSERT = """
+        INSERT INTO assets(target_id, type, value, source, metadata,
+                           last_seen, sources, first_job_id, job_id)
+        VALUES(?,?,?,?,?, strftime('%s','now'),
+               CASE WHEN ?4 IS NULL THEN '[]' ELSE json_array(?4) END, ?6, ?6)
+        ON CONFLICT(target_id, type, value) DO UPDATE SET
+            metadata  = json_patch(assets.metadata, excluded.metadata),
+            last_seen = excluded.last_seen,
+            job_id    = coalesce(excluded.job_id, assets.job_id),
+            sources   = CASE
+                WHEN excluded.source IS NULL OR excluded.source = ''
+                  OR EXISTS (SELECT 1 FROM json_each(assets.sources)
+                             WHERE value = excluded.source)
+                THEN assets.sources
+                ELSE json_insert(assets.sources, '$[#]', excluded.source)
+            END
+    """
+
+    @staticmethod
+    def _params(a: Asset) -> tuple:
+        return (a.target_id, a.type, a.value, a.source or None,
+                json.dumps(a.metadata or {}), a.job_id)
+
+    @staticmethod
+    def _id_of(db, target_id: int, asset_type: str, value: str) -> int:
+        return db.execute(
+            "SELECT id FROM assets WHERE target_id IS ? AND type=? AND value=?",
+            (target_id, asset_type, value)
+        ).fetchone()["id"]
+
     @staticmethod
     def add(a: Asset) -> int:
-        with get_db() as db:
-            cur = db.execute(
-                """INSERT INTO assets(target_id, type, value, source, metadata)
-                   VALUES(?,?,?,?,?)""",
-                (a.target_id, a.type, a.value, a.source, json.dumps(a.metadata or {}))
-            )
-            return cur.lastrowid
+        """Insert or merge an asset, return its id."""
+        with get_db(_id_db(a.target_id)) as db:
+            db.execute(AssetRepo.UPSERT, AssetRepo._params(a))
+            return AssetRepo._id_of(db, a.target_id, a.type, a.value)
 
     @staticmethod
-    def bulk_add(assets: List[Asset]):
-        with get_db() as db:
-            db.executemany(
-                """INSERT OR IGNORE INTO assets(target_id, type, value, source, metadata)
-                   VALUES(?,?,?,?,?)""",
-                [(a.target_id, a.type, a.value, a.source, json.dumps(a.metadata or {}))
-                 for a in assets]
-            )
+    def bulk_add(assets: List[Asset]) -> List[int]:
+        """Insert or merge many assets (one transaction per shard), return their ids in order."""
+        ids: List[int] = [0] * len(assets)
+        for path, idx in group_by_shard(assets, lambda a: a.target_id).items():
+            with get_db(path) as db:
+                db.executemany(AssetRepo.UPSERT, [AssetRepo._params(assets[i]) for i in idx])
+                for i in idx:
+                    ids[i] = AssetRepo._id_of(db, assets[i].target_id, assets[i].type,
+                                              assets[i].value)
+        return ids
 
     @staticmethod
     def list_by_target(target_id: int, asset_type: str = None) -> list:
-        with get_db() as db:
+        with get_db(_id_db(target_id)) as db:
             if asset_type:
                 rows = db.execute(
                     "SELECT * FROM assets WHERE target_id=? AND type=? ORDER BY discovered_at DESC",
@@ -290,89 +1649,720 @@ class AssetRepo:
             for r in rows:
                 d = dict(r)
                 d["metadata"] = json.loads(d.get("metadata") or "{}")
+                d["sources"] = json.loads(d.get("sources") or "[]")
                 result.append(d)
             return result
 
+    JSON_COLS = {"metadata": "{}", "sources": "[]"}
+
+    @staticmethod
+    def iter_by_target(target_id: int, asset_type: str = None,
+                       after_id: int = 0, limit: int = None,
+                       decode=True, chunk: int = 1000):
+        """Stream assets in id order (keyset pagination). decode: True | 'lazy' | False."""
+        q, params = "SELECT * FROM assets WHERE target_id=?", [target_id]
+        if asset_type:
+            q += " AND type=?"
+            params.append(asset_type)
+        for r in _keyset(q, params, "id", after_id, limit, chunk, _id_db(target_id)):
+            yield _decode(r, AssetRepo.JSON_COLS, decode)
+
+    @staticmethod
+    def page_by_target(target_id: int, after_id: int = 0, limit: int = 100,
+                       asset_type: str = None, decode=True) -> list:
+        """One page of assets; pass the last row's id as after_id for the next."""
+        return list(AssetRepo.iter_by_target(target_id, asset_type, after_id,
+                                             limit, decode, chunk=limit))
+
+    @staticmethod
+    def find(workspace_id: int = None, target_id: int = None,
+             asset_type: str = None, status_code: int = None, port: int = None,
+             service: str = None, technology: str = None, is_cdn: bool = None,
+             after_id: int = 0, limit: int = None, decode=True, chunk: int = 1000):
+        """
+        Stream assets matching indexed metadata filters, e.g.
+        find(ws, status_code=403), find(ws, port=445), find(ws, is_cdn=True).
+        """
+        path = _ws_db(workspace_id) if workspace_id is not None else _id_db(target_id)
+        if _shards.enabled and path is None:
+            raise ValueError("find() needs workspace_id or target_id when sharded")
+        q, params = "SELECT a.* FROM assets a", []
+        if workspace_id is not None:
+            q += " JOIN targets t ON a.target_id = t.id WHERE t.workspace_id=?"
+            params.append(workspace_id)
+        else:
+            q += " WHERE 1"
+        for col, val in (("a.target_id", target_id), ("a.type", asset_type),
+                         ("a.status_code", status_code), ("a.port", port),
+                         ("a.service", service)):
+            if val is not None:
+                q += f" AND {col}=?"
+                params.append(val)
+        if is_cdn is not None:
+            q += " AND a.is_cdn=?"
+            params.append(int(bool(is_cdn)))
+        if technology is not None:
+            q += " AND a.id IN (SELECT asset_id FROM asset_technologies WHERE tech=?)"
+            params.append(technology)
+        for r in _keyset(q, params, "a.id", after_id, limit, chunk, path):
+            yield _decode(r, AssetRepo.JSON_COLS, decode)
+
+
+class InventoryRepo:
+    """
+    Normalized hosts, ips, services and urls (see inventory_facts).
+    FindingWriter records assets here in the transaction that stores them.
+    """
+    INVENTORY_TABLES = ("urls", "services", "hosts", "ips")     # delete order
+
+    @staticmethod
+    def _record(db, workspace_id: int, asset_id: Optional[int], fact: dict, cache: dict):
+        key = (workspace_id, fact["host"])
+        host_id = cache.get(key)
+        if host_id is None:
+            host_id = cache[key] = db.execute(
+                "INSERT INTO hosts(workspace_id, name) VALUES(?,?)"
+                " ON CONFLICT(workspace_id, name) DO UPDATE SET last_seen=excluded.last_seen"
+                " RETURNING id", key).fetchone()[0]
+        if "ip" in fact and (workspace_id, fact["host"], fact["ip"]) not in cache:
+            ip_id = db.execute(
+                "INSERT INTO ips(workspace_id, addr, ip_key) VALUES(?,?,?)"
+                " ON CONFLICT(workspace_id, ip_key) DO UPDATE SET addr=ips.addr RETURNING id",
+                (workspace_id, fact["ip"], ip_key(fact["ip"]))).fetchone()[0]
+            db.execute("INSERT OR IGNORE INTO host_ips(host_id, ip_id) VALUES(?,?)",
+                       (host_id, ip_id))
+            cache[(workspace_id, fact["host"], fact["ip"])] = ip_id
+        service_id = None
+        if "port" in fact:
+            # Scanners (nmap, fscan) name services; a URL scheme only fills gaps.
+            service_id = db.execute(
+                """INSERT INTO services(workspace_id, host_id, port, protocol, name, product, version)
+                   VALUES(?,?,?,?,?,?,?)
+                   ON CONFLICT(host_id, port, protocol) DO UPDATE SET
+                       name      = CASE WHEN ?8 THEN coalesce(excluded.name, services.name)
+                                        ELSE coalesce(services.name, excluded.name) END,
+                       product   = coalesce(excluded.product, services.product),
+                       version   = coalesce(excluded.version, services.version),
+                       last_seen = excluded.last_seen
+                   RETURNING id""",
+                (workspace_id, host_id, int(fact["port"]), fact.get("protocol", "tcp"),
+                 fact.get("service"), fact.get("product"), fact.get("version"),
+                 "url" not in fact)).fetchone()[0]
+        if "url" in fact:
+            db.execute(
+                """INSERT INTO urls(workspace_id, host_id, service_id, asset_id, url, status_code)
+                   VALUES(?,?,?,?,?,?)
+                   ON CONFLICT(workspace_id, url) DO UPDATE SET
+                       service_id  = coalesce(excluded.service_id, urls.service_id),
+                       asset_id    = coalesce(excluded.asset_id, urls.asset_id),
+                       status_code = coalesce(excluded.status_code, urls.status_code),
+                       last_seen   = excluded.last_seen""",
+                (workspace_id, host_id, service_id, asset_id, fact["url"],
+                 fact.get("status_code")))
+
+    @staticmethod
+    def bulk_record(rows: List[tuple]):
+        """Record (target_id, asset_id, asset_type, value, metadata) rows."""
+        for path, idx in group_by_shard(rows, lambda r: r[0]).items():
+            facts = [(i, inventory_facts(rows[i][2], rows[i][3], rows[i][4])) for i in idx]
+            facts = [(i, f) for i, f in facts if f]
+            if not facts:
+                continue
+            with get_db(path) as db:
+                target_ids = sorted({rows[i][0] for i, _ in facts})
+                marks = ",".join("?" * len(target_ids))
+                ws = dict(db.execute(f"SELECT id, workspace_id FROM targets WHERE id IN ({marks})",
+                                     target_ids).fetchall())
+                cache = {}
+                for i, fact in facts:
+                    if ws.get(rows[i][0]) is not None:
+                        InventoryRepo._record(db, ws[rows[i][0]], rows[i][1], fact, cache)
+
+    @staticmethod
+    def rebuild_in(db, workspace_id: int = None):
+        """Recompute the inventory from assets inside the caller's transaction."""
+        where = "" if workspace_id is None else f" WHERE workspace_id = {int(workspace_id)}"
+        for table in InventoryRepo.INVENTORY_TABLES:
+            db.execute(f"DELETE FROM {table}{where}")
+        q = ("SELECT a.id, t.workspace_id, a.type, a.value, a.metadata FROM assets a"
+             " JOIN targets t ON t.id = a.target_id WHERE a.id > ?")
+        if workspace_id is not None:
+            q += f" AND t.workspace_id = {int(workspace_id)}"
+        last, cache = 0, {}
+        while True:
+            rows = db.execute(q + " ORDER BY a.id LIMIT 1000", (last,)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for asset_id, ws_id, asset_type, value, meta in rows:
+                try:
+                    meta = json.loads(meta or "{}")
+                except ValueError:
+                    meta = {}
+                fact = inventory_facts(asset_type, value, meta if isinstance(meta, dict) else {})
+                if fact and ws_id is not None:
+                    InventoryRepo._record(db, ws_id, asset_id, fact, cache)
+
+    @staticmethod
+    def rebuild(workspace_id: int = None):
+        paths = [_ws_db(workspace_id)] if workspace_id is not None else database_paths()
+        for path in paths:
+            with get_db(path) as db:
+                _begin_write(db)
+                InventoryRepo.rebuild_in(db, workspace_id)
+
+    @staticmethod
+    def _in_network(params: list, workspace_id: int, cidr: str) -> str:
+        params += [workspace_id, *cidr_range(cidr)]
+        return (" IN (SELECT hi.host_id FROM ips i JOIN host_ips hi ON hi.ip_id = i.id"
+                " WHERE i.workspace_id=? AND i.ip_key BETWEEN ? AND ?)")
+
+    @staticmethod
+    def services(workspace_id: int, names: Iterable[str] = None, port: int = None,
+                 cidr: str = None) -> list:
+        """
+        Services by name (e.g. ("http", "https")), port and/or the network
+        their host resolves into, sorted by host and port.
+        """
+        q = ("SELECT s.id, h.name AS host, s.port, s.protocol, s.name AS service,"
+             " s.product, s.version FROM services s JOIN hosts h ON h.id = s.host_id"
+             " WHERE s.workspace_id=?")
+        params: list = [workspace_id]
+        if names:
+            names = list(names)
+            q += f" AND s.name IN ({','.join('?' * len(names))})"
+            params += names
+        if port is not None:
+            q += " AND s.port=?"
+            params.append(port)
+        if cidr:
+            q += " AND s.host_id" + InventoryRepo._in_network(params, workspace_id, cidr)
+        with get_db(_ws_db(workspace_id)) as db:
+            rows = [dict(r) for r in db.execute(q, params)]
+        return sorted(rows, key=lambda r: (r["host"], r["port"]))
+
+    @staticmethod
+    def hosts(workspace_id: int, cidr: str = None) -> list:
+        """Hosts with their addresses, optionally only those resolving into `cidr`."""
+        q = ("SELECT h.id, h.name, group_concat(i.addr) AS ips FROM hosts h"
+             " LEFT JOIN host_ips hi ON hi.host_id = h.id LEFT JOIN ips i ON i.id = hi.ip_id"
+             " WHERE h.workspace_id=?")
+        params: list = [workspace_id]
+        if cidr:
+            q += " AND h.id" + InventoryRepo._in_network(params, workspace_id, cidr)
+        with get_db(_ws_db(workspace_id)) as db:
+            rows = db.execute(q + " GROUP BY h.id ORDER BY h.name", params).fetchall()
+        return [{"id": r["id"], "name": r["name"],
+                 "ips": sorted(r["ips"].split(",")) if r["ips"] else []} for r in rows]
+
+    @staticmethod
+    def urls(workspace_id: int, status_code: int = None, host: str = None) -> list:
+        q = ("SELECT u.id, u.url, u.status_code, h.name AS host, u.asset_id FROM urls u"
+             " JOIN hosts h ON h.id = u.host_id WHERE u.workspace_id=?")
+        params: list = [workspace_id]
+        if status_code is not None:
+            q += " AND u.status_code=?"
+            params.append(status_code)
+        if host is not None:
+            q += " AND h.name=?"
+            params.append(host.lower())
+        with get_db(_ws_db(workspace_id)) as db:
+            return [dict(r) for r in db.execute(q + " ORDER BY u.url", params)]
+
+
+class EvidenceStore:
+    """
+    Content-addressed evidence blobs (see _m010_evidence_store).
+    Writers go through VulnRepo; readers get evidence lazily from
+    VulnRepo rows or by reference here.
+    """
+
+    @staticmethod
+    def put_many(db, evidences: List[dict]) -> List[Optional[str]]:
+        """Store each non-empty evidence dict once; return their refs (None if empty)."""
+        refs, texts = [], {}
+        for evidence in evidences:
+            if not evidence:
+                refs.append(None)
+                continue
+            text = _evidence_json(evidence)
+            ref = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            refs.append(ref)
+            texts.setdefault(ref, text)
+        # Skip compressing what is already stored.
+        hashes = list(texts)
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            marks = ",".join("?" * len(part))
+            for r in db.execute(f"SELECT hash FROM evidence_blobs WHERE hash IN ({marks})", part):
+                del texts[r[0]]
+        if texts:
+            db.executemany(
+                "INSERT OR IGNORE INTO evidence_blobs(hash, codec, size, data) VALUES(?,?,?,?)",
+                [(ref, *_evidence_pack(text)) for ref, text in texts.items()])
+        return refs
+
+    @staticmethod
+    def put(evidence: dict, path: Path = None) -> Optional[str]:
+        with get_db(path) as db:
+            return EvidenceStore.put_many(db, [evidence])[0]
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _text(ref: str, path: Path = None) -> Optional[str]:
+        # Blobs never change under a given hash, so caching is always safe.
+        with get_db(path) as db:
+            row = db.execute("SELECT codec, data FROM evidence_blobs WHERE hash=?",
+                             (ref,)).fetchone()
+        return _evidence_text(row["codec"], row["data"]) if row else None
+
+    @staticmethod
+    def get(ref: Optional[str], path: Path = None) -> dict:
+        """Evidence dict for a ref ({} when ref is empty or unknown)."""
+        text = EvidenceStore._text(ref, path) if ref else None
+        return json.loads(text) if text else {}
+
+    @staticmethod
+    def stats(path: Path = None) -> dict:
+        with get_db(path) as db:
+            r = db.execute("SELECT COUNT(*), coalesce(SUM(size), 0),"
+                           " coalesce(SUM(length(data)), 0) FROM evidence_blobs").fetchone()
+        return {"blobs": r[0], "raw_bytes": r[1], "stored_bytes": r[2]}
+
+
+def _load_evidence(row: dict, raw: str) -> dict:
+    ref = dict.get(row, "evidence_ref")
+    if not ref:
+        return json.loads(raw or "{}")
+    return EvidenceStore.get(ref, _id_db(dict.get(row, "id")))
+
 
 class VulnRepo:
+    # One row per (target_id, fingerprint). A repeat sighting refreshes the
+    # details, bumps last_seen/occurrences, records the job and reopens a
+    # finding previously marked fixed.
+    UPSERT = """
+        INSERT INTO vulnerabilities
+        (target_id, workspace_id, asset_id, plugin_id, name, severity, cvss, cve,
+         description, evidence, location, fingerprint, last_seen, occurrences,
+         first_job_id, job_id, evidence_ref)
+        VALUES(?1, (SELECT workspace_id FROM targets WHERE id=?1),
+               ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, strftime('%s','now'), 1,
+               ?12, ?12, ?13)
+        ON CONFLICT(target_id, fingerprint) DO UPDATE SET
+            asset_id    = coalesce(excluded.asset_id, vulnerabilities.asset_id),
+            name        = excluded.name,
+            severity    = excluded.severity,
+            cvss        = excluded.cvss,
+            cve         = excluded.cve,
+            description = excluded.description,
+            evidence    = excluded.evidence,
+            evidence_ref = excluded.evidence_ref,
+            last_seen   = excluded.last_seen,
+            occurrences = vulnerabilities.occurrences + 1,
+            job_id      = coalesce(excluded.job_id, vulnerabilities.job_id),
+            status      = CASE WHEN vulnerabilities.status = 'fixed'
+                               THEN 'open' ELSE vulnerabilities.status END
+    """
+
+    @staticmethod
+    def _params(v: Vulnerability, evidence_ref: Optional[str]) -> tuple:
+        return (v.target_id, v.asset_id, v.plugin_id, v.name, v.severity,
+                v.cvss, v.cve, v.description,
+                json.dumps(_evidence_index_keys(v.evidence or {})),
+                v.location, v.fingerprint, v.job_id, evidence_ref)
+
+    @staticmethod
+    def _id_of(db, v: Vulnerability) -> int:
+        return db.execute(
+            "SELECT id FROM vulnerabilities WHERE target_id IS ? AND fingerprint=?",
+            (v.target_id, v.fingerprint)
+        ).fetchone()["id"]
+
     @staticmethod
     def add(v: Vulnerability) -> int:
-        with get_db() as db:
-            cur = db.execute(
-                """INSERT INTO vulnerabilities
-                   (target_id, asset_id, plugin_id, name, severity, cvss, cve,
-                    description, evidence)
-                   VALUES(?,?,?,?,?,?,?,?,?)""",
-                (v.target_id, v.asset_id, v.plugin_id, v.name, v.severity,
-                 v.cvss, v.cve, v.description, json.dumps(v.evidence or {}))
-            )
-            return cur.lastrowid
+        """Insert or refresh a vulnerability, return its id."""
+        with get_db(_id_db(v.target_id)) as db:
+            ref = EvidenceStore.put_many(db, [v.evidence])[0]
+            db.execute(VulnRepo.UPSERT, VulnRepo._params(v, ref))
+            vuln_id = VulnRepo._id_of(db, v)
+            _fts_put_evidence(db, [(v.evidence, vuln_id)])
+            return vuln_id
+
+    @staticmethod
+    def bulk_add(vulns: List[Vulnerability]) -> List[int]:
+        """Insert or refresh many vulnerabilities (one transaction per shard), return their ids."""
+        ids: List[int] = [0] * len(vulns)
+        for path, idx in group_by_shard(vulns, lambda v: v.target_id).items():
+            with get_db(path) as db:
+                refs = EvidenceStore.put_many(db, [vulns[i].evidence for i in idx])
+                db.executemany(VulnRepo.UPSERT, [VulnRepo._params(vulns[i], ref)
+                                                 for i, ref in zip(idx, refs)])
+                for i in idx:
+                    ids[i] = VulnRepo._id_of(db, vulns[i])
+                _fts_put_evidence(db, [(vulns[i].evidence, ids[i]) for i in idx])
+        return ids
+
+    @staticmethod
+    def job_fingerprints(job_id: int) -> set:
+        """{(target_id, fingerprint)} of the vulns a job has committed so far."""
+        with get_db(_id_db(job_id)) as db:
+            return {(r["target_id"], r["fingerprint"]) for r in db.execute(
+                "SELECT target_id, fingerprint FROM vulnerabilities WHERE job_id=?", (job_id,))}
+
+    @staticmethod
+    def job_summary(job_id: int) -> dict:
+        """
+        Classify a job's findings against earlier runs:
+        new (first seen by this job), recurring (seen before and again now)
+        and resolved (open on the job's target from the job's plugins but
+        not reported this time).
+        """
+        with get_db(_id_db(job_id)) as db:
+            new = db.execute("SELECT COUNT(*) FROM vulnerabilities WHERE first_job_id=?",
+                             (job_id,)).fetchone()[0]
+            recurring = db.execute(
+                "SELECT COUNT(*) FROM vulnerabilities WHERE job_id=? AND first_job_id IS NOT ?",
+                (job_id, job_id)).fetchone()[0]
+            resolved = 0
+            row = db.execute("SELECT config FROM scan_jobs WHERE id=?", (job_id,)).fetchone()
+            cfg = json.loads(row["config"] or "{}") if row else {}
+            plugins = cfg.get("plugins") or []
+            if cfg.get("target_id") and plugins:
+                marks = ",".join("?" * len(plugins))
+                resolved = db.execute(
+                    f"""SELECT COUNT(*) FROM vulnerabilities
+                        WHERE target_id=? AND plugin_id IN ({marks})
+                          AND job_id IS NOT ? AND status IN ('open', 'confirmed')""",
+                    (cfg["target_id"], *plugins, job_id)).fetchone()[0]
+        return {"new": new, "recurring": recurring, "resolved": resolved}
+
+    @staticmethod
+    def _list_query(workspace_id: int, severity: str = None,
+                    template_id: str = None) -> tuple:
+        q = """SELECT v.*, t.host, t.port FROM vulnerabilities v
+               JOIN targets t ON v.target_id = t.id
+               WHERE v.workspace_id=?"""
+        params = [workspace_id]
+        if severity:
+            q += " AND v.severity_rank=? AND v.severity=?"
+            params += [SEVERITY_RANK.get(severity, 6), severity]
+        if template_id:
+            q += " AND v.template_id=?"
+            params.append(template_id)
+        return q, params
 
     @staticmethod
     def list_by_workspace(workspace_id: int, severity: str = None) -> list:
-        with get_db() as db:
-            q = """SELECT v.*, t.host, t.port FROM vulnerabilities v
-                   JOIN targets t ON v.target_id = t.id
-                   WHERE t.workspace_id=?"""
+        with get_db(_ws_db(workspace_id)) as db:
+            q, params = VulnRepo._list_query(workspace_id, severity)
+            rows = db.execute(q + " ORDER BY v.severity_rank, v.id", params).fetchall()
+        return [_decode(r, VulnRepo.JSON_COLS, True, VulnRepo.LOADERS) for r in rows]
+
+    JSON_COLS = {"evidence": "{}"}
+    LOADERS = {"evidence": _load_evidence}
+
+    @staticmethod
+    def evidence(vuln_id: int) -> dict:
+        """Full evidence of one vulnerability (for detail views)."""
+        with get_db(_id_db(vuln_id)) as db:
+            row = db.execute("SELECT evidence, evidence_ref FROM vulnerabilities WHERE id=?",
+                             (vuln_id,)).fetchone()
+        return _load_evidence(dict(row), row["evidence"]) if row else {}
+
+    @staticmethod
+    def iter_by_workspace(workspace_id: int, severity: str = None,
+                          after_id: int = 0, limit: int = None,
+                          decode=True, chunk: int = 1000, template_id: str = None):
+        """Stream vulns (with host/port) in id order. decode: True | 'lazy' | False."""
+        q, params = VulnRepo._list_query(workspace_id, severity, template_id)
+        for r in _keyset(q, params, "v.id", after_id, limit, chunk, _ws_db(workspace_id)):
+            yield _decode(r, VulnRepo.JSON_COLS, decode, VulnRepo.LOADERS)
+
+    @staticmethod
+    def page_by_workspace(workspace_id: int, after_id: int = 0, limit: int = 100,
+                          severity: str = None, decode=True) -> list:
+        """One page of vulns; pass the last row's id as after_id for the next."""
+        return list(VulnRepo.iter_by_workspace(workspace_id, severity, after_id,
+                                               limit, decode, chunk=limit))
+
+    @staticmethod
+    def stats_by_workspace(workspace_id: int) -> dict:
+        return StatsRepo.get(workspace_id, "severity")
+
+
+class DiffRepo:
+    """
+    Compare two jobs A < B of a workspace using the provenance columns
+    (first_job_id = first job that reported a row, job_id = latest one):
+
+        added      first reported after A, up to and including B
+        removed    present by A, last reported before B
+        unchanged  present by A and reported again by B or later
+
+    Each set is an index range scan on first_job_id or job_id. The
+    answer is exact when B is the latest job that covered those rows.
+    """
+    KINDS = {
+        "asset": ("assets a", "a", "JOIN targets t ON a.target_id = t.id", "t.workspace_id"),
+        "vuln":  ("vulnerabilities v", "v", "", "v.workspace_id"),
+    }
+
+    @staticmethod
+    def _query(kind: str, change: str) -> str:
+        table, alias, join, ws = DiffRepo.KINDS[kind]
+        cond = {
+            "added":     f"{alias}.first_job_id > :a AND {alias}.first_job_id <= :b",
+            "removed":   f"{alias}.job_id >= :a AND {alias}.job_id < :b"
+                         f" AND {alias}.first_job_id <= :a",
+            "unchanged": f"{alias}.job_id >= :b AND {alias}.first_job_id <= :a",
+        }[change]
+        return f"SELECT {alias}.* FROM {table} {join} WHERE {cond} AND {ws} = :ws"
+
+    @staticmethod
+    def _workspace(db, job_a: int, job_b: int) -> int:
+        rows = db.execute("SELECT id, workspace_id FROM scan_jobs WHERE id IN (?, ?)",
+                          (job_a, job_b)).fetchall()
+        wss = {r["workspace_id"] for r in rows}
+        if len(rows) != len({job_a, job_b}) or len(wss) != 1:
+            raise ValueError(f"Jobs {job_a} and {job_b} must exist in the same workspace")
+        return wss.pop()
+
+    @staticmethod
+    def diff(job_a: int, job_b: int, kinds: tuple = ("asset", "vuln")) -> dict:
+        """{kind: {added|removed|unchanged: [row, ...]}} between jobs A and B."""
+        job_a, job_b = sorted((job_a, job_b))
+        out = {}
+        with get_db(_id_db(job_a)) as db:
+            params = {"a": job_a, "b": job_b, "ws": DiffRepo._workspace(db, job_a, job_b)}
+            for kind in kinds:
+                repo = AssetRepo if kind == "asset" else VulnRepo
+                out[kind] = {
+                    change: [_decode(r, repo.JSON_COLS, True, getattr(repo, "LOADERS", None))
+                             for r in db.execute(DiffRepo._query(kind, change), params)]
+                    for change in ("added", "removed", "unchanged")
+                }
+        return out
+
+    @staticmethod
+    def summary(job_a: int, job_b: int, kinds: tuple = ("asset", "vuln")) -> dict:
+        """Same as diff() but counts only."""
+        job_a, job_b = sorted((job_a, job_b))
+        out = {}
+        with get_db(_id_db(job_a)) as db:
+            params = {"a": job_a, "b": job_b, "ws": DiffRepo._workspace(db, job_a, job_b)}
+            for kind in kinds:
+                out[kind] = {
+                    change: db.execute(f"SELECT COUNT(*) FROM ({DiffRepo._query(kind, change)})",
+                                       params).fetchone()[0]
+                    for change in ("added", "removed", "unchanged")
+                }
+        return out
+
+
+class StatsRepo:
+    @staticmethod
+    def get(workspace_id: int, dimension: str = None) -> dict:
+        """
+        Trigger-maintained counts for a workspace.
+        With a dimension: {key: count}; without: {dimension: {key: count}}.
+        """
+        with get_db(_ws_db(workspace_id)) as db:
+            q = "SELECT dimension, key, count FROM workspace_stats WHERE workspace_id=? AND count > 0"
             params = [workspace_id]
-            if severity:
-                q += " AND v.severity=?"
-                params.append(severity)
-            q += (" ORDER BY CASE v.severity"
-                  " WHEN 'critical' THEN 1 WHEN 'high' THEN 2"
-                  " WHEN 'medium' THEN 3 ELSE 4 END")
+            if dimension:
+                q += " AND dimension=?"
+                params.append(dimension)
             rows = db.execute(q, params).fetchall()
-            result = []
-            for r in rows:
-                d = dict(r)
-                d["evidence"] = json.loads(d.get("evidence") or "{}")
-                result.append(d)
-            return result
+        if dimension:
+            return {r["key"]: r["count"] for r in rows}
+        out = {d: {} for d in STATS_DIMENSIONS}
+        for r in rows:
+            out[r["dimension"]][r["key"]] = r["count"]
+        return out
 
     @staticmethod
-    def stats_by_workspace(workspace_id: int) -> dict:
-        with get_db() as db:
+    def totals(dimension: str = None) -> dict:
+        """Counts summed over every workspace (ATTACHing shards when sharded)."""
+        out = {d: {} for d in STATS_DIMENSIONS}
+        for db, schemas in _attached():
+            parts = " UNION ALL ".join(
+                f"SELECT dimension, key, count FROM {s}.workspace_stats WHERE count > 0"
+                for s in schemas)
+            for r in db.execute(f"SELECT dimension, key, SUM(count) FROM ({parts})"
+                                " GROUP BY dimension, key"):
+                out[r[0]][r[1]] = out[r[0]].get(r[1], 0) + r[2]
+        return out[dimension] if dimension else out
+
+    @staticmethod
+    def rebuild(workspace_id: int = None):
+        """Recompute counts from the base tables (all workspaces by default)."""
+        paths = [_ws_db(workspace_id)] if workspace_id is not None else database_paths()
+        for path in paths:
+            with get_db(path) as db:
+                _begin_write(db)
+                _rebuild_stats(db, workspace_id)
+
+
+class SearchRepo:
+    @staticmethod
+    def _match(workspace_id: Optional[int], text: str, cols: tuple) -> str:
+        """Turn free text into an FTS5 query: words AND-ed, last one as prefix."""
+        words = ['"' + w.replace('"', '""') + '"' for w in text.split()]
+        if not words:
+            return ""
+        words[-1] += "*"
+        query = f'{{{" ".join(cols)}}} : ({" ".join(words)})'
+        if workspace_id is None:
+            return query
+        return f'ws : "{int(workspace_id)}" AND {query}'
+
+    @staticmethod
+    def _select(kind: str, schema: str = "main") -> str:
+        # Column 0 is ws; snippet each text column and keep the first one
+        # that actually contains a hit.
+        fts, _, cols = FTS_TABLES[kind]
+        snips = ", ".join(f"snippet({fts}, {i}, ?, ?, '…', 12) AS s{i}"
+                          for i in range(1, len(cols) + 1))
+        return (f"SELECT * FROM (SELECT rowid AS id, CAST(ws AS INTEGER) AS workspace_id,"
+                f" rank AS score, {cols[0]} AS title, {snips}"
+                f" FROM {schema}.{fts} WHERE {fts} MATCH ? ORDER BY rank LIMIT ?)")
+
+    @staticmethod
+    def _run(db, kind: str, sql: str, params: list, mark: tuple) -> list:
+        try:
+            rows = db.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                raise RuntimeError("SQLite was built without FTS5; search unavailable") from e
+            raise
+        n = len(FTS_TABLES[kind][2])
+        results = []
+        for r in rows:
+            snippets = [r[f"s{i}"] for i in range(1, n + 1)]
+            snippet = next((x for x in snippets if x and mark[0] in x), snippets[0])
+            results.append({"kind": kind, "id": r["id"], "workspace_id": r["workspace_id"],
+                            "score": r["score"], "title": r["title"], "snippet": snippet})
+        return results
+
+    @staticmethod
+    def query(workspace_id: int, text: str, kinds: tuple = ("vuln", "asset", "log"),
+              limit: int = 50, mark: tuple = ("[", "]")) -> list:
+        """
+        Ranked full-text search within a workspace.
+        Returns [{kind, id, workspace_id, score, title, snippet}] best match
+        first (score is bm25: lower is better).
+        """
+        results = []
+        with get_db(_ws_db(workspace_id)) as db:
+            for kind in kinds:
+                cols = FTS_TABLES[kind][2]
+                match = SearchRepo._match(workspace_id, text, cols)
+                if not match:
+                    return []
+                results += SearchRepo._run(db, kind, SearchRepo._select(kind),
+                                           [*mark * len(cols), match, limit], mark)
+        results.sort(key=lambda r: r["score"])
+        return results[:limit]
+
+    @staticmethod
+    def query_all(text: str, kinds: tuple = ("vuln", "asset", "log"),
+                  limit: int = 50, mark: tuple = ("[", "]")) -> list:
+        """
+        Ranked full-text search across every workspace, same rows as query().
+        When sharded, shards are ATTACHed in groups and each group is
+        searched with one UNION ALL query.
+        """
+        results = []
+        for kind in kinds:
+            cols = FTS_TABLES[kind][2]
+            match = SearchRepo._match(None, text, cols)
+            if not match:
+                return []
+            for db, schemas in _attached():
+                sql = " UNION ALL ".join(SearchRepo._select(kind, s) for s in schemas)
+                params = [*mark * len(cols), match, limit] * len(schemas)
+                results += SearchRepo._run(db, kind, sql, params, mark)
+        results.sort(key=lambda r: r["score"])
+        return results[:limit]
+
+    @staticmethod
+    def index_evidence_in(db, workspace_id: int = None, chunk: int = 500):
+        """
+        Index the decoded evidence blobs of stored vulnerabilities (of one
+        workspace) in fts_vulns, for rows written by plain SQL.
+        """
+        if not db.execute("SELECT 1 FROM sqlite_master WHERE name='fts_vulns'").fetchone():
+            return
+        ws = " AND v.workspace_id = :ws" if workspace_id is not None else ""
+        last = 0
+        while True:
             rows = db.execute(
-                """SELECT v.severity, COUNT(*) as cnt
-                   FROM vulnerabilities v JOIN targets t ON v.target_id=t.id
-                   WHERE t.workspace_id=? GROUP BY v.severity""",
-                (workspace_id,)
-            ).fetchall()
-            return {r["severity"]: r["cnt"] for r in rows}
+                "SELECT v.id, b.codec, b.data FROM vulnerabilities v"
+                " JOIN evidence_blobs b ON b.hash = v.evidence_ref"
+                f" WHERE v.id > :last{ws} ORDER BY v.id LIMIT :n",
+                {"last": last, "ws": workspace_id, "n": chunk}).fetchall()
+            if not rows:
+                break
+            last = rows[-1]["id"]
+            db.executemany("UPDATE fts_vulns SET evidence=? WHERE rowid=?",
+                           [(_evidence_text(r["codec"], r["data"]), r["id"]) for r in rows])
+
+    @staticmethod
+    def rebuild():
+        """Repopulate every FTS index from its base table, creating any missing."""
+        for path in database_paths():
+            SearchRepo._rebuild(path)
+
+    @staticmethod
+    def _rebuild(path: Optional[Path]):
+        with get_db(path) as db:
+            if not _ensure_fts(db):
+                return                      # no FTS5: nothing to rebuild
+            for kind, (fts, _, _) in FTS_TABLES.items():
+                db.execute(f"DELETE FROM {fts}")
+                _fts_fill(db, kind)
 
 
 class JobRepo:
     @staticmethod
     def create(workspace_id: int, job_type: str, config: dict = None) -> int:
-        with get_db() as db:
+        with get_db(_ws_db(workspace_id)) as db:
             cur = db.execute(
                 "INSERT INTO scan_jobs(workspace_id, type, config) VALUES(?,?,?)",
                 (workspace_id, job_type, json.dumps(config or {}))
             )
             return cur.lastrowid
 
+    @staticmethod
+    def get(job_id: int) -> Optional[dict]:
+        with get_db(_id_db(job_id)) as db:
+            row = db.execute("SELECT * FROM scan_jobs WHERE id=?", (job_id,)).fetchone()
+            return dict(row) if row else None
+
     @staticmethod
     def start(job_id: int):
-        with get_db() as db:
+        with get_db(_id_db(job_id)) as db:
             db.execute(
                 "UPDATE scan_jobs SET status='running',"
-                " started_at=strftime('%s','now') WHERE id=?",
+                " started_at=strftime('%s','now') WHERE id=? AND status != 'cancelled'",
                 (job_id,)
             )
 
     @staticmethod
     def finish(job_id: int, result_count: int = 0):
-        with get_db() as db:
+        """Mark a job done, unless it was cancelled meanwhile."""
+        with get_db(_id_db(job_id)) as db:
             db.execute(
                 "UPDATE scan_jobs SET status='done',"
                 " finished_at=strftime('%s','now'),"
-                " result_count=? WHERE id=?",
+                " result_count=? WHERE id=? AND status != 'cancelled'",
                 (result_count, job_id)
             )
 
     @staticmethod
     def fail(job_id: int, error_msg: str):
-        with get_db() as db:
+        with get_db(_id_db(job_id)) as db:
             db.execute(
                 "UPDATE scan_jobs SET status='error',"
                 " finished_at=strftime('%s','now'),"
@@ -380,21 +2370,98 @@ class JobRepo:
                 (error_msg, job_id)
             )
 
+    @staticmethod
+    def cancel(job_id: int, reason: str = "Cancelled by user"):
+        with get_db(_id_db(job_id)) as db:
+            db.execute(
+                "UPDATE scan_jobs SET status='cancelled',"
+                " finished_at=strftime('%s','now'),"
+                " error_msg=? WHERE id=?",
+                (reason, job_id)
+            )
+
+    # ── per-target progress (multi-target jobs) ──────────────────────────────
+    @staticmethod
+    def add_targets(job_id: int, target_ids: List[int]):
+        with get_db(_id_db(job_id)) as db:
+            db.executemany("INSERT OR IGNORE INTO job_targets(job_id, target_id) VALUES(?,?)",
+                           ((job_id, t) for t in target_ids))
+
+    @staticmethod
+    def start_target(job_id: int, target_id: int):
+        with get_db(_id_db(job_id)) as db:
+            db.execute("UPDATE job_targets SET status='running',"
+                       " started_at=strftime('%s','now') WHERE job_id=? AND target_id=?",
+                       (job_id, target_id))
+
+    @staticmethod
+    def finish_target(job_id: int, target_id: int, findings: int,
+                      status: str = "done", error_msg: str = None):
+        with get_db(_id_db(job_id)) as db:
+            db.execute("UPDATE job_targets SET status=?, findings=?, error_msg=?,"
+                       " finished_at=strftime('%s','now') WHERE job_id=? AND target_id=?",
+                       (status, findings, error_msg, job_id, target_id))
+
+    @staticmethod
+    def cancel_targets(job_id: int) -> int:
+        """Mark the targets a cancelled job never started; returns how many."""
+        with get_db(_id_db(job_id)) as db:
+            return db.execute("UPDATE job_targets SET status='cancelled',"
+                              " finished_at=strftime('%s','now')"
+                              " WHERE job_id=? AND status='queued'", (job_id,)).rowcount
+
+    @staticmethod
+    def progress(job_id: int) -> dict:
+        """{"total", "findings", <status>: count, ...} over a job's targets."""
+        with get_db(_id_db(job_id)) as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n, SUM(findings) AS f"
+                              " FROM job_targets WHERE job_id=? GROUP BY status",
+                              (job_id,)).fetchall()
+        out = {"total": 0, "findings": 0}
+        for r in rows:
+            out[r["status"]] = r["n"]
+            out["total"] += r["n"]
+            out["findings"] += r["f"] or 0
+        return out
+
+    @staticmethod
+    def targets(job_id: int, status: str = None) -> list:
+        q = "SELECT * FROM job_targets WHERE job_id=?"
+        params = [job_id]
+        if status is not None:
+            q += " AND status=?"
+            params.append(status)
+        with get_db(_id_db(job_id)) as db:
+            return [dict(r) for r in db.execute(q + " ORDER BY id", params)]
+
     @staticmethod
     def log(job_id: int, plugin_id: str, message: str,
             level: str = "info", data: dict = None):
-        with get_db() as db:
+        with get_db(_id_db(job_id)) as db:
             db.execute(
                 "INSERT INTO plugin_logs"
                 "(job_id, plugin_id, level, message, data) VALUES(?,?,?,?,?)",
                 (job_id, plugin_id, level, message, json.dumps(data or {}))
             )
 
+    @staticmethod
+    def bulk_log(rows: List[tuple]):
+        """Insert many (job_id, plugin_id, level, message, data, ts) rows at once."""
+        for path, idx in group_by_shard(rows, lambda r: r[0]).items():
+            with get_db(path) as db:
+                db.executemany(
+                    "INSERT INTO plugin_logs"
+                    "(job_id, plugin_id, level, message, data, ts) VALUES(?,?,?,?,?,?)",
+                    [(j, p, lvl, msg, json.dumps(d or {}), int(ts))
+                     for j, p, lvl, msg, d, ts in (rows[i] for i in idx)]
+                )
+
 
 # ─── QUICK INIT ──────────────────────────────────────────────────────────────
 def init_db():
-    """Create DB schema and default workspace."""
+    """Upgrade the DB schema to the latest migration and create the default workspace."""
     with get_db() as db:
+        migrate(db)
         db.execute(
             "INSERT OR IGNORE INTO workspaces(name, description) VALUES(?,?)",
             ("default", "Default workspace")
@@ -3,12 +3,19 @@ SROF · Execution Engine
 Schedules plugins, streams findings to DB and UI callbacks.
 """
 import threading, queue, time, traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, List, Optional, Dict, Any, Union
 
 from .plugin   import SROFPlugin, PluginRegistry, PluginConfig, Finding
-from .database import (AssetRepo, VulnRepo, JobRepo, Asset, Vulnerability,
-                       TargetRepo)
+from .database import JobRepo, VulnRepo, TargetRepo
+from .writer   import FindingWriter
+from .logsink  import LogSink
+from .spool    import FindingSpool
+from .runner   import Cancelled, KILL_GRACE, cancel_job, release_job
+from .pipeline import Pipeline, BATCH_WAIT
+from .scheduler import Scheduler
 
 
 # ─── EVENTS ──────────────────────────────────────────────────────────────────
@@ -19,22 +26,60 @@ class EngineEvent:
     FINDING      = "finding"
     PLUGIN_START = "plugin_start"
     PLUGIN_DONE  = "plugin_done"
+    TARGET_START = "target_start"
+    TARGET_DONE  = "target_done"
     LOG          = "log"
 
 
+# ─── TARGET SETS ─────────────────────────────────────────────────────────────
+def resolve_targets(workspace_id: int, targets, errors: list = None) -> List[int]:
+    """
+    Target ids of a multi-target job: ids as given, the targets of a scope
+    file or list of scope entries (added to the workspace if new), or
+    TargetRepo.select_ids(**filter). Scope entries that cannot be parsed
+    are skipped and, if `errors` is a list, collected in it (see bulk_add).
+    """
+    if isinstance(targets, dict):
+        ids = TargetRepo.select_ids(workspace_id, **targets)
+    elif isinstance(targets, (str, Path)):
+        ids = list(TargetRepo.bulk_add(workspace_id, targets, errors=errors).values())
+    else:
+        targets = list(targets)
+        if all(isinstance(t, int) for t in targets):
+            ids = targets
+        else:
+            ids = list(TargetRepo.bulk_add(workspace_id, targets, errors=errors).values())
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError("Target set is empty")
+    return ids
+
+
 # ─── ENGINE ──────────────────────────────────────────────────────────────────
 class Engine:
     """
     Runs one or more plugins against a target.
     Streams findings through callbacks (for live UI updates).
     Persists everything to DB.
+
+    Plugin runs of every job go through one Scheduler: max_workers slots
+    (default SROF_WORKERS or 8) with per-plugin, per-category and weight
+    limits, so concurrent jobs queue instead of oversubscribing the host.
     """
 
-    def __init__(self, max_workers: int = 8):
-        self._max_workers = max_workers
+    def __init__(self, max_workers: int = None, writer: FindingWriter = None,
+                 logs: LogSink = None, spool: FindingSpool = None,
+                 scheduler: Scheduler = None):
+        self._scheduler = scheduler or Scheduler.from_env(max_workers)
+        self._max_workers = self._scheduler.slots
         self._callbacks: List[Callable] = []
         self._active_jobs: Dict[int, threading.Event] = {}
         self._lock = threading.Lock()
+        self._writer = writer or FindingWriter()
+        self._logs = logs or LogSink.from_env()
+        self._spool = spool or FindingSpool.from_env()    # None: spooling off
+        if self._writer.on_error is None:
+            self._writer.on_error = self._write_failed
 
     # ── CALLBACK ─────────────────────────────────────────────────────────────
     def on_event(self, cb: Callable):
@@ -49,6 +94,12 @@ class Engine:
             except Exception:
                 pass
 
+    def _write_failed(self, job_id: int, message: str, data: dict):
+        """FindingWriter.on_error: report a failed batch in the job's log."""
+        self._logs.log(job_id, "core.writer", message, "error", data)
+        self._emit(EngineEvent.LOG, {"job_id": job_id, "plugin": "core.writer",
+                                     "level": "error", "message": message})
+
     # ── RUN ──────────────────────────────────────────────────────────────────
     def run(self,
             workspace_id: int,
@@ -60,20 +111,8 @@ class Engine:
         Dispatch a job.
         Returns job_id immediately; if blocking=True waits for completion.
         """
-        job_id = JobRepo.create(workspace_id, "mixed",
-                                {"plugins": plugin_ids, "target": config.target})
-        config.workspace_id = workspace_id
-        config.job_id = job_id
-
-        cancel_evt = threading.Event()
-        with self._lock:
-            self._active_jobs[job_id] = cancel_evt
-
-        def _worker():
-            JobRepo.start(job_id)
-            self._emit(EngineEvent.JOB_START, {"job_id": job_id, "target": config.target})
+        def _body(job_id: int, cancel_evt: threading.Event) -> int:
             total = 0
-
             plugins = []
             for pid in plugin_ids:
                 cls = PluginRegistry.get(pid)
@@ -85,32 +124,240 @@ class Engine:
                     continue
                 plugins.append(cls())
 
-            with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
-                futs = {
-                    pool.submit(self._run_plugin, p, config, job_id,
-                                cancel_evt, target_id): p
-                    for p in plugins
-                }
-                for fut in as_completed(futs):
-                    plugin = futs[fut]
-                    try:
-                        count = fut.result()
-                        total += count
-                        self._emit(EngineEvent.PLUGIN_DONE,
-                                   {"job_id": job_id, "plugin": plugin.id,
-                                    "findings": count})
-                    except Exception as e:
-                        self._emit(EngineEvent.LOG, {
-                            "job_id": job_id, "level": "error",
-                            "message": f"{plugin.id} crashed: {e}",
-                            "traceback": traceback.format_exc()
-                        })
-
-            JobRepo.finish(job_id, total)
-            self._emit(EngineEvent.JOB_DONE,
-                       {"job_id": job_id, "total_findings": total})
-            with self._lock:
-                self._active_jobs.pop(job_id, None)
+            futs = {
+                self._scheduler.submit(self._run_plugin, p, config, job_id,
+                                       cancel_evt, target_id, plugin=p, job_id=job_id): p
+                for p in plugins
+            }
+            for fut in as_completed(futs):
+                plugin = futs[fut]
+                try:
+                    count = fut.result()
+                    total += count
+                    self._emit(EngineEvent.PLUGIN_DONE,
+                               {"job_id": job_id, "plugin": plugin.id,
+                                "findings": count})
+                except Exception as e:
+                    self._crashed(job_id, plugin, e)
+            return total
+
+        return self._launch(workspace_id, "mixed",
+                            {"plugins": plugin_ids, "target": config.target,
+                             "target_id": target_id},
+                            config, _body, blocking)
+
+    def run_pipeline(self,
+                     workspace_id: int,
+                     target_id: int,
+                     plugin_ids: List[str],
+                     config: PluginConfig,
+                     blocking: bool = True,
+                     batch_wait: float = BATCH_WAIT) -> int:
+        """
+        Dispatch a pipeline job: the plugins (and what they require) run as
+        a DAG, each stage fed the findings of those upstream in micro-batches
+        as they stream in (see core.pipeline). Raises ValueError for an
+        unknown plugin or a cycle, before the job is created.
+        """
+        pipe = Pipeline(plugin_ids, batch_wait)
+
+        def _body(job_id: int, cancel_evt: threading.Event) -> int:
+            run_stage = self._stage_runner(config, job_id, cancel_evt, target_id)
+            return pipe.run(config.target, self._submitter(job_id), run_stage, cancel_evt)
+
+        return self._launch(workspace_id, "pipeline",
+                            {"plugins": [st["plugin"] for st in pipe.plan()],
+                             "target": config.target, "target_id": target_id},
+                            config, _body, blocking)
+
+    def run_targets(self,
+                    workspace_id: int,
+                    targets: Union[List[int], str, Path, dict],
+                    plugin_ids: List[str],
+                    config: PluginConfig,
+                    concurrency: int = None,
+                    pipeline: bool = False,
+                    blocking: bool = True) -> int:
+        """
+        Dispatch one job over a set of targets: a list of target ids, a scope
+        file or list of scope entries (imported first, see TargetRepo.bulk_add)
+        or a filter for TargetRepo.select_ids, e.g. {"status": "pending"}.
+
+        Each target runs the plugins (as a pipeline if `pipeline`) with
+        config.target set to its host (its port and scheme, if any, in
+        config.extra), and its findings are recorded against its own id.
+        At most `concurrency` (default max_workers) of the job's plugin runs
+        hold scheduler slots at once, and at most that many targets are in
+        flight. Progress
+        is kept per target in job_targets (JobRepo.progress) and emitted as
+        TARGET_START / TARGET_DONE events.
+        """
+        skipped = []
+        target_ids = resolve_targets(workspace_id, targets, skipped)
+        if pipeline:
+            Pipeline(plugin_ids)                # unknown plugins, cycles: fail now
+        classes = []
+        for pid in plugin_ids:
+            cls = PluginRegistry.get(pid)
+            if cls is None:
+                raise ValueError(f"Plugin not found: {pid}")
+            classes.append(cls)
+        concurrency = concurrency or self._max_workers
+
+        def _body(job_id: int, cancel_evt: threading.Event) -> int:
+            for line_no, entry, reason in skipped:
+                self._emit(EngineEvent.LOG, {
+                    "job_id": job_id, "level": "warn",
+                    "message": f"Scope line {line_no} skipped: {reason}"
+                })
+            JobRepo.add_targets(job_id, target_ids)
+            rows = TargetRepo.get_many(target_ids)
+            tally = {"done": 0, "findings": 0}
+            tally_lock = threading.Lock()
+
+            def _target(target_id: int) -> int:
+                if cancel_evt.is_set():
+                    return 0
+                row = rows.get(target_id)
+                if row is None:
+                    JobRepo.finish_target(job_id, target_id, 0, "error", "No such target")
+                    return 0
+                extra = dict(config.extra)
+                if row.get("port"):
+                    extra.update(port=row["port"], scheme=row.get("scheme"))
+                cfg = replace(config, target=row["host"], inputs=[], extra=extra)
+                JobRepo.start_target(job_id, target_id)
+                TargetRepo.update_status(target_id, "active")
+                self._emit(EngineEvent.TARGET_START,
+                           {"job_id": job_id, "target_id": target_id, "host": row["host"]})
+
+                count, error = 0, None
+                try:
+                    if pipeline:
+                        run_stage = self._stage_runner(cfg, job_id, cancel_evt, target_id)
+                        count = Pipeline(plugin_ids).run(cfg.target, self._submitter(job_id),
+                                                         run_stage, cancel_evt)
+                    else:
+                        futs = {self._scheduler.submit(self._run_plugin, cls(), cfg, job_id,
+                                                       cancel_evt, target_id,
+                                                       plugin=cls, job_id=job_id): cls
+                                for cls in classes}
+                        for fut in as_completed(futs):
+                            try:
+                                count += fut.result()
+                            except Exception as e:
+                                self._crashed(job_id, futs[fut], e)
+                except Exception as e:
+                    error = str(e)
+                    self._crashed(job_id, row["host"], e)
+
+                status = "error" if error else "cancelled" if cancel_evt.is_set() else "done"
+                JobRepo.finish_target(job_id, target_id, count, status, error)
+                TargetRepo.update_status(target_id, {"done": "done", "error": "error"}
+                                         .get(status, "pending"))
+                with tally_lock:
+                    tally["done"] += 1
+                    tally["findings"] += count
+                    done = tally["done"]
+                self._emit(EngineEvent.TARGET_DONE,
+                           {"job_id": job_id, "target_id": target_id, "host": row["host"],
+                            "status": status, "findings": count,
+                            "done": done, "total": len(target_ids)})
+                return count
+
+            # Coordinators only wait on the scheduler, which does the work.
+            self._scheduler.limit_job(job_id, concurrency)
+            with ThreadPoolExecutor(max_workers=concurrency) as coordinators:
+                wait([coordinators.submit(_target, tid) for tid in target_ids])
+            if cancel_evt.is_set():
+                JobRepo.cancel_targets(job_id)
+            return tally["findings"]
+
+        return self._launch(workspace_id, "multi",
+                            {"plugins": plugin_ids, "targets": len(target_ids),
+                             "skipped": len(skipped),
+                             "pipeline": pipeline, "concurrency": concurrency},
+                            config, _body, blocking)
+
+    def _submitter(self, job_id: int) -> Callable:
+        """submit(fn, plugin_cls) for Pipeline.run: the job's runs on the scheduler."""
+        return lambda fn, cls: self._scheduler.submit(fn, plugin=cls, job_id=job_id)
+
+    def _stage_runner(self, config: PluginConfig, job_id: int,
+                      cancel_evt: threading.Event, target_id: int) -> Callable:
+        """run_stage(plugin_cls, inputs, on_finding) for Pipeline.run."""
+        def _run_stage(cls, inputs: List[str], on_finding: Callable) -> int:
+            plugin = cls()
+            cfg = replace(config, target=inputs[0], inputs=list(inputs))
+            try:
+                count = self._run_plugin(plugin, cfg, job_id, cancel_evt,
+                                         target_id, on_finding)
+            except Exception as e:
+                self._crashed(job_id, plugin, e)
+                return 0
+            self._emit(EngineEvent.PLUGIN_DONE,
+                       {"job_id": job_id, "plugin": plugin.id,
+                        "findings": count, "inputs": len(inputs)})
+            return count
+        return _run_stage
+
+    def _launch(self, workspace_id: int, job_type: str, job_config: dict,
+                config: PluginConfig, body: Callable, blocking: bool) -> int:
+        """Create the job and run body(job_id, cancel_evt) -> findings on its thread."""
+        job_id = JobRepo.create(workspace_id, job_type, job_config)
+        config.workspace_id = workspace_id
+        config.job_id = job_id
+
+        cancel_evt = threading.Event()
+        with self._lock:
+            self._active_jobs[job_id] = cancel_evt
+
+        def _worker():
+            total, error = 0, None
+            try:
+                if self._spool:
+                    self._spool.open_job(job_id)
+                JobRepo.start(job_id)
+                self._logs.open_job(job_id, config.log_level)
+                self._emit(EngineEvent.JOB_START, {"job_id": job_id, "target": config.target})
+                total = body(job_id, cancel_evt)
+            except Exception as e:
+                error = e
+                self._crashed(job_id, job_type, e)
+            try:
+                # Findings and log lines still buffered belong to this job;
+                # the spool also holds whatever a failed batch left uncommitted.
+                if self._spool:
+                    self._spool.drain(job_id, self._writer)
+                else:
+                    self._writer.flush()
+                # Spooled findings that still failed stay in the spool for
+                # recovery; without a spool they are gone.
+                lost = self._writer.take_failed(job_id)
+                if lost and not self._spool and error is None:
+                    error = RuntimeError(f"{lost} findings failed to commit")
+                if error is not None:
+                    if not cancel_evt.is_set():
+                        JobRepo.fail(job_id, f"{type(error).__name__}: {error}")
+                elif not cancel_evt.is_set():
+                    JobRepo.finish(job_id, total)
+            finally:
+                self._logs.close_job(job_id)
+                if self._spool:
+                    self._spool.close_job(job_id)
+                # Under the lock, so cancel() either finds the job and registers
+                # the cancellation before this releases it, or does not find it.
+                with self._lock:
+                    self._active_jobs.pop(job_id, None)
+                    release_job(job_id)
+                self._scheduler.forget_job(job_id)
+            if error is not None:
+                self._emit(EngineEvent.JOB_ERROR, {"job_id": job_id, "error": str(error)})
+            else:
+                self._emit(EngineEvent.JOB_DONE,
+                           {"job_id": job_id, "total_findings": total,
+                            "cancelled": cancel_evt.is_set(),
+                            "vulns": VulnRepo.job_summary(job_id)})
 
         t = threading.Thread(target=_worker, daemon=True, name=f"srof-job-{job_id}")
         t.start()
@@ -118,19 +365,29 @@ class Engine:
             t.join()
         return job_id
 
+    def _crashed(self, job_id: int, plugin, e: Exception):
+        self._emit(EngineEvent.LOG, {
+            "job_id": job_id, "level": "error",
+            "message": f"{getattr(plugin, 'id', plugin)} crashed: {e}",
+            "traceback": traceback.format_exc()
+        })
+
     # ── SINGLE PLUGIN ────────────────────────────────────────────────────────
     def _run_plugin(self, plugin: SROFPlugin, config: PluginConfig,
                     job_id: int, cancel_evt: threading.Event,
-                    target_id: int) -> int:
-        """Run one plugin, persist findings, return count."""
+                    target_id: int, on_finding: Callable = None) -> int:
+        """Run one plugin, persist findings (then pass each to on_finding), return count."""
         def _log_cb(plugin_id, msg, level, data):
-            JobRepo.log(job_id, plugin_id, msg, level, data)
+            self._logs.log(job_id, plugin_id, msg, level, data)
             self._emit(EngineEvent.LOG,
                        {"job_id": job_id, "plugin": plugin_id,
                         "level": level, "message": msg})
 
         plugin.set_logger(_log_cb)
 
+        if cancel_evt.is_set():         # queued behind the cancelled job's others
+            return 0
+
         err = plugin.validate_config(config)
         if err:
             plugin.error(f"Config invalid: {err}")
@@ -140,8 +397,9 @@ class Engine:
                    {"job_id": job_id, "plugin": plugin.id})
         count = 0
 
+        findings = plugin.run(config)
         try:
-            for finding in plugin.run(config):
+            for finding in findings:
                 if cancel_evt.is_set():
                     plugin.warn("Job cancelled")
                     break
@@ -151,47 +409,53 @@ class Engine:
                 self._emit(EngineEvent.FINDING,
                            {"job_id": job_id, "plugin": plugin.id,
                             "finding": finding.to_dict()})
+                if on_finding:
+                    on_finding(finding)
+        except Cancelled:               # its tool was killed by cancel()
+            plugin.warn("Job cancelled")
         except Exception as e:
             plugin.error(f"Runtime error: {e}")
             raise
+        finally:
+            findings.close()            # kills its tools, removes its temp files
 
         return count
 
     # ── PERSIST ──────────────────────────────────────────────────────────────
     def _persist_finding(self, f: Finding, target_id: int, job_id: int):
-        asset_id = None
-
-        if f.type == "asset":
-            a = Asset(
-                target_id=target_id,
-                type=f.metadata.get("asset_type", "url"),
-                value=f.value,
-                source=f.source,
-                metadata=f.metadata,
-            )
-            asset_id = AssetRepo.add(a)
-
-        elif f.type == "vuln":
-            v = Vulnerability(
-                target_id=target_id,
-                plugin_id=f.source,
-                name=f.title or f.value,
-                severity=f.severity,
-                description=f.description,
-                evidence=f.evidence,
-                cve=f.cve,
-                cvss=f.cvss,
-                asset_id=asset_id,
-            )
-            VulnRepo.add(v)
+        """
+        Spool the finding, then hand it to the group-commit writer, which
+        blocks the plugin while it is behind.
+        """
+        if self._spool:
+            return self._spool.append(job_id, target_id, f, self._writer)
+        return self._writer.submit(f, target_id, job_id)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued finding is committed."""
+        return self._writer.flush(timeout)
 
     # ── CANCEL ───────────────────────────────────────────────────────────────
-    def cancel(self, job_id: int):
+    def cancel(self, job_id: int, grace: float = KILL_GRACE):
+        """
+        Stop a running job. Its plugins stop at their next finding, and the
+        process tree of every tool it runs gets SIGTERM (SIGKILL after
+        `grace` seconds), which ends a blocked plugin and frees its worker
+        at once; its runs still queued for a slot are dropped. The job is
+        recorded as 'cancelled'.
+        """
         with self._lock:
             evt = self._active_jobs.get(job_id)
-            if evt:
-                evt.set()
-                JobRepo.fail(job_id, "Cancelled by user")
+            if not evt:
+                return
+            evt.set()
+            JobRepo.cancel(job_id)
+            cancel_job(job_id, grace)
+        self._scheduler.cancel_job(job_id)
+
+    def load(self) -> dict:
+        """Scheduler slots in use, runs queued and running per plugin."""
+        return self._scheduler.stats()
 
     # ── CONVENIENCE ──────────────────────────────────────────────────────────
     def run_recon(self, workspace_id, target_id, config, blocking=True):
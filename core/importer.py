@@ -0,0 +1,198 @@
+"""
+SROF · Offline Import
+Load output of tools run outside SROF (nmap XML, nuclei/httpx/subfinder
+JSONL, ffuf JSON) without re-running the scan.
+
+Each format is parsed by its plugin's parse(), the same code run() uses,
+one record at a time, so file size does not change memory use. Findings
+go through the FindingWriter like those of a live scan and are recorded
+against one 'import' job.
+
+Findings are stored against the given target, or else against a target
+per host (created on first sight) taken from the finding's value.
+
+Run from the CLI:
+    python -m core.importer scans/ --workspace 1
+    python -m core.importer out.xml --workspace 1 --format nmap --target-id 7
+"""
+import sys, time, argparse, importlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .plugin   import PluginRegistry, Finding
+from .database import JobRepo, TargetRepo, Target, parse_targets
+from .writer   import FindingWriter
+
+# format: (plugin module, plugin id)
+FORMATS = {
+    "nmap":      ("modules.recon.plugins", "recon.nmap"),
+    "nuclei":    ("modules.scan.plugins",  "scan.nuclei"),
+    "ffuf":      ("modules.recon.plugins", "recon.ffuf"),
+    "httpx":     ("modules.recon.plugins", "recon.httpx"),
+    "subfinder": ("modules.recon.plugins", "recon.subfinder"),
+}
+SNIFF_BYTES = 4096
+
+
+def detect(path) -> Optional[str]:
+    """Guess a file's format from its first few KB (None if unrecognised)."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        head = f.read(SNIFF_BYTES)
+    text = head.lstrip()
+    if text.startswith("<"):
+        return "nmap" if "<nmaprun" in head else None
+    first = text.split("\n", 1)[0]
+    if text.startswith("{"):
+        if '"commandline"' in head and '"results"' in head:
+            return "ffuf"
+        if '"template-id"' in first:
+            return "nuclei"
+        if '"status_code"' in first or '"status-code"' in first or '"webserver"' in first:
+            return "httpx"
+        if '"host"' in first:
+            return "subfinder"
+        return None
+    # Plain subfinder output: bare host names, one per line.
+    lines = [l.strip() for l in text.splitlines()[:20] if l.strip()]
+    if lines and all(" " not in l and "." in l and "/" not in l for l in lines):
+        return "subfinder"
+    return None
+
+
+def _plugin(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r} (known: {', '.join(FORMATS)})")
+    module, plugin_id = FORMATS[fmt]
+    if PluginRegistry.get(plugin_id) is None:
+        importlib.import_module(module)
+    return PluginRegistry.get(plugin_id)()
+
+
+@dataclass
+class ImportReport:
+    path: str
+    format: str
+    findings: int = 0
+    skipped: int = 0                # no target could be derived
+    seconds: float = 0.0
+    error: str = ""
+
+    @property
+    def rate(self) -> float:
+        """Findings committed per second."""
+        return self.findings / self.seconds if self.seconds else 0.0
+
+
+class _Targets:
+    """Finding → target_id: the fixed target, or one target per host."""
+
+    def __init__(self, workspace_id: int, target_id: Optional[int]):
+        self.workspace_id, self.target_id = workspace_id, target_id
+        self._ids: Dict[str, int] = {}
+
+    def resolve(self, f: Finding) -> Optional[int]:
+        if self.target_id is not None:
+            return self.target_id
+        # URL, host:port, or dns_resolve's "host → ip"
+        entry = f.value.split(" → ", 1)[0].strip().split(" ", 1)[0]
+        try:
+            parsed = next(parse_targets(entry), None)
+        except ValueError:
+            parsed = None
+        if not parsed:
+            return None
+        host = parsed[0]
+        if host not in self._ids:
+            self._ids[host] = TargetRepo.add(Target(host=host, workspace_id=self.workspace_id))
+        return self._ids[host]
+
+
+def import_file(path, fmt: str, job_id: int, targets: _Targets,
+                writer: FindingWriter) -> ImportReport:
+    """Stream one file into the writer; the report's time includes the commit."""
+    report = ImportReport(str(path), fmt)
+    plugin = _plugin(fmt)
+    start = time.perf_counter()
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for finding in plugin.parse(f):
+                target_id = targets.resolve(finding)
+                if target_id is None:
+                    report.skipped += 1
+                    continue
+                writer.submit(finding, target_id, job_id)
+                report.findings += 1
+    except Exception as e:          # keep what was parsed; report the rest
+        report.error = f"{type(e).__name__}: {e}"
+    writer.flush()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def import_path(path, workspace_id: int, target_id: int = None, fmt: str = None,
+                writer: FindingWriter = None) -> List[ImportReport]:
+    """
+    Import a file, or every recognised file under a directory, as one
+    'import' job. Returns one ImportReport per file.
+    """
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(p for p in path.rglob("*") if p.is_file())
+    else:
+        files = [path]
+        if fmt is None and detect(path) is None:
+            raise ValueError(f"{path}: unrecognised format; pass fmt=")
+
+    own = writer is None
+    writer = writer or FindingWriter()
+    job_id = JobRepo.create(workspace_id, "import", {"path": str(path), "format": fmt,
+                                                     "target_id": target_id})
+    JobRepo.start(job_id)
+    targets = _Targets(workspace_id, target_id)
+    reports = []
+    try:
+        for p in files:
+            kind = fmt or detect(p)
+            if kind is not None:
+                reports.append(import_file(p, kind, job_id, targets, writer))
+        JobRepo.finish(job_id, sum(r.findings for r in reports))
+    except Exception as e:
+        JobRepo.fail(job_id, str(e))
+        raise
+    finally:
+        if own:
+            writer.close()
+    return reports
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.importer",
+                                 description="Import saved tool output into SROF")
+    ap.add_argument("path", help="output file or directory of files")
+    ap.add_argument("--workspace", type=int, required=True, help="workspace id")
+    ap.add_argument("--target-id", type=int, default=None,
+                    help="record everything against this target (default: one per host)")
+    ap.add_argument("--format", choices=sorted(FORMATS), default=None,
+                    help="skip detection and parse every file as this format")
+    args = ap.parse_args(argv)
+
+    reports = import_path(args.path, args.workspace, args.target_id, args.format)
+    for r in reports:
+        line = (f"[SROF] {r.path} ({r.format}): {r.findings} findings in {r.seconds:.1f}s"
+                f" ({r.rate:.0f}/s)")
+        if r.skipped:
+            line += f", {r.skipped} without a host skipped"
+        if r.error:
+            line += f" — stopped: {r.error}"
+        print(line)
+    total = sum(r.findings for r in reports)
+    seconds = sum(r.seconds for r in reports)
+    print(f"[SROF] {len(reports)} files, {total} findings"
+          f" ({total / seconds if seconds else 0:.0f}/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+SROF · Plugin Log Sink
+Buffers plugin log lines and persists them in batches.
+
+Each job has a minimum persisted level (default: info), so debug chatter
+never reaches the DB unless asked for. Identical lines repeated within a
+window are collapsed into one summary row; a line's repeat state is
+dropped once its window has passed, so memory follows the recent distinct
+lines, not the job's. An optional rotating log file can take the lines
+instead of, or as well as, the plugin_logs table; it is open only while
+some job is.
+"""
+import os, time, threading, logging, logging.handlers
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .database import JobRepo
+
+LEVELS = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+
+_PY_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO,
+              "warn": logging.WARNING, "error": logging.ERROR}
+
+
+class LogSink:
+    def __init__(self,
+                 to_db: bool = True,
+                 log_file: Optional[Path] = None,
+                 max_bytes: int = 10 << 20,
+                 backup_count: int = 5,
+                 default_level: str = "info",
+                 batch_size: int = 200,
+                 flush_interval: float = 1.0,
+                 repeat_limit: int = 5,
+                 repeat_window: float = 60.0):
+        self.to_db = to_db
+        self.default_level = default_level
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.repeat_limit = repeat_limit
+        self.repeat_window = repeat_window
+
+        self._levels: Dict[int, int] = {}
+        self._buffer: List[tuple] = []
+        # (job, plugin, level, message) → [window start, seen, suppressed]
+        self._repeats: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.log_file = Path(log_file) if log_file else None
+        self.max_bytes, self.backup_count = max_bytes, backup_count
+        self._file_log: Optional[logging.Logger] = None
+        if self.log_file:
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            # Not from logging.getLogger: the registry would keep it (and
+            # its handler) alive after the sink is gone.
+            self._file_log = logging.Logger(f"srof.plugins.{id(self)}", logging.DEBUG)
+            self._file_log.propagate = False
+
+    @classmethod
+    def from_env(cls) -> "LogSink":
+        """SROF_LOG_FILE enables the file sink; SROF_LOG_DB=0 turns the DB sink off."""
+        log_file = os.getenv("SROF_LOG_FILE")
+        return cls(to_db=os.getenv("SROF_LOG_DB", "1") != "0",
+                   log_file=Path(log_file) if log_file else None,
+                   default_level=os.getenv("SROF_LOG_LEVEL", "info"))
+
+    # ── JOB SCOPE ────────────────────────────────────────────────────────────
+    def open_job(self, job_id: int, level: str = None):
+        """Set the minimum level persisted for a job."""
+        self._levels[job_id] = LEVELS.get(level or self.default_level, LEVELS["info"])
+        self._start_timer()
+
+    def close_job(self, job_id: int):
+        """Write pending repeat summaries and buffered lines for a job."""
+        with self._lock:
+            for key in [k for k in self._repeats if k[0] == job_id]:
+                self._summarize(key, self._repeats.pop(key))
+            self._levels.pop(job_id, None)
+            if not self._levels:
+                self._close_file()
+        self.flush()
+
+    # ── LOG ──────────────────────────────────────────────────────────────────
+    def log(self, job_id: int, plugin_id: str, message: str,
+            level: str = "info", data: dict = None):
+        if LEVELS.get(level, LEVELS["info"]) < self._levels.get(
+                job_id, LEVELS.get(self.default_level, LEVELS["info"])):
+            return
+        now = time.time()
+        key = (job_id, plugin_id, level, message)
+        with self._lock:
+            state = self._repeats.get(key)
+            if state is None or now - state[0] > self.repeat_window:
+                if state is not None:
+                    self._summarize(key, state)
+                state = self._repeats[key] = [now, 0, 0]
+            state[1] += 1
+            if state[1] > self.repeat_limit:
+                state[2] += 1
+                return
+            self._append(job_id, plugin_id, level, message, data, now)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _summarize(self, key: tuple, state: list):
+        if state[2]:
+            job_id, plugin_id, level, message = key
+            self._append(job_id, plugin_id, level,
+                         f"{message} (suppressed {state[2]} repeats)",
+                         {"suppressed": state[2]}, time.time())
+
+    def _expire(self, now: float):
+        """Summarize and forget repeat state whose window has passed. Holds self._lock."""
+        for key in [k for k, st in self._repeats.items() if now - st[0] > self.repeat_window]:
+            self._summarize(key, self._repeats.pop(key))
+
+    def _append(self, job_id, plugin_id, level, message, data, ts):
+        if self._file_log:
+            if not self._file_log.handlers:
+                handler = logging.handlers.RotatingFileHandler(
+                    self.log_file, maxBytes=self.max_bytes,
+                    backupCount=self.backup_count, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self._file_log.addHandler(handler)
+            self._file_log.log(_PY_LEVELS.get(level, logging.INFO),
+                               "[job %s] [%s] %s", job_id, plugin_id, message)
+        if self.to_db:
+            self._buffer.append((job_id, plugin_id, level, message, data, ts))
+
+    def _close_file(self):
+        if self._file_log:
+            for handler in list(self._file_log.handlers):
+                self._file_log.removeHandler(handler)
+                handler.close()
+
+    # ── FLUSH ────────────────────────────────────────────────────────────────
+    def flush(self):
+        with self._lock:
+            self._expire(time.time())
+            rows, self._buffer = self._buffer, []
+        if rows:
+            try:
+                JobRepo.bulk_log(rows)
+            except Exception as e:
+                print(f"[LogSink] dropped {len(rows)} log lines: {e}")
+
+    def _start_timer(self):
+        with self._lock:
+            if self._timer is None or not self._timer.is_alive():
+                self._timer = threading.Thread(target=self._tick, daemon=True,
+                                               name="srof-logsink")
+                self._timer.start()
+
+    def _tick(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            for key in list(self._repeats):
+                self._summarize(key, self._repeats.pop(key))
+        self.flush()
+        with self._lock:
+            self._close_file()
@@ -0,0 +1,231 @@
+"""
+SROF · Database Maintenance
+Retention, compaction and statistics upkeep for srof.db.
+
+plugin_logs is pruned by age and by job (a pruned job takes its logs
+with it); evidence blobs are dropped once no vulnerability refers to
+them. SQLite has no table partitions, so job_id serves as the partition
+key: every delete runs in short chunks with its own commit, so a running
+scan never waits long for the write lock.
+
+Every pass covers the main database and, when sharded, each workspace
+file (see core.database.ShardRouter).
+
+Run from the CLI:
+    python -m core.maintenance --log-days 30 --keep-jobs 200
+or in-process with start_background().
+"""
+import sys, time, threading, argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .database import (get_db, get_connection, database_paths, DB_PATH,
+                       StatsRepo, SearchRepo, InventoryRepo)
+
+FINISHED = ("done", "error", "cancelled")
+
+
+@dataclass
+class RetentionPolicy:
+    log_max_age_days: Optional[float] = 30     # plugin_logs older than this go
+    keep_jobs: Optional[int] = 500             # newest finished jobs kept
+    job_max_age_days: Optional[float] = None   # finished jobs older than this go
+    chunk: int = 5000                          # rows per delete transaction
+    pause: float = 0.01                        # seconds between chunks
+    vacuum_pages: int = 2000                   # incremental_vacuum pages per run
+
+
+# ─── SIZE ────────────────────────────────────────────────────────────────────
+def db_size(path: Path = None) -> dict:
+    conn = get_connection(path)
+    path = Path(path or DB_PATH)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    wal = Path(str(path) + "-wal")
+    return {
+        "file_bytes":  path.stat().st_size if path.exists() else 0,
+        "wal_bytes":   wal.stat().st_size if wal.exists() else 0,
+        "page_count":  conn.execute("PRAGMA page_count").fetchone()[0],
+        "free_pages":  conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "page_size":   page_size,
+    }
+
+
+# ─── PRUNING ─────────────────────────────────────────────────────────────────
+def _chunked_delete(table: str, where: str, params: tuple, policy: RetentionPolicy,
+                    id_col: str = "id", path: Path = None) -> int:
+    total = 0
+    while True:
+        with get_db(path) as db:
+            n = db.execute(
+                f"DELETE FROM {table} WHERE {id_col} IN"
+                f" (SELECT {id_col} FROM {table} WHERE {where} LIMIT ?)",
+                (*params, policy.chunk)
+            ).rowcount
+        total += n
+        if n < policy.chunk:
+            return total
+        time.sleep(policy.pause)
+
+
+def prune_logs(policy: RetentionPolicy, path: Path = None) -> int:
+    """Delete plugin_logs rows older than policy.log_max_age_days."""
+    if policy.log_max_age_days is None:
+        return 0
+    cutoff = int(time.time() - policy.log_max_age_days * 86400)
+    return _chunked_delete("plugin_logs", "ts < ?", (cutoff,), policy, path=path)
+
+
+def prune_jobs(policy: RetentionPolicy, path: Path = None) -> dict:
+    """
+    Delete finished jobs beyond keep_jobs or older than job_max_age_days,
+    with their logs. Findings keep their job ids as provenance.
+    """
+    marks = ",".join("?" * len(FINISHED))
+    with get_db(path) as db:
+        doomed = set()
+        if policy.keep_jobs is not None:
+            doomed.update(r[0] for r in db.execute(
+                f"SELECT id FROM scan_jobs WHERE status IN ({marks})"
+                f" ORDER BY id DESC LIMIT -1 OFFSET ?",
+                (*FINISHED, policy.keep_jobs)))
+        if policy.job_max_age_days is not None:
+            cutoff = int(time.time() - policy.job_max_age_days * 86400)
+            doomed.update(r[0] for r in db.execute(
+                f"SELECT id FROM scan_jobs WHERE status IN ({marks})"
+                f" AND coalesce(finished_at, created_at) < ?",
+                (*FINISHED, cutoff)))
+
+    logs = 0
+    for job_id in sorted(doomed):
+        logs += _chunked_delete("plugin_logs", "job_id = ?", (job_id,), policy, path=path)
+        with get_db(path) as db:
+            db.execute("DELETE FROM scan_jobs WHERE id=?", (job_id,))
+    return {"jobs": len(doomed), "logs": logs}
+
+
+def prune_evidence(policy: RetentionPolicy, path: Path = None) -> int:
+    """Delete evidence blobs no vulnerability refers to any more."""
+    return _chunked_delete(
+        "evidence_blobs",
+        "NOT EXISTS (SELECT 1 FROM vulnerabilities v WHERE v.evidence_ref = evidence_blobs.hash)",
+        (), policy, id_col="rowid", path=path)
+
+
+# ─── COMPACTION ──────────────────────────────────────────────────────────────
+def compact(policy: RetentionPolicy, full: bool = False, path: Path = None):
+    """
+    Return free pages to the OS. The first run switches the file to
+    incremental auto-vacuum, which needs one full VACUUM.
+    """
+    conn = get_connection(path)
+    if full or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute(f"PRAGMA incremental_vacuum({int(policy.vacuum_pages)})")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def optimize(path: Path = None):
+    """Refresh planner statistics (cheap: PRAGMA optimize only analyzes what changed)."""
+    conn = get_connection(path)
+    conn.execute("PRAGMA analysis_limit=1000")
+    conn.execute("PRAGMA optimize")
+
+
+def run(policy: RetentionPolicy = None, vacuum: bool = True,
+        full_vacuum: bool = False, path: Path = None) -> dict:
+    """One maintenance pass over one file; returns what was removed and sizes before/after."""
+    policy = policy or RetentionPolicy()
+    before = db_size(path)
+    removed = {"logs": prune_logs(policy, path)}
+    jobs = prune_jobs(policy, path)
+    removed["jobs"] = jobs["jobs"]
+    removed["logs"] += jobs["logs"]
+    removed["evidence"] = prune_evidence(policy, path)
+    optimize(path)
+    if vacuum:
+        compact(policy, full=full_vacuum, path=path)
+    return {"removed": removed, "before": before, "after": db_size(path)}
+
+
+def run_all(policy: RetentionPolicy = None, vacuum: bool = True,
+            full_vacuum: bool = False) -> dict:
+    """run() over every database file: {file name: report}."""
+    return {Path(path or DB_PATH).name: run(policy, vacuum, full_vacuum, path)
+            for path in database_paths()}
+
+
+# ─── BACKGROUND ──────────────────────────────────────────────────────────────
+_bg: Optional[threading.Thread] = None
+_bg_stop = threading.Event()
+
+
+def start_background(interval_hours: float = 6, policy: RetentionPolicy = None):
+    """Run maintenance periodically on a daemon thread."""
+    global _bg
+    if _bg and _bg.is_alive():
+        return _bg
+
+    def _loop():
+        while not _bg_stop.wait(interval_hours * 3600):
+            try:
+                run_all(policy)
+            except Exception as e:
+                print(f"[Maintenance] pass failed: {e}")
+
+    _bg_stop.clear()
+    _bg = threading.Thread(target=_loop, daemon=True, name="srof-maintenance")
+    _bg.start()
+    return _bg
+
+
+def stop_background():
+    _bg_stop.set()
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def _fmt(n: int) -> str:
+    return f"{n / (1 << 20):.1f} MiB"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.maintenance",
+                                 description="SROF database maintenance")
+    ap.add_argument("--log-days", type=float, default=30, help="keep plugin logs this many days")
+    ap.add_argument("--keep-jobs", type=int, default=500, help="keep this many finished jobs")
+    ap.add_argument("--job-days", type=float, default=None, help="drop finished jobs older than this")
+    ap.add_argument("--no-vacuum", action="store_true", help="skip compaction")
+    ap.add_argument("--full-vacuum", action="store_true", help="full VACUUM instead of incremental")
+    ap.add_argument("--rebuild-stats", action="store_true", help="recompute workspace_stats")
+    ap.add_argument("--rebuild-search", action="store_true", help="repopulate FTS indexes")
+    ap.add_argument("--rebuild-inventory", action="store_true",
+                    help="recompute hosts/ips/services/urls from assets")
+    args = ap.parse_args(argv)
+
+    if args.rebuild_stats:
+        StatsRepo.rebuild()
+        print("[SROF] workspace_stats rebuilt")
+    if args.rebuild_search:
+        SearchRepo.rebuild()
+        print("[SROF] search indexes rebuilt")
+    if args.rebuild_inventory:
+        InventoryRepo.rebuild()
+        print("[SROF] inventory rebuilt")
+
+    policy = RetentionPolicy(log_max_age_days=args.log_days, keep_jobs=args.keep_jobs,
+                             job_max_age_days=args.job_days)
+    reports = run_all(policy, vacuum=not args.no_vacuum, full_vacuum=args.full_vacuum)
+    for name, r in reports.items():
+        b, a = r["before"], r["after"]
+        print(f"[SROF] {name}: removed {r['removed']['jobs']} jobs,"
+              f" {r['removed']['logs']} log lines, {r['removed']['evidence']} evidence blobs")
+        print(f"[SROF] {name}: db {_fmt(b['file_bytes'])} + wal {_fmt(b['wal_bytes'])}"
+              f"  →  db {_fmt(a['file_bytes'])} + wal {_fmt(a['wal_bytes'])}"
+              f"  (free pages {b['free_pages']} → {a['free_pages']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+SROF · Pipeline
+Runs plugins as a DAG of stages instead of side by side against one
+target: subfinder → dns_resolve → httpx → nuclei.
+
+Plugins declare the finding kinds they consume and produce (see
+finding_inputs). A stage feeds every stage that consumes one of its kinds,
+and a plugin's `requires` adds its dependencies to the pipeline and makes
+it wait for them to finish. Stages with no upstream get the job's target.
+
+Findings are forwarded while the upstream is still running: each stage
+buffers the new values it is sent and starts a run per micro-batch — when
+the buffer reaches the plugin's `batch` size, or BATCH_WAIT seconds after
+its first value, or when its upstream has finished — so all stages work at
+once. A value is passed to a stage only once per job.
+"""
+import threading, time
+from typing import Callable, Dict, List, Set
+
+from .plugin import Finding, PluginRegistry
+
+BATCH_WAIT = 0.5        # seconds a partial batch waits for more values
+
+
+def finding_inputs(f: Finding) -> Dict[str, str]:
+    """The kind → value pairs a finding offers downstream stages."""
+    meta = f.metadata or {}
+    kind = meta.get("asset_type") if f.type == "asset" else f.type
+    if kind == "dns":                                   # host → ip
+        return {k: meta[k] for k in ("host", "ip") if meta.get(k)}
+    return {kind: f.value} if kind and f.value else {}
+
+
+class Stage:
+    def __init__(self, plugin_cls: type):
+        self.plugin_cls = plugin_cls
+        self.id = plugin_cls.id
+        self.consumes = set(plugin_cls.consumes)
+        self.batch = max(1, plugin_cls.batch)
+        self.upstream: List["Stage"] = []       # sends us findings
+        self.after: List["Stage"] = []          # `requires`: must finish first
+        self.downstream: List["Stage"] = []
+        self.seen: Set[str] = set()
+        self.buffer: List[str] = []
+        self.since = 0.0                        # when buffer got its first value
+        self.started = False
+        self.running = 0
+        self.done = False
+        self.findings = 0
+
+
+class Pipeline:
+    """The stage DAG for a set of plugins; run() executes it once."""
+
+    def __init__(self, plugin_ids: List[str], batch_wait: float = BATCH_WAIT):
+        self.batch_wait = batch_wait
+        self.stages: Dict[str, Stage] = {}
+        todo = list(plugin_ids)
+        while todo:                             # pull in `requires`
+            pid = todo.pop(0)
+            if pid in self.stages:
+                continue
+            cls = PluginRegistry.get(pid)
+            if cls is None:
+                raise ValueError(f"Plugin not found: {pid}")
+            self.stages[pid] = Stage(cls)
+            todo += cls.requires
+
+        for st in self.stages.values():
+            for other in self.stages.values():
+                if other is not st and set(other.plugin_cls.produces) & st.consumes:
+                    st.upstream.append(other)
+                    other.downstream.append(st)
+            for pid in st.plugin_cls.requires:
+                if self.stages[pid] not in st.upstream:
+                    st.after.append(self.stages[pid])
+        self.order = self._toposort()
+        self._cond = threading.Condition()
+
+    def _toposort(self) -> List[Stage]:
+        deps = {st.id: {u.id for u in st.upstream + st.after} for st in self.stages.values()}
+        order = []
+        while deps:
+            ready = [pid for pid, d in deps.items() if not d]
+            if not ready:
+                raise ValueError(f"Pipeline has a cycle among: {', '.join(sorted(deps))}")
+            for pid in ready:
+                order.append(self.stages[pid])
+                del deps[pid]
+            for d in deps.values():
+                d.difference_update(ready)
+        return order
+
+    def plan(self) -> List[dict]:
+        """The stages in dependency order, for display."""
+        return [{"plugin": st.id,
+                 "consumes": sorted(st.consumes),
+                 "from": [u.id for u in st.upstream],
+                 "after": [a.id for a in st.after],
+                 "batch": st.batch}
+                for st in self.order]
+
+    # ── RUN ──────────────────────────────────────────────────────────────────
+    def run(self, target: str, submit: Callable, run_stage: Callable,
+            cancel_evt: threading.Event) -> int:
+        """
+        Execute the DAG; returns the number of findings. `submit(fn,
+        plugin_cls)` runs fn on a worker as a run of that plugin, and must
+        not block (see core.scheduler); `run_stage(plugin_cls,
+        inputs, on_finding)` runs the plugin on a batch of inputs, calls
+        on_finding for each finding and returns their count.
+        """
+        self._submit, self._run_stage = submit, run_stage
+        self._target = target
+        with self._cond:
+            while True:
+                if not cancel_evt.is_set():
+                    self._schedule()
+                if all(st.done for st in self.order):
+                    break
+                if cancel_evt.is_set() and not any(st.running for st in self.order):
+                    break
+                self._cond.wait(self.batch_wait / 2)
+        return sum(st.findings for st in self.order)
+
+    def _schedule(self):
+        """Start what is due and mark finished stages. Holds self._cond."""
+        now = time.monotonic()
+        for st in self.order:
+            if st.done or not all(a.done for a in st.after):
+                continue
+            if not st.upstream:
+                if not st.started:
+                    self._dispatch(st, [self._target])
+                elif not st.running:
+                    st.done = True
+                continue
+            closed = all(u.done for u in st.upstream)
+            while st.buffer and (len(st.buffer) >= st.batch or closed
+                                 or now - st.since >= self.batch_wait):
+                batch, st.buffer = st.buffer[:st.batch], st.buffer[st.batch:]
+                st.since = now
+                self._dispatch(st, batch)
+            if closed and not st.buffer and not st.running:
+                st.done = True
+                self._cond.notify_all()
+
+    def _dispatch(self, st: Stage, inputs: List[str]):
+        st.started = True
+        st.running += 1
+
+        def _task():
+            count = 0
+            try:
+                count = self._run_stage(st.plugin_cls, inputs,
+                                        lambda f: self._forward(st, f))
+            finally:
+                with self._cond:
+                    st.running -= 1
+                    st.findings += count
+                    self._cond.notify_all()
+
+        self._submit(_task, st.plugin_cls)
+
+    def _forward(self, st: Stage, f: Finding):
+        offered = finding_inputs(f)
+        if not offered or not st.downstream:
+            return
+        with self._cond:
+            for down in st.downstream:
+                for kind, value in offered.items():
+                    if kind in down.consumes and value not in down.seen:
+                        down.seen.add(value)
+                        if not down.buffer:
+                            down.since = time.monotonic()
+                        down.buffer.append(value)
+                        if len(down.buffer) >= down.batch:
+                            self._cond.notify_all()
@@ -5,7 +5,7 @@ SROF · Plugin System
 import importlib, inspect, pkgutil, json, time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Any, Generator
+from typing import Optional, List, Dict, Any, Generator, Iterable, TextIO
 from pathlib import Path
 from enum import Enum
 
@@ -74,12 +74,98 @@ class PluginConfig:
     rate_limit: int = 100        # req/s
     proxy: Optional[str] = None  # http://127.0.0.1:8080
     output_dir: Path = Path("./data/output")
+    log_level: str = "info"      # lowest plugin log level persisted for the job
+    inputs: list = field(default_factory=list)  # upstream values (pipeline stages)
     extra: dict = field(default_factory=dict)  # plugin-specific params
 
     def get(self, key: str, default=None):
         return self.extra.get(key, default)
 
 
+# ─── OUTPUT PARSING ──────────────────────────────────────────────────────────
+# Tool output is parsed incrementally so a plugin's parse() costs the same
+# memory for a 10 KB and a 10 GB file.
+def iter_json_lines(lines: Iterable[str]) -> Generator[dict, None, None]:
+    """Yield each JSON object of a JSONL stream, skipping blank or garbled lines."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            d = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(d, dict):
+            yield d
+
+
+class _JsonReader:
+    """Pull-style JSON tokenizer over a text stream (see iter_json_array)."""
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream: TextIO, chunk: int):
+        self.stream, self.chunk = stream, chunk
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _fill(self) -> bool:
+        more = "" if self.eof else self.stream.read(self.chunk)
+        if not more:
+            self.eof = True
+            return False
+        self.buf, self.pos = self.buf[self.pos:] + more, 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-blank character ('' at end of stream)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # A number cut at the buffer edge decodes without error.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_json_array(stream: TextIO, key: str, chunk: int = 1 << 16) -> Generator[Any, None, None]:
+    """
+    Yield the items of the array at top-level `key` of one JSON document
+    (e.g. ffuf's {"results": [...]}) while reading it in chunks.
+    """
+    r = _JsonReader(stream, chunk)
+    r.expect("{")
+    while r.peek() not in ("}", ""):
+        name = r.value()
+        r.expect(":")
+        if name == key and r.peek() == "[":
+            r.expect("[")
+            while r.peek() != "]":
+                yield r.value()
+                if r.peek() == ",":
+                    r.expect(",")
+            r.expect("]")
+        else:
+            r.value()
+        if r.peek() == ",":
+            r.expect(",")
+
+
 # ─── BASE PLUGIN ─────────────────────────────────────────────────────────────
 class SROFPlugin(ABC):
     """
@@ -97,6 +183,11 @@ class SROFPlugin(ABC):
         version     str
         requires    list  other plugin ids this depends on
         severity    str   default finding severity
+        consumes    list  finding kinds taken as input in a pipeline
+        produces    list  finding kinds emitted (see core.pipeline)
+        batch       int   upstream values one run() handles via config.inputs
+        weight      int   scheduler slots one run takes (CPU/network-heavy > 1)
+        max_parallel int  runs allowed at once across all jobs (0: no cap)
     """
     id: str          = ""
     name: str        = ""
@@ -106,6 +197,11 @@ class SROFPlugin(ABC):
     author: str      = "XiaoYao @ Alfanet"
     version: str     = "1.0.0"
     requires: list   = []
+    consumes: list   = []
+    produces: list   = []
+    batch: int       = 1
+    weight: int      = 1
+    max_parallel: int = 0
     enabled: bool    = True
 
     def __init__(self):
@@ -131,6 +227,13 @@ class SROFPlugin(ABC):
         """
         ...
 
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """
+        Yield Findings from the tool's saved output (a text stream), as
+        run() would. Lets core.importer load results produced outside SROF.
+        """
+        raise NotImplementedError(f"{self.id} cannot parse saved output")
+
     def validate_config(self, config: PluginConfig) -> Optional[str]:
         """Return error string if config is invalid, else None."""
         return None
@@ -146,6 +249,10 @@ class SROFPlugin(ABC):
             "author":      cls.author,
             "version":     cls.version,
             "requires":    cls.requires,
+            "consumes":    cls.consumes,
+            "produces":    cls.produces,
+            "weight":      cls.weight,
+            "max_parallel": cls.max_parallel,
             "enabled":     cls.enabled,
         }
 
@@ -0,0 +1,279 @@
+"""
+SROF · Tool Runner
+Runs the external tools plugins wrap, streaming their output.
+
+stdout is read as the tool writes it: a plugin hands proc.stdout straight
+to its parse(), so each result reaches the engine (and the DB and UI) as
+soon as the tool prints it, and memory stays flat whatever the output
+size. stderr is drained by a thread into a bounded ring buffer; its last
+lines are what an error message needs.
+
+Each tool runs in its own process group under a deadline (the plugin's
+timeout), and is registered under the job that started it
+(PluginConfig.job_id) while it runs. cancel_job() stops the whole tree of
+every tool a job is running: SIGTERM to the group, SIGKILL after a grace
+period. The plugin then sees Cancelled raised from its `with` block, which
+unwinds its temp_output() files with it.
+
+    try:
+        proc = ToolProcess(cmd, timeout=600, job_id=config.job_id).start()
+    except FileNotFoundError:
+        ...
+    with proc:
+        yield from self.parse(proc.stdout, target)
+    if proc.timed_out:
+        ...
+"""
+import os, shutil, signal, subprocess, tempfile, threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+STDERR_LINES    = 200       # ring buffer size
+STDERR_LINE_MAX = 4096      # chars kept per stderr line
+KILL_GRACE      = 5.0       # seconds between SIGTERM and SIGKILL
+
+# run_tool() return codes for runs that did not exit on their own
+RC_TIMEOUT, RC_NOT_FOUND, RC_ERROR = -1, -2, -3
+
+
+class Cancelled(Exception):
+    """The job a tool was started for has been cancelled."""
+
+
+def which(cmd: str) -> bool:
+    return shutil.which(cmd) is not None
+
+
+@contextmanager
+def temp_output(suffix: str = "") -> Iterator[str]:
+    """Path of an empty temp file for a tool to write to; removed on exit."""
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="srof-")
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# ─── JOB REGISTRY ────────────────────────────────────────────────────────────
+_lock = threading.Lock()
+_running: Dict[int, Set["ToolProcess"]] = {}
+_cancelled: Set[int] = set()
+
+
+def running(job_id: int) -> List["ToolProcess"]:
+    """Tool processes currently running for a job."""
+    with _lock:
+        return list(_running.get(job_id, ()))
+
+
+def cancel_job(job_id: int, grace: float = KILL_GRACE) -> int:
+    """
+    Terminate every tool the job is running and refuse to start new ones
+    until release_job(). Returns how many tools were signalled.
+    """
+    with _lock:
+        _cancelled.add(job_id)
+        procs = list(_running.get(job_id, ()))
+    for proc in procs:
+        proc.cancelled = True
+        proc.terminate(grace)
+    return len(procs)
+
+
+def release_job(job_id: int):
+    """Forget a finished job's cancellation."""
+    with _lock:
+        _cancelled.discard(job_id)
+
+
+def _register(proc: "ToolProcess") -> bool:
+    """Track a started tool; False if its job was cancelled meanwhile."""
+    with _lock:
+        _running.setdefault(proc.job_id, set()).add(proc)
+        return proc.job_id not in _cancelled
+
+
+def _unregister(proc: "ToolProcess"):
+    with _lock:
+        procs = _running.get(proc.job_id)
+        if procs is not None:
+            procs.discard(proc)
+            if not procs:
+                del _running[proc.job_id]
+
+
+# ─── PROCESS ─────────────────────────────────────────────────────────────────
+class ToolProcess:
+    """
+    One run of an external tool. Read proc.stdout (a text stream) while it
+    runs; returncode, timed_out and stderr are final once the `with` block
+    exits. Leaving the block early (exception, generator closed) kills the
+    tool; if the job was cancelled, the block raises Cancelled.
+    """
+
+    def __init__(self, cmd: list, timeout: Optional[float] = None, job_id: int = 0,
+                 stderr_lines: int = STDERR_LINES, cwd=None, env: dict = None):
+        self.cmd = [str(c) for c in cmd]
+        self.timeout, self.job_id = timeout, job_id
+        self.cwd, self.env = cwd, env
+        self.timed_out = False
+        self.cancelled = False
+        self._terminated = False
+        self.proc: Optional[subprocess.Popen] = None
+        self._stderr = deque(maxlen=stderr_lines)
+        self._stderr_reader: Optional[threading.Thread] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def start(self) -> "ToolProcess":
+        """
+        Spawn the tool. Raises FileNotFoundError if it is not installed,
+        Cancelled if its job has been cancelled.
+        """
+        with _lock:
+            if self.job_id in _cancelled:
+                raise Cancelled(f"job {self.job_id} cancelled")
+        if os.name == "posix":
+            group = {"start_new_session": True}
+        else:
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        self.proc = subprocess.Popen(
+            self.cmd, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", errors="replace", bufsize=1,
+            cwd=self.cwd, env=self.env, **group)
+        if not _register(self):
+            self.cancelled = True
+            self.terminate()
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True,
+                                               name=f"srof-stderr-{self.proc.pid}")
+        self._stderr_reader.start()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    # ── OUTPUT ───────────────────────────────────────────────────────────────
+    @property
+    def stdout(self) -> TextIO:
+        return self.proc.stdout
+
+    def __iter__(self):
+        return iter(self.proc.stdout)
+
+    @property
+    def stderr(self) -> str:
+        """The last STDERR_LINES lines the tool wrote to stderr."""
+        return "\n".join(self._stderr)
+
+    def _read_stderr(self):
+        for line in self.proc.stderr:
+            self._stderr.append(line.rstrip("\n")[:STDERR_LINE_MAX])
+
+    # ── LIFECYCLE ────────────────────────────────────────────────────────────
+    @property
+    def pid(self) -> Optional[int]:
+        return self.proc.pid if self.proc else None
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.proc.returncode if self.proc else None
+
+    def _expire(self):
+        if self.proc.returncode is None:
+            self.timed_out = True
+            self.terminate()
+
+    def _signal_group(self, sig) -> bool:
+        # Until the leader is reaped its pid, and so the group id, stays ours.
+        if self.proc is None or self.proc.returncode is not None:
+            return False
+        try:
+            if os.name == "posix":
+                os.killpg(self.proc.pid, sig)
+            elif sig == signal.SIGTERM:
+                self.proc.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                self.proc.kill()
+        except OSError:
+            return False            # already gone
+        return True
+
+    def terminate(self, grace: float = KILL_GRACE):
+        """SIGTERM the tool and anything it started; SIGKILL them after `grace` s."""
+        if self._signal_group(signal.SIGTERM):
+            self._terminated = True
+            killer = threading.Timer(grace, self.kill)
+            killer.daemon = True
+            killer.start()
+
+    def kill(self):
+        """Kill the tool and anything it started."""
+        self._signal_group(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    def close(self) -> Optional[int]:
+        """Wait for the tool (at most until its deadline), reap it, unregister."""
+        if self.proc is None:
+            return None
+        try:
+            self.proc.stdout.close()
+            if self._terminated and hasattr(os, "waitid"):
+                # The leader has gone; sweep what it left in its group
+                # before reaping it frees the group id.
+                try:
+                    os.waitid(os.P_PID, self.proc.pid, os.WEXITED | os.WNOWAIT)
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            elif self._terminated and os.name == "posix":
+                # No waiting without reaping (macOS): sweep the group now,
+                # while the leader's pid still names it.
+                self.kill()
+            self.proc.wait()
+        finally:
+            if self._timer:
+                self._timer.cancel()
+            self._stderr_reader.join(timeout=5)
+            self.proc.stderr.close()
+            _unregister(self)
+        return self.proc.returncode
+
+    def __enter__(self) -> "ToolProcess":
+        return self if self.proc else self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.kill()
+        self.close()
+        if self.cancelled and exc_type is None:
+            raise Cancelled(f"job {self.job_id} cancelled")
+
+
+# ─── ONE-SHOT ────────────────────────────────────────────────────────────────
+def run_tool(cmd: list, timeout: Optional[float] = None,
+             job_id: int = 0, **kw) -> Tuple[int, str, str]:
+    """
+    Run a tool to completion, return (returncode, stdout, stderr). For tools
+    whose results land in an output file and print little; anything with
+    sizeable stdout should read a ToolProcess instead. Return codes:
+    RC_TIMEOUT (stdout so far is kept), RC_NOT_FOUND, RC_ERROR. Raises
+    Cancelled if the job is cancelled.
+    """
+    try:
+        proc = ToolProcess(cmd, timeout, job_id, **kw).start()
+    except FileNotFoundError:
+        return RC_NOT_FOUND, "", f"not found: {cmd[0]}"
+    except Cancelled:
+        raise
+    except Exception as e:
+        return RC_ERROR, "", str(e)
+    with proc:
+        out = proc.stdout.read()
+    if proc.timed_out:
+        return RC_TIMEOUT, out, "timeout"
+    return proc.returncode, out, proc.stderr
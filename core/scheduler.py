@@ -0,0 +1,180 @@
+"""
+SROF · Scheduler
+One pool of worker slots shared by every job an Engine runs, so jobs
+started side by side queue for the host instead of each starting its own
+set of tools.
+
+A plugin run takes `weight` slots (SROFPlugin.weight: an nmap at
+--min-rate 5000 counts as several light tools) and may also be capped
+per plugin (SROFPlugin.max_parallel, e.g. one nmap at a time), per
+category and per job. A run that does not fit waits in the queue. Runs
+queued behind it may start first if it is held by a cap; if it is only
+short of slots it keeps its place and nothing overtakes it, so heavy
+tools are not starved by a stream of light ones.
+
+Limits given to the Scheduler override the plugins' own:
+
+    Scheduler(slots=8, plugin_caps={"scan.nuclei": 2},
+              category_caps={"exploit": 1}, weights={"recon.nmap": 4})
+
+Tasks must not wait on other tasks of the same scheduler (a task holding
+slots while it waits for more can deadlock); whatever waits on runs — a
+job's body, a target coordinator — keeps its own thread.
+"""
+import os, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+DEFAULT_SLOTS = 8
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """'recon.nmap=1, scan=2' → {'recon.nmap': 1, 'scan': 2}"""
+    limits = {}
+    for item in filter(None, (s.strip() for s in (spec or "").split(","))):
+        name, sep, value = item.partition("=")
+        if not sep or not value.strip().isdigit():
+            raise ValueError(f"Bad limit {item!r}: expected name=number")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+class _Task:
+    __slots__ = ("fn", "args", "future", "plugin", "category", "weight", "cap", "job_id")
+
+    def __init__(self, fn: Callable, args: tuple, plugin: str, category: str,
+                 weight: int, cap: int, job_id: int):
+        self.fn, self.args, self.future = fn, args, Future()
+        self.plugin, self.category = plugin, category
+        self.weight, self.cap, self.job_id = weight, cap, job_id
+
+
+class Scheduler:
+    """Slot accounting and a queue in front of one long-lived thread pool."""
+
+    def __init__(self, slots: int = DEFAULT_SLOTS, plugin_caps: Dict[str, int] = None,
+                 category_caps: Dict[str, int] = None, weights: Dict[str, int] = None):
+        if slots < 1:
+            raise ValueError("Scheduler needs at least one slot")
+        self.slots = slots
+        self.plugin_caps = dict(plugin_caps or {})
+        self.category_caps = dict(category_caps or {})
+        self.weights = dict(weights or {})
+        self._lock = threading.Lock()
+        self._queue: List[_Task] = []
+        self._used = 0
+        self._plugins: Dict[str, int] = {}      # runs in progress per plugin id
+        self._categories: Dict[str, int] = {}
+        self._jobs: Dict[int, int] = {}
+        self._job_caps: Dict[int, int] = {}
+        # Started runs never exceed `slots`: each takes at least one.
+        self._pool = ThreadPoolExecutor(max_workers=slots, thread_name_prefix="srof-worker")
+
+    @classmethod
+    def from_env(cls, slots: int = None) -> "Scheduler":
+        """
+        SROF_WORKERS sets the slots (unless given); SROF_PLUGIN_CAPS,
+        SROF_CATEGORY_CAPS and SROF_PLUGIN_WEIGHTS take name=number lists,
+        e.g. SROF_PLUGIN_CAPS="recon.nmap=1,scan.nuclei=2".
+        """
+        return cls(slots or int(os.getenv("SROF_WORKERS", DEFAULT_SLOTS)),
+                   plugin_caps=parse_limits(os.getenv("SROF_PLUGIN_CAPS", "")),
+                   category_caps=parse_limits(os.getenv("SROF_CATEGORY_CAPS", "")),
+                   weights=parse_limits(os.getenv("SROF_PLUGIN_WEIGHTS", "")))
+
+    # ── SUBMIT ───────────────────────────────────────────────────────────────
+    def submit(self, fn: Callable, *args, plugin=None, job_id: int = 0) -> Future:
+        """
+        Queue fn(*args) as a run of `plugin` (a plugin class or instance;
+        None for an untyped task of weight 1) for `job_id`. Never blocks.
+        """
+        pid = getattr(plugin, "id", "") or ""
+        category = getattr(plugin, "category", "") or ""
+        category = getattr(category, "value", category)
+        weight = self.weights.get(pid, getattr(plugin, "weight", 1))
+        cap = self.plugin_caps.get(pid, getattr(plugin, "max_parallel", 0))
+        task = _Task(fn, args, pid, category, min(max(1, weight), self.slots), cap, job_id)
+        with self._lock:
+            self._queue.append(task)
+            self._pump()
+        return task.future
+
+    def limit_job(self, job_id: int, runs: int):
+        """Let at most `runs` of the job's tasks run at once."""
+        with self._lock:
+            self._job_caps[job_id] = max(1, runs)
+            self._pump()
+
+    def cancel_job(self, job_id: int) -> int:
+        """
+        Start the job's queued tasks now, outside the slots, on a thread of
+        their own: a cancelled job's runs return at once, and its waiters
+        are owed their results. Returns how many were queued.
+        """
+        with self._lock:
+            tasks = [t for t in self._queue if t.job_id == job_id]
+            self._queue = [t for t in self._queue if t.job_id != job_id]
+        if tasks:
+            threading.Thread(target=lambda: [self._call(t) for t in tasks], daemon=True,
+                             name=f"srof-cancelled-{job_id}").start()
+        return len(tasks)
+
+    def forget_job(self, job_id: int):
+        """Drop a finished job's limit."""
+        with self._lock:
+            self._job_caps.pop(job_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"slots": self.slots, "used": self._used, "queued": len(self._queue),
+                    "running": {p: n for p, n in self._plugins.items() if n}}
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    # ── SLOTS ────────────────────────────────────────────────────────────────
+    def _capped(self, t: _Task) -> bool:
+        cat_cap = self.category_caps.get(t.category, 0)
+        job_cap = self._job_caps.get(t.job_id, 0)
+        return bool((t.cap and self._plugins.get(t.plugin, 0) >= t.cap)
+                    or (cat_cap and self._categories.get(t.category, 0) >= cat_cap)
+                    or (job_cap and self._jobs.get(t.job_id, 0) >= job_cap))
+
+    def _pump(self):
+        """Start queued tasks, oldest first, while they fit. Holds self._lock."""
+        i = 0
+        while i < len(self._queue) and self._used < self.slots:
+            t = self._queue[i]
+            if self._capped(t):
+                i += 1
+                continue
+            if t.weight > self.slots - self._used:
+                break                           # keeps its place at the front
+            del self._queue[i]
+            self._used += t.weight
+            self._plugins[t.plugin] = self._plugins.get(t.plugin, 0) + 1
+            self._categories[t.category] = self._categories.get(t.category, 0) + 1
+            self._jobs[t.job_id] = self._jobs.get(t.job_id, 0) + 1
+            self._pool.submit(self._run, t)
+
+    def _run(self, t: _Task):
+        try:
+            self._call(t)
+        finally:
+            with self._lock:
+                self._used -= t.weight
+                self._plugins[t.plugin] -= 1
+                self._categories[t.category] -= 1
+                self._jobs[t.job_id] -= 1
+                if not self._jobs[t.job_id]:
+                    del self._jobs[t.job_id]
+                self._pump()
+
+    @staticmethod
+    def _call(t: _Task):
+        if not t.future.set_running_or_notify_cancel():
+            return
+        try:
+            t.future.set_result(t.fn(*t.args))
+        except BaseException as e:
+            t.future.set_exception(e)
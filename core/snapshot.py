@@ -0,0 +1,273 @@
+"""
+SROF · Workspace Snapshots
+Export one workspace to a single compact file and load it back on
+another machine, instead of copying the whole srof.db.
+
+A snapshot is a sequence of frames after an 8-byte magic:
+
+    kind (1 byte) · payload length (4 bytes, big-endian) · zlib(JSON)
+
+    M  manifest: format, schema version, the workspace row, and per
+       section its columns, row count and id range
+    R  one chunk of rows of one section ({"t": section, "rows": [...]})
+    Z  end marker with the row counts actually written
+
+Sections are evidence (each blob once, however many vulnerabilities
+share it), targets, scan_jobs, assets, vulnerabilities, plugin_logs and
+attack_chains. Both directions hold one chunk in memory at a time.
+
+Ids are remapped by shifting each table's id range past what the
+destination already holds; the manifest's ranges make that a per-table
+offset, so import needs no id map whatever the row count. References
+outside the exported range (e.g. provenance of pruned jobs) become NULL.
+
+Run from the CLI:
+    python -m core.snapshot export 3 engagement.srofsnap
+    python -m core.snapshot import engagement.srofsnap --name acme-copy
+"""
+import os, sys, json, zlib, struct, argparse
+from pathlib import Path
+from typing import Iterator
+
+from .database import (get_db, schema_version, workspace_path, EvidenceStore,
+                       InventoryRepo, SearchRepo, WorkspaceRepo)
+
+MAGIC = b"SROFSNAP"
+FORMAT = 1
+CHUNK_ROWS = 5000
+EVIDENCE_CHUNK_ROWS = 200           # evidence rows hold whole HTTP exchanges
+_FRAME = struct.Struct(">cI")
+
+# section: (rows of the workspace, {column: table its ids come from})
+SECTIONS = {
+    "targets":         ("workspace_id = :ws", {"id": "targets"}),
+    "scan_jobs":       ("workspace_id = :ws", {"id": "scan_jobs"}),
+    "assets":          ("target_id IN (SELECT id FROM targets WHERE workspace_id = :ws)",
+                        {"id": "assets", "target_id": "targets",
+                         "first_job_id": "scan_jobs", "job_id": "scan_jobs"}),
+    "vulnerabilities": ("workspace_id = :ws",
+                        {"id": "vulnerabilities", "target_id": "targets", "asset_id": "assets",
+                         "first_job_id": "scan_jobs", "job_id": "scan_jobs"}),
+    "plugin_logs":     ("job_id IN (SELECT id FROM scan_jobs WHERE workspace_id = :ws)",
+                        {"id": "plugin_logs", "job_id": "scan_jobs"}),
+    "attack_chains":   ("workspace_id = :ws", {"id": "attack_chains"}),
+    "job_targets":     ("job_id IN (SELECT id FROM scan_jobs WHERE workspace_id = :ws)",
+                        {"id": "job_targets", "job_id": "scan_jobs", "target_id": "targets"}),
+}
+EVIDENCE_SQL = """SELECT hash, evidence_text(codec, data) FROM evidence_blobs
+                  WHERE hash IN (SELECT evidence_ref FROM vulnerabilities
+                                 WHERE workspace_id = :ws AND evidence_ref IS NOT NULL)
+                  ORDER BY hash"""
+
+
+def _columns(db, table: str) -> list:
+    """Stored columns of a table (generated columns are recomputed on insert)."""
+    return [r[1] for r in db.execute(f"PRAGMA table_xinfo({table})") if r[6] == 0]
+
+
+# ─── FRAMES ──────────────────────────────────────────────────────────────────
+def _write_frame(f, kind: bytes, payload, level: int):
+    data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), level)
+    f.write(_FRAME.pack(kind, len(data)))
+    f.write(data)
+    return _FRAME.size + len(data)
+
+
+def _frames(f) -> Iterator[tuple]:
+    while True:
+        head = f.read(_FRAME.size)
+        if not head:
+            return
+        if len(head) < _FRAME.size:
+            raise ValueError("Truncated snapshot")
+        kind, size = _FRAME.unpack(head)
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("Truncated snapshot")
+        yield kind, json.loads(zlib.decompress(data))
+
+
+# ─── EXPORT ──────────────────────────────────────────────────────────────────
+def export_workspace(workspace_id: int, path, chunk: int = CHUNK_ROWS, level: int = 6) -> dict:
+    """
+    Write workspace `workspace_id` to `path`. All sections are read in one
+    read transaction, so the snapshot is consistent while scans keep
+    writing. Returns {section: rows, "bytes": file size}.
+    """
+    ws = WorkspaceRepo.get(workspace_id)
+    if ws is None:
+        raise ValueError(f"Unknown workspace {workspace_id}")
+    path = Path(path)
+    part = path.with_name(path.name + ".part")
+    params = {"ws": workspace_id}
+    counts, size = {}, 0
+    with get_db(workspace_path(workspace_id)) as db:
+        if not db.in_transaction:
+            db.execute("BEGIN")
+        tables = {"evidence": {"columns": ["hash", "text"], "rows": db.execute(
+            f"SELECT COUNT(*) FROM ({EVIDENCE_SQL})", params).fetchone()[0]}}
+        for table, (where, _) in SECTIONS.items():
+            n, lo, hi = db.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM {table}"
+                                   f" WHERE {where}", params).fetchone()
+            tables[table] = {"columns": _columns(db, table), "rows": n,
+                             "min_id": lo, "max_id": hi}
+        manifest = {"format": FORMAT, "schema": schema_version(db),
+                    "workspace": {k: ws[k] for k in ("name", "description", "created_at")},
+                    "tables": tables}
+
+        with open(part, "wb") as f:
+            f.write(MAGIC)
+            size = len(MAGIC) + _write_frame(f, b"M", manifest, level)
+            for section, spec in tables.items():
+                if section == "evidence":
+                    sql, n = EVIDENCE_SQL, EVIDENCE_CHUNK_ROWS
+                else:
+                    sql = (f"SELECT {', '.join(spec['columns'])} FROM {section}"
+                           f" WHERE {SECTIONS[section][0]} ORDER BY id")
+                    n = chunk
+                cur = db.execute(sql, params)
+                counts[section] = 0
+                while True:
+                    rows = cur.fetchmany(n)
+                    if not rows:
+                        break
+                    size += _write_frame(f, b"R", {"t": section, "rows": [list(r) for r in rows]},
+                                         level)
+                    counts[section] += len(rows)
+            size += _write_frame(f, b"Z", {"rows": counts}, level)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(part, path)
+    return {**counts, "bytes": size}
+
+
+# ─── IMPORT ──────────────────────────────────────────────────────────────────
+def _create_workspace(name: str, ws: dict) -> int:
+    with get_db() as db:
+        if db.execute("SELECT 1 FROM workspaces WHERE name=?", (name,)).fetchone():
+            raise ValueError(f"Workspace {name!r} already exists")
+        workspace_id = db.execute(
+            "INSERT INTO workspaces(name, description, created_at) VALUES(?,?,?)",
+            (name, ws.get("description"), ws.get("created_at"))).lastrowid
+    workspace_path(workspace_id)        # create the workspace's shard when sharded
+    return workspace_id
+
+
+def _offsets(db, tables: dict) -> dict:
+    """{table: (min_id, max_id, offset)} placing each id range past existing rows."""
+    out = {}
+    for table in SECTIONS:
+        spec = tables.get(table)
+        if not spec or not spec["rows"]:
+            continue
+        seq = db.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+        top = max(seq[0] if seq else 0,
+                  db.execute(f"SELECT coalesce(MAX(id), 0) FROM {table}").fetchone()[0])
+        out[table] = (spec["min_id"], spec["max_id"], top + 1 - spec["min_id"])
+    return out
+
+
+def _load_rows(db, table: str, columns: list, rows: list, workspace_id: int, offsets: dict):
+    dest = set(_columns(db, table))
+    keep = [i for i, c in enumerate(columns) if c in dest]
+    fns = []
+    for i in keep:
+        col = columns[i]
+        if col == "workspace_id":
+            fns.append(lambda v: workspace_id)
+        elif col in SECTIONS[table][1]:
+            rng = offsets.get(SECTIONS[table][1][col])
+            fns.append(lambda v, rng=rng: v + rng[2]
+                       if v is not None and rng and rng[0] <= v <= rng[1] else None)
+        else:
+            fns.append(None)
+    sql = (f"INSERT INTO {table}({', '.join(columns[i] for i in keep)})"
+           f" VALUES({', '.join('?' * len(keep))})")
+    db.executemany(sql, (tuple(fn(row[i]) if fn else row[i] for i, fn in zip(keep, fns))
+                         for row in rows))
+
+
+def _load_evidence(db, rows: list):
+    hashes = [h for h, _ in rows]
+    refs = EvidenceStore.put_many(db, [json.loads(text) for _, text in rows])
+    if refs != hashes:
+        raise ValueError("Corrupt snapshot: evidence does not match its hash")
+
+
+def import_workspace(path, name: str = None) -> int:
+    """
+    Load a snapshot as a new workspace (named as exported unless `name`
+    is given) in one transaction; return its id. A failed import leaves
+    nothing behind.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not an SROF workspace snapshot")
+        frames = _frames(f)
+        kind, manifest = next(frames, (None, None))
+        if kind != b"M":
+            raise ValueError(f"{path}: missing manifest")
+        if manifest["format"] > FORMAT:
+            raise ValueError(f"{path}: snapshot format {manifest['format']} is newer than"
+                             f" this SROF ({FORMAT})")
+        tables = manifest["tables"]
+        workspace_id = _create_workspace(name or manifest["workspace"]["name"],
+                                         manifest["workspace"])
+        try:
+            with get_db(workspace_path(workspace_id)) as db:
+                if not db.in_transaction:
+                    db.execute("BEGIN IMMEDIATE")
+                offsets = _offsets(db, tables)
+                loaded = dict.fromkeys(tables, 0)
+                for kind, payload in frames:
+                    if kind == b"Z":
+                        if loaded != payload["rows"] or any(
+                                loaded[t] != spec["rows"] for t, spec in tables.items()):
+                            raise ValueError(f"{path}: row counts do not match the manifest")
+                        break
+                    if kind != b"R":
+                        raise ValueError(f"{path}: unexpected frame {kind!r}")
+                    section, rows = payload["t"], payload["rows"]
+                    if section == "evidence":
+                        _load_evidence(db, rows)
+                    else:
+                        _load_rows(db, section, tables[section]["columns"], rows,
+                                   workspace_id, offsets)
+                    loaded[section] += len(rows)
+                else:
+                    raise ValueError("Truncated snapshot")
+                # The inventory is derived from assets, so it is rebuilt, not shipped.
+                InventoryRepo.rebuild_in(db, workspace_id)
+                SearchRepo.index_evidence_in(db, workspace_id)
+        except Exception:
+            with get_db() as db:
+                db.execute("DELETE FROM workspaces WHERE id=?", (workspace_id,))
+            raise
+    return workspace_id
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.snapshot",
+                                 description="SROF workspace export/import")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="write a workspace to a snapshot file")
+    ex.add_argument("workspace_id", type=int)
+    ex.add_argument("path")
+    im = sub.add_parser("import", help="load a snapshot as a new workspace")
+    im.add_argument("path")
+    im.add_argument("--name", help="workspace name (default: as exported)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        r = export_workspace(args.workspace_id, args.path)
+        rows = ", ".join(f"{n} {t}" for t, n in r.items() if t != "bytes")
+        print(f"[SROF] exported {rows} → {args.path} ({r['bytes'] / (1 << 20):.1f} MiB)")
+    else:
+        ws_id = import_workspace(args.path, args.name)
+        print(f"[SROF] imported {args.path} as workspace {ws_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
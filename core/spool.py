@@ -0,0 +1,224 @@
+"""
+SROF · Findings Spool
+Append-only, per-job JSONL log of every finding, written before the
+finding is queued for the database.
+
+The FindingWriter records the highest spool line committed for each job
+(scan_jobs.spool_seq). Anything past that point is replayed from the
+spool: at the end of a job when a batch failed to commit, and by
+recover() at startup for jobs a crashed process left behind.
+
+Lines are flushed to the OS as they are written, which survives a process
+crash; they are fsynced when the job's spool is closed.
+
+Run from the CLI:
+    python -m core.spool            # replay spools of interrupted jobs
+"""
+import os, sys, json, time, threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Iterator, Optional, TextIO
+
+from .plugin   import Finding
+from .database import DB_PATH, JobRepo, VulnRepo
+from .writer   import FindingWriter, finding_fingerprint
+
+SPOOL_DIR = Path(os.getenv("SROF_SPOOL_DIR", str(DB_PATH.parent / "spool")))
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return _win_pid_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _win_pid_alive(pid: int) -> bool:
+    # os.kill(pid, 0) would call TerminateProcess here: ask for an exit code instead.
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000, False, pid)    # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return ctypes.GetLastError() == 5                 # ERROR_ACCESS_DENIED: it exists
+    try:
+        code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == 259                          # STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+class FindingSpool:
+    def __init__(self, directory: Path = None):
+        self.directory = Path(directory or SPOOL_DIR)
+        self._files: Dict[int, TextIO] = {}
+        self._seq: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["FindingSpool"]:
+        """SROF_SPOOL=0 disables spooling; SROF_SPOOL_DIR moves it."""
+        if os.getenv("SROF_SPOOL", "1") == "0":
+            return None
+        return cls()
+
+    def path(self, job_id: int) -> Path:
+        return self.directory / f"job-{int(job_id)}.jsonl"
+
+    # ── WRITE ────────────────────────────────────────────────────────────────
+    def open_job(self, job_id: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(job_id)
+        with self._lock:
+            if job_id in self._files:
+                return
+            seq = max((seq for seq, _, _ in self.read(job_id)), default=0)
+            f = open(path, "a", encoding="utf-8")
+            f.write(json.dumps({"job_id": job_id, "pid": os.getpid(),
+                                "opened": time.time()}) + "\n")
+            f.flush()
+            self._files[job_id], self._seq[job_id] = f, seq
+
+    def append(self, job_id: int, target_id: int, finding: Finding,
+               writer: FindingWriter) -> Future:
+        """
+        Spool a finding, then hand it to the writer. Like an unspooled
+        submit this blocks while the writer's queue is full, so a fast
+        plugin is throttled and its findings still reach the database as
+        they come.
+        """
+        with self._lock:
+            f = self._files[job_id]
+            seq = self._seq[job_id] = self._seq[job_id] + 1
+            f.write(json.dumps({"seq": seq, "target_id": target_id,
+                                "finding": finding.to_dict()}, default=str) + "\n")
+            f.flush()
+        return writer.submit(finding, target_id, job_id, seq)
+
+    def close_job(self, job_id: int, remove: bool = True) -> bool:
+        """
+        Fsync and close a job's spool. With remove, delete it if the job is
+        settled (scan_jobs.spool_seq covers its last line, or the job is
+        gone); otherwise it stays for the next replay. Returns whether the
+        file was removed.
+        """
+        with self._lock:
+            f = self._files.pop(job_id, None)
+            last = self._seq.pop(job_id, None)
+        if f is not None:
+            os.fsync(f.fileno())
+            f.close()
+        if not remove:
+            return False
+        job = JobRepo.get(job_id)
+        if job is not None:
+            if last is None:
+                last = max((seq for seq, _, _ in self.read(job_id)), default=0)
+            if (job.get("spool_seq") or 0) < last:
+                return False
+        self.path(job_id).unlink(missing_ok=True)
+        return True
+
+    # ── READ / REPLAY ────────────────────────────────────────────────────────
+    def read(self, job_id: int, after_seq: int = 0) -> Iterator[tuple]:
+        """Yield (seq, target_id, Finding) past after_seq; stops at a torn last line."""
+        path = self.path(job_id)
+        if not path.exists():
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    return
+                if "seq" not in rec or rec["seq"] <= after_seq:
+                    continue
+                yield rec["seq"], rec["target_id"], Finding(**rec["finding"])
+
+    def owner(self, job_id: int) -> Optional[int]:
+        """pid of the last process that opened the job's spool."""
+        pid = None
+        with open(self.path(job_id), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                if "pid" in rec:
+                    pid = rec["pid"]
+        return pid
+
+    def drain(self, job_id: int, writer: FindingWriter) -> int:
+        """
+        Commit every spooled finding past scan_jobs.spool_seq; return the
+        count. Lines past spool_seq may already be committed (the mark only
+        covers contiguous lines), so vulns the job already holds are settled
+        without being written again: a second upsert would count them twice.
+        """
+        writer.flush()
+        job = JobRepo.get(job_id)
+        if job is None:
+            return 0
+        committed = VulnRepo.job_fingerprints(job_id)
+        n = 0
+        for seq, target_id, finding in self.read(job_id, job.get("spool_seq") or 0):
+            if finding.type == "vuln" and (target_id, finding_fingerprint(finding)) in committed:
+                writer.skip(target_id, job_id, seq)
+                continue
+            writer.submit(finding, target_id, job_id, seq)
+            n += 1
+        writer.flush()
+        return n
+
+    def jobs(self) -> list:
+        if not self.directory.exists():
+            return []
+        return sorted(int(p.stem.split("-", 1)[1]) for p in self.directory.glob("job-*.jsonl"))
+
+    def recover(self, writer: FindingWriter = None) -> dict:
+        """
+        Replay spools left by dead processes and settle their jobs: jobs
+        still queued/running are marked as errors. Returns {job_id: replayed}.
+        """
+        own = writer is None
+        writer = writer or FindingWriter()
+        recovered = {}
+        try:
+            for job_id in self.jobs():
+                if job_id in self._files:
+                    continue
+                pid = self.owner(job_id)
+                if pid is not None and _pid_alive(pid):
+                    continue
+                job = JobRepo.get(job_id)
+                if job is None:
+                    self.close_job(job_id)
+                    continue
+                n = recovered[job_id] = self.drain(job_id, writer)
+                if job["status"] in ("queued", "running"):
+                    JobRepo.fail(job_id, f"Interrupted; {n} findings recovered from spool")
+                self.close_job(job_id)
+        finally:
+            if own:
+                writer.close()
+        return recovered
+
+
+def main(argv=None):
+    recovered = FindingSpool().recover()
+    for job_id, n in recovered.items():
+        print(f"[SROF] job {job_id}: replayed {n} findings")
+    print(f"[SROF] {len(recovered)} spools recovered")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+SROF · Finding Writer
+Single background thread that group-commits plugin findings.
+
+Plugins push findings onto a bounded queue; the writer drains it and
+persists each batch in one transaction (executemany), flushing when the
+batch is full or the flush interval expires. A full queue blocks the
+producer, which throttles fast plugins instead of growing memory.
+
+Findings that carry a spool sequence number (see core/spool.py) advance
+scan_jobs.spool_seq in the same transaction: the highest seq below which
+every line of the job's spool is committed.
+
+Assets are also recorded in the normalized inventory (hosts, ips,
+services, urls) in the same transaction.
+"""
+import threading, queue, time, traceback
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Set
+
+from .plugin   import Finding
+from .database import (AssetRepo, VulnRepo, InventoryRepo, JobRepo, Asset, Vulnerability,
+                       get_db, group_by_shard, vuln_fingerprint)
+
+
+def finding_fingerprint(f: Finding) -> str:
+    """Fingerprint of the vulnerability row a vuln finding is written to."""
+    return vuln_fingerprint(f.source, f.title or f.value, f.value, f.evidence, f.metadata)
+
+
+class _Flush:
+    """Queue marker: commit everything queued before it, then signal."""
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class FindingWriter:
+    """
+    Group-commit writer for findings.
+
+    submit() returns a Future resolving to the asset/vuln row id (or None
+    for finding types that are not persisted).
+
+    A batch that fails to commit is reported per job through
+    on_error(job_id, message, data) — by default a plugin_logs line at
+    error level — and counted until take_failed(job_id).
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.25,
+                 max_queue: int = 10000, asset_cache: int = 100000,
+                 on_error: Callable = None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self._failed: Dict[int, int] = {}       # job → findings that failed to commit
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._asset_ids: dict = {}          # (target_id, value) → asset id
+        self._asset_cache = asset_cache
+        self._ahead: Dict[int, Set[int]] = {}   # job → committed seqs past the gap
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ── LIFECYCLE ────────────────────────────────────────────────────────────
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True,
+                                                name="srof-writer")
+                self._thread.start()
+        return self
+
+    def submit(self, finding: Finding, target_id: int, job_id: int,
+               seq: Optional[int] = None, block: bool = True) -> Optional[Future]:
+        """
+        Queue a finding; blocks while the queue is full, or returns None
+        instead when block=False. seq is the finding's spool line number.
+        """
+        self.start()
+        fut = Future()
+        try:
+            self._queue.put((finding, target_id, job_id, seq, fut), block=block)
+        except queue.Full:
+            return None
+        return fut
+
+    def skip(self, target_id: int, job_id: int, seq: int) -> Future:
+        """Settle a spool line without writing it (its finding is already committed)."""
+        return self.submit(None, target_id, job_id, seq)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is committed."""
+        if self._thread is None:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ── LOOP ─────────────────────────────────────────────────────────────────
+    def _loop(self):
+        batch: List[tuple] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is None or item is _STOP or isinstance(item, _Flush):
+                self._write(batch)
+                batch, deadline = [], None
+                if isinstance(item, _Flush):
+                    item.done.set()
+                if item is _STOP:
+                    return
+                continue
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch: List[tuple]):
+        if not batch:
+            return
+        try:
+            results = self._persist(batch)
+        except Exception as e:
+            self._report(batch, e)
+            for *_, fut in batch:
+                fut.set_exception(e)
+            return
+        for (*_, fut), row_id in zip(batch, results):
+            fut.set_result(row_id)
+
+    def _report(self, batch: List[tuple], e: Exception):
+        counts: Dict[int, int] = {}
+        for _, _, job_id, _, _ in batch:
+            counts[job_id] = counts.get(job_id, 0) + 1
+        tb = traceback.format_exc()
+        with self._lock:
+            for job_id, n in counts.items():
+                self._failed[job_id] = self._failed.get(job_id, 0) + n
+        for job_id, n in counts.items():
+            message = f"{n} findings failed to commit: {e}"
+            data = {"findings": n, "error": str(e), "traceback": tb}
+            try:
+                if self.on_error:
+                    self.on_error(job_id, message, data)
+                elif job_id:
+                    JobRepo.log(job_id, "core.writer", message, "error", data)
+            except Exception:
+                pass                # the database may be what is failing
+
+    def take_failed(self, job_id: int) -> int:
+        """How many of the job's findings failed to commit since the last call."""
+        with self._lock:
+            return self._failed.pop(job_id, 0)
+
+    def _persist(self, batch: List[tuple]) -> List[Optional[int]]:
+        # One transaction per database file (just one unless sharded).
+        results: List[Optional[int]] = [None] * len(batch)
+        ahead: Dict[int, Set[int]] = {}
+        for path, idx in group_by_shard(batch, lambda item: item[1]).items():
+            group = [batch[i] for i in idx]
+            with get_db(path) as db:
+                for i, row_id in zip(idx, self._persist_group(group)):
+                    results[i] = row_id
+                ahead.update(self._checkpoint(db, group))
+        # Only after the commit: a failed batch leaves its seqs uncommitted.
+        for job_id, seqs in ahead.items():
+            if seqs:
+                self._ahead[job_id] = seqs
+            else:
+                self._ahead.pop(job_id, None)
+        return results
+
+    def _persist_group(self, batch: List[tuple]) -> List[Optional[int]]:
+        results: List[Optional[int]] = [None] * len(batch)
+        asset_idx: List[int] = []
+        assets: List[Asset] = []
+        vuln_idx: List[int] = []
+
+        for i, (f, target_id, job_id, _, _) in enumerate(batch):
+            if f is None:
+                continue
+            if f.type == "asset":
+                asset_idx.append(i)
+                assets.append(Asset(
+                    target_id=target_id,
+                    type=f.metadata.get("asset_type", "url"),
+                    value=f.value,
+                    source=f.source,
+                    metadata=f.metadata,
+                    job_id=job_id or None,
+                ))
+            elif f.type == "vuln":
+                vuln_idx.append(i)
+
+        asset_ids = AssetRepo.bulk_add(assets)
+        for i, asset_id in zip(asset_idx, asset_ids):
+            results[i] = asset_id
+            f, target_id = batch[i][0], batch[i][1]
+            self._remember(target_id, f.value, asset_id)
+        InventoryRepo.bulk_record([(a.target_id, asset_id, a.type, a.value, a.metadata)
+                                   for a, asset_id in zip(assets, asset_ids)])
+
+        vulns = []
+        for i in vuln_idx:
+            f, target_id = batch[i][0], batch[i][1]
+            vulns.append(Vulnerability(
+                target_id=target_id,
+                plugin_id=f.source,
+                name=f.title or f.value,
+                severity=f.severity,
+                description=f.description,
+                evidence=f.evidence,
+                cve=f.cve,
+                cvss=f.cvss,
+                asset_id=self._asset_ids.get((target_id, f.value)),
+                location=f.value,
+                fingerprint=finding_fingerprint(f),
+                job_id=batch[i][2] or None,
+            ))
+        for i, vuln_id in zip(vuln_idx, VulnRepo.bulk_add(vulns)):
+            results[i] = vuln_id
+        return results
+
+    def _checkpoint(self, db, batch: List[tuple]) -> Dict[int, Set[int]]:
+        """Advance scan_jobs.spool_seq over the contiguous committed seqs."""
+        seqs: Dict[int, Set[int]] = {}
+        for _, _, job_id, seq, _ in batch:
+            if seq is not None:
+                seqs.setdefault(job_id, set()).add(seq)
+        ahead = {}
+        for job_id, done in seqs.items():
+            row = db.execute("SELECT spool_seq FROM scan_jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                continue
+            mark = start = row["spool_seq"] or 0
+            done = {s for s in done | self._ahead.get(job_id, set()) if s > mark}
+            while mark + 1 in done:
+                mark += 1
+                done.discard(mark)
+            if mark != start:
+                db.execute("UPDATE scan_jobs SET spool_seq=? WHERE id=?", (mark, job_id))
+            ahead[job_id] = done
+        return ahead
+
+    def _remember(self, target_id: int, value: str, asset_id: int):
+        if len(self._asset_ids) >= self._asset_cache:
+            self._asset_ids.clear()
+        self._asset_ids[(target_id, value)] = asset_id
@@ -15,6 +15,11 @@ def _init_backend():
     try:
         from core.database import init_db
         init_db()
+        from core.spool import FindingSpool
+        spool = FindingSpool.from_env()
+        if spool:
+            for job_id, n in spool.recover().items():
+                print(f"[SROF] Recovered job {job_id}: {n} findings replayed from spool")
         from core.plugin import PluginRegistry
         # Dynamically load all plugin modules (import * not allowed inside functions)
         for mod_name in ("modules.recon.plugins", "modules.scan.plugins"):
@@ -2,24 +2,10 @@
 SROF · Cloud & Container Plugins
 CDK, cf, pacu, kube-hunter
 """
-import subprocess, shutil, json, tempfile, os
+import json, tempfile, os
 from typing import Generator
 from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd): return shutil.which(cmd) is not None
-
-
-def _run(cmd, timeout=120):
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+from core.runner import run_tool, which
 
 
 # ─── CDK (Container Escape) ──────────────────────────────────────────────────
@@ -33,14 +19,14 @@ class CDKPlugin(SROFPlugin):
     author      = "XiaoYao @ Alfanet"
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("cdk"):
+        if not which("cdk"):
             self.warn("CDK not installed.\n"
                       "Download: https://github.com/cdk-team/CDK/releases")
             return
 
         self.info("CDK: evaluating container environment")
         cmd = ["cdk", "evaluate", "--full"]
-        rc, out, err = _run(cmd, timeout=60)
+        rc, out, err = run_tool(cmd, timeout=60, job_id=config.job_id)
         if rc == -2:
             self.warn("cdk not found")
             return
@@ -79,7 +65,7 @@ class KubeHunterPlugin(SROFPlugin):
     author      = "XiaoYao @ Alfanet"
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("kube-hunter"):
+        if not which("kube-hunter"):
             self.warn("kube-hunter not installed.\n"
                       "Install: pip install kube-hunter")
             return
@@ -88,7 +74,7 @@ class KubeHunterPlugin(SROFPlugin):
         self.info(f"kube-hunter scanning {target}")
 
         cmd = ["kube-hunter", "--remote", target, "--report", "json"]
-        rc, out, err = _run(cmd, timeout=300)
+        rc, out, err = run_tool(cmd, timeout=300, job_id=config.job_id)
         if rc == -2:
             self.warn("kube-hunter not found")
             return
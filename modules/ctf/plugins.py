@@ -2,24 +2,10 @@
 SROF · CTF Plugins
 pwntools, CyberChef, Volatility3, SageMath, Ghidra helpers
 """
-import subprocess, shutil, json, re
+import shutil, json, re
 from typing import Generator
 from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd): return shutil.which(cmd) is not None
-
-
-def _run(cmd, timeout=60):
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+from core.runner import run_tool
 
 
 # ─── STRINGS EXTRACTOR (pure Python) ─────────────────────────────────────────
@@ -82,6 +68,7 @@ class Volatility3Plugin(SROFPlugin):
     description = "Memory forensics: process list, network, cmdline"
     tags        = ["forensics", "memory", "volatility", "ctf"]
     author      = "XiaoYao @ Alfanet"
+    weight      = 2
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
         vol = shutil.which("vol") or shutil.which("vol3") or shutil.which("volatility3")
@@ -95,7 +82,7 @@ class Volatility3Plugin(SROFPlugin):
         self.info(f"Volatility3: {plugin} on {image}")
 
         cmd = [vol, "-f", image, plugin]
-        rc, out, err = _run(cmd, timeout=300)
+        rc, out, err = run_tool(cmd, timeout=300, job_id=config.job_id)
         if rc == -2:
             self.warn("volatility3 not found")
             return
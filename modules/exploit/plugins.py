@@ -2,24 +2,10 @@
 SROF · Exploit Plugins
 Wrappers for exploitation frameworks: Metasploit, sqlmap, etc.
 """
-import subprocess, shutil, json, tempfile, os
+import json, tempfile
 from typing import Generator
 from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd): return shutil.which(cmd) is not None
-
-
-def _run(cmd, timeout=120):
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+from core.runner import run_tool, temp_output, which
 
 
 # ─── SQLMAP ──────────────────────────────────────────────────────────────────
@@ -31,9 +17,11 @@ class SqlmapPlugin(SROFPlugin):
     description = "Automatic SQL injection detection and exploitation"
     tags        = ["sqli", "database", "injection"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["url"]
+    produces    = ["vuln"]
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("sqlmap"):
+        if not which("sqlmap"):
             self.warn("sqlmap not installed. Install: pip install sqlmap")
             return
 
@@ -51,7 +39,7 @@ class SqlmapPlugin(SROFPlugin):
             if config.proxy:
                 cmd += ["--proxy", config.proxy]
 
-            rc, out, err = _run(cmd, timeout=600)
+            rc, out, err = run_tool(cmd, timeout=600, job_id=config.job_id)
             if rc == -2:
                 self.warn("sqlmap not found")
                 return
@@ -82,7 +70,7 @@ class MetasploitPlugin(SROFPlugin):
     author      = "XiaoYao @ Alfanet"
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("msfconsole"):
+        if not which("msfconsole"):
             self.warn("Metasploit not installed. See: https://metasploit.com")
             return
 
@@ -100,13 +88,11 @@ class MetasploitPlugin(SROFPlugin):
             rc_lines.append(f"set {k} {v}")
         rc_lines += ["run", "exit"]
 
-        with tempfile.NamedTemporaryFile(suffix=".rc", delete=False, mode="w") as f:
-            f.write("\n".join(rc_lines))
-            rc_file = f.name
-
-        cmd = ["msfconsole", "-q", "-r", rc_file]
-        rc, out, err = _run(cmd, timeout=300)
-        os.unlink(rc_file)
+        with temp_output(".rc") as rc_file:
+            with open(rc_file, "w") as f:
+                f.write("\n".join(rc_lines))
+            cmd = ["msfconsole", "-q", "-r", rc_file]
+            rc, out, err = run_tool(cmd, timeout=300, job_id=config.job_id)
 
         if rc == -2:
             self.warn("msfconsole not found")
@@ -2,24 +2,10 @@
 SROF · Mobile Security Plugins
 jadx, Frida, objection, MobSF
 """
-import subprocess, shutil, json, re
+import shutil, json, re
 from typing import Generator
 from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd): return shutil.which(cmd) is not None
-
-
-def _run(cmd, timeout=120):
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+from core.runner import run_tool, which
 
 
 # ─── JADX DECOMPILER ─────────────────────────────────────────────────────────
@@ -31,6 +17,7 @@ class JadxPlugin(SROFPlugin):
     description = "Decompile APK/DEX to Java source and search for secrets"
     tags        = ["android", "apk", "decompile", "reverse"]
     author      = "XiaoYao @ Alfanet"
+    weight      = 2
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
         jadx = shutil.which("jadx")
@@ -45,7 +32,7 @@ class JadxPlugin(SROFPlugin):
         import tempfile, os
         with tempfile.TemporaryDirectory() as outdir:
             cmd = [jadx, "-d", outdir, apk_path]
-            rc, out, err = _run(cmd, timeout=300)
+            rc, out, err = run_tool(cmd, timeout=300, job_id=config.job_id)
             if rc == -2:
                 self.warn("jadx not found")
                 return
@@ -95,7 +82,7 @@ class FridaPlugin(SROFPlugin):
     author      = "XiaoYao @ Alfanet"
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("frida"):
+        if not which("frida"):
             self.warn("Frida not installed.\n"
                       "Install: pip install frida-tools")
             return
@@ -104,7 +91,7 @@ class FridaPlugin(SROFPlugin):
         self.info(f"Frida listing processes on device: {device}")
 
         cmd = ["frida-ps", f"-{device[0]}"]  # -u for usb, -r for remote
-        rc, out, err = _run(cmd, timeout=30)
+        rc, out, err = run_tool(cmd, timeout=30, job_id=config.job_id)
         if rc == -2:
             self.warn("frida-ps not found")
             return
@@ -2,24 +2,10 @@
 SROF · Post-Exploitation Plugins
 BloodHound, Impacket, ligolo-ng, etc.
 """
-import subprocess, shutil, json, tempfile, os
+import shutil, json, tempfile, os
 from typing import Generator
 from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd): return shutil.which(cmd) is not None
-
-
-def _run(cmd, timeout=120):
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+from core.runner import run_tool, which
 
 
 # ─── BLOODHOUND PYTHON ───────────────────────────────────────────────────────
@@ -33,7 +19,7 @@ class BloodhoundPlugin(SROFPlugin):
     author      = "XiaoYao @ Alfanet"
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("bloodhound-python"):
+        if not which("bloodhound-python"):
             self.warn("bloodhound-python not installed.\n"
                       "Install: pip install bloodhound")
             return
@@ -60,7 +46,7 @@ class BloodhoundPlugin(SROFPlugin):
                 "--zip",
                 "-o", tmpdir,
             ]
-            rc, out, err = _run(cmd, timeout=300)
+            rc, out, err = run_tool(cmd, timeout=300, job_id=config.job_id)
             if rc == -2:
                 self.warn("bloodhound-python not found")
                 return
@@ -102,7 +88,7 @@ class CrackMapExecPlugin(SROFPlugin):
         self.info(f"CME {protocol} scanning {target}")
 
         cmd = [cme, protocol, target, "--shares"]
-        rc, out, err = _run(cmd, timeout=120)
+        rc, out, err = run_tool(cmd, timeout=120, job_id=config.job_id)
         if rc == -2:
             self.warn("crackmapexec not found")
             return
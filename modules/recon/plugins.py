@@ -1,28 +1,13 @@
 """
 SROF · Recon Plugins
-All recon plugins wrap external tools via subprocess
-and parse their output into Finding objects.
+All recon plugins wrap external tools via core.runner
+and parse their output into Finding objects as it streams.
 """
-import subprocess, shutil, json, re, socket
-from typing import Generator
-from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd: str) -> bool:
-    return shutil.which(cmd) is not None
-
-
-def _run(cmd: list, timeout: int = 60) -> tuple[int, str, str]:
-    """Run subprocess, return (returncode, stdout, stderr)."""
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"command not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+import json, re, socket
+from typing import Generator, TextIO
+from core.plugin import (SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity,
+                         iter_json_lines, iter_json_array)
+from core.runner import ToolProcess, run_tool, temp_output, which
 
 
 # ─── SUBFINDER ───────────────────────────────────────────────────────────────
@@ -34,9 +19,11 @@ class SubfinderPlugin(SROFPlugin):
     description = "Passive subdomain enumeration via 50+ sources"
     tags        = ["subdomain", "passive", "osint"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["domain"]
+    produces    = ["subdomain"]
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("subfinder"):
+        if not which("subfinder"):
             self.warn("subfinder not installed. Install: go install github.com/projectdiscovery/subfinder/v2/cmd/subfinder@latest")
             return
 
@@ -49,22 +36,33 @@ class SubfinderPlugin(SROFPlugin):
         if config.timeout:
             cmd += ["-timeout", str(config.timeout)]
 
-        rc, out, err = _run(cmd, timeout=300)
-        if rc == -2:
+        try:
+            proc = ToolProcess(cmd, timeout=300, job_id=config.job_id).start()
+        except FileNotFoundError:
             self.warn("subfinder binary not found")
             return
-        if rc < 0:
-            self.error(f"subfinder failed: {err}")
-            return
 
         count = 0
-        for line in out.strip().splitlines():
+        with proc:
+            for finding in self.parse(proc.stdout, target):
+                yield finding
+                count += 1
+        if proc.timed_out:
+            self.warn(f"subfinder timed out; {count} subdomains before the cutoff")
+        elif proc.returncode:
+            self.error(f"subfinder failed: {proc.stderr}")
+
+        self.info(f"subfinder found {count} subdomains")
+
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """subfinder -json (or plain) output, one subdomain per line."""
+        for line in stream:
             line = line.strip()
             if not line:
                 continue
             try:
                 data = json.loads(line)
-                host = data.get("host", line)
+                host = data.get("host", line) if isinstance(data, dict) else line
             except json.JSONDecodeError:
                 host = line
 
@@ -76,9 +74,6 @@ class SubfinderPlugin(SROFPlugin):
                 source=self.id,
                 metadata={"asset_type": "subdomain", "tool": "subfinder"},
             )
-            count += 1
-
-        self.info(f"subfinder found {count} subdomains")
 
 
 # ─── HTTPX PROBE ─────────────────────────────────────────────────────────────
@@ -90,34 +85,45 @@ class HttpxPlugin(SROFPlugin):
     description = "HTTP/HTTPS probing with tech fingerprinting"
     tags        = ["http", "fingerprint", "cdn"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["host"]
+    produces    = ["url"]
+    batch       = 200
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("httpx"):
+        if not which("httpx"):
             self.warn("httpx not installed. Install: go install github.com/projectdiscovery/httpx/cmd/httpx@latest")
             return
 
-        target = config.target
-        self.info(f"httpx probing {target}")
-
-        cmd = [
-            "httpx", "-u", target,
-            "-title", "-tech-detect", "-status-code",
-            "-content-length", "-cdn", "-json", "-silent",
-        ]
-        if config.timeout:
-            cmd += ["-timeout", str(config.timeout)]
+        targets = config.inputs or [config.target]
+        self.info(f"httpx probing {targets[0] if len(targets) == 1 else f'{len(targets)} hosts'}")
 
-        rc, out, err = _run(cmd, timeout=120)
-        if rc == -2:
-            self.warn("httpx binary not found")
-            return
+        with temp_output(".txt") as list_file:
+            with open(list_file, "w") as f:
+                f.write("\n".join(targets))
+            cmd = [
+                "httpx", "-l", list_file,
+                "-title", "-tech-detect", "-status-code",
+                "-content-length", "-cdn", "-json", "-silent",
+            ]
+            if config.timeout:
+                cmd += ["-timeout", str(config.timeout)]
 
-        for line in out.strip().splitlines():
             try:
-                d = json.loads(line)
-            except Exception:
-                continue
+                proc = ToolProcess(cmd, timeout=max(120, 5 * len(targets)),
+                                   job_id=config.job_id).start()
+            except FileNotFoundError:
+                self.warn("httpx binary not found")
+                return
+
+            with proc:
+                yield from self.parse(proc.stdout, targets[0] if len(targets) == 1 else "")
+        if proc.timed_out:
+            self.warn("httpx timed out")
+        self.info("httpx probe complete")
 
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """httpx -json output (JSONL)."""
+        for d in iter_json_lines(stream):
             url    = d.get("url", target)
             title  = d.get("title", "")
             status = d.get("status_code", 0)
@@ -143,8 +149,6 @@ class HttpxPlugin(SROFPlugin):
                 },
             )
 
-        self.info("httpx probe complete")
-
 
 # ─── NMAP ────────────────────────────────────────────────────────────────────
 @register
@@ -155,72 +159,109 @@ class NmapPlugin(SROFPlugin):
     description = "Port scan + service detection (--min-rate 5000)"
     tags        = ["port-scan", "service", "nse"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["ip"]
+    produces    = ["service"]
+    batch       = 32
+    weight      = 4
+    max_parallel = 1
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("nmap"):
+        if not which("nmap"):
             self.warn("nmap not installed. Install: https://nmap.org")
             return
 
-        target = re.sub(r"https?://", "", config.target).split("/")[0]
+        targets = [re.sub(r"https?://", "", t).split("/")[0]
+                   for t in config.inputs or [config.target]]
+        # One target: ports are reported against it as given; several: per host.
+        target = targets[0] if len(targets) == 1 else ""
         ports  = config.get("ports", "1-65535")
         rate   = config.get("min_rate", 5000)
-        self.info(f"nmap scanning {target} ports {ports}")
+        self.info(f"nmap scanning {target or f'{len(targets)} hosts'} ports {ports}")
 
         cmd = [
             "nmap", "-sV", "-sC",
             f"--min-rate={rate}",
             "-p", str(ports),
             "-oX", "-",       # XML to stdout
-            target
+            *targets
         ]
 
-        rc, out, err = _run(cmd, timeout=600)
-        if rc == -2:
+        try:
+            proc = ToolProcess(cmd, timeout=600, job_id=config.job_id).start()
+        except FileNotFoundError:
             self.warn("nmap not found")
             return
 
-        # Parse XML output
         import xml.etree.ElementTree as ET
-        try:
-            root = ET.fromstring(out)
-        except ET.ParseError:
-            self.error("Failed to parse nmap XML")
+        with proc:
+            try:
+                yield from self.parse(proc.stdout, target)
+            except ET.ParseError:
+                # A run cut off by its deadline leaves the XML unterminated.
+                if not proc.timed_out:
+                    self.error("Failed to parse nmap XML")
+        if proc.timed_out:
+            self.warn("nmap timed out; hosts finished before the cutoff were kept")
             return
 
-        for host_el in root.findall("host"):
-            for port_el in host_el.findall(".//port"):
-                state_el = port_el.find("state")
-                if state_el is None or state_el.get("state") != "open":
-                    continue
-
-                portid  = port_el.get("portid", "?")
-                proto   = port_el.get("protocol", "tcp")
-                svc_el  = port_el.find("service")
-                svc     = svc_el.get("name", "") if svc_el is not None else ""
-                product = svc_el.get("product", "") if svc_el is not None else ""
-                version = svc_el.get("version", "") if svc_el is not None else ""
-
-                label = f"{svc} {product} {version}".strip()
-
-                yield Finding(
-                    type="asset",
-                    value=f"{target}:{portid}",
-                    severity=Severity.INFO,
-                    title=f"Open Port {portid}/{proto}: {label}",
-                    source=self.id,
-                    metadata={
-                        "asset_type": "service",
-                        "port": int(portid),
-                        "protocol": proto,
-                        "service": svc,
-                        "product": product,
-                        "version": version,
-                        "tool": "nmap",
-                    },
-                )
-
         self.info("nmap scan complete")
 
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """
+        nmap -oX output, one <host> at a time. Ports are reported against
+        `target` when given, else the host's name or address.
+        """
+        import xml.etree.ElementTree as ET
+        root = None
+        for event, el in ET.iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = el
+            if event != "end" or el.tag != "host":
+                continue
+            host = target or self._host_name(el)
+            yield from self._host_ports(el, host)
+            root.clear()            # drop finished hosts: memory stays flat
+
+    @staticmethod
+    def _host_name(host_el) -> str:
+        name = host_el.find("hostnames/hostname")
+        if name is not None and name.get("name"):
+            return name.get("name")
+        addr = host_el.find("address")
+        return addr.get("addr", "") if addr is not None else ""
+
+    def _host_ports(self, host_el, target: str) -> Generator[Finding, None, None]:
+        for port_el in host_el.findall(".//port"):
+            state_el = port_el.find("state")
+            if state_el is None or state_el.get("state") != "open":
+                continue
+
+            portid  = port_el.get("portid", "?")
+            proto   = port_el.get("protocol", "tcp")
+            svc_el  = port_el.find("service")
+            svc     = svc_el.get("name", "") if svc_el is not None else ""
+            product = svc_el.get("product", "") if svc_el is not None else ""
+            version = svc_el.get("version", "") if svc_el is not None else ""
+
+            label = f"{svc} {product} {version}".strip()
+
+            yield Finding(
+                type="asset",
+                value=f"{target}:{portid}",
+                severity=Severity.INFO,
+                title=f"Open Port {portid}/{proto}: {label}",
+                source=self.id,
+                metadata={
+                    "asset_type": "service",
+                    "port": int(portid),
+                    "protocol": proto,
+                    "service": svc,
+                    "product": product,
+                    "version": version,
+                    "tool": "nmap",
+                },
+            )
+
 
 # ─── FFUF DIRECTORY ──────────────────────────────────────────────────────────
 @register
@@ -231,48 +272,53 @@ class FfufPlugin(SROFPlugin):
     description = "Fast web fuzzing for directories and endpoints"
     tags        = ["directory", "fuzzing", "bruteforce"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["url"]
+    produces    = ["url"]
+    weight      = 2
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("ffuf"):
+        if not which("ffuf"):
             self.warn("ffuf not installed. Install: go install github.com/ffuf/ffuf/v2@latest")
             return
 
-        import tempfile, os
         wordlist = config.get("wordlist",
                               "/opt/SecLists/Discovery/Web-Content/raft-medium-directories.txt")
         target = config.target.rstrip("/") + "/FUZZ"
         self.info(f"ffuf fuzzing {target}")
 
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-            out_file = tmp.name
-
-        cmd = [
-            "ffuf", "-u", target,
-            "-w", wordlist,
-            "-mc", "200,201,204,301,302,307,401,403",
-            "-o", out_file, "-of", "json",
-            "-t", str(config.threads),
-            "-timeout", str(config.timeout),
-            "-s",   # silent
-        ]
-        if config.proxy:
-            cmd += ["-x", config.proxy]
-
-        rc, _, err = _run(cmd, timeout=600)
-        if rc == -2:
-            self.warn("ffuf not found")
-            os.unlink(out_file)
-            return
-
-        try:
-            with open(out_file) as f:
-                data = json.load(f)
-            os.unlink(out_file)
-        except Exception:
-            self.error("ffuf output parse failed")
-            return
+        count = 0
+        with temp_output(".json") as out_file:
+            cmd = [
+                "ffuf", "-u", target,
+                "-w", wordlist,
+                "-mc", "200,201,204,301,302,307,401,403",
+                "-o", out_file, "-of", "json",
+                "-t", str(config.threads),
+                "-timeout", str(config.timeout),
+                "-s",   # silent
+            ]
+            if config.proxy:
+                cmd += ["-x", config.proxy]
+
+            rc, _, err = run_tool(cmd, timeout=600, job_id=config.job_id)
+            if rc == -2:
+                self.warn("ffuf not found")
+                return
 
-        for result in data.get("results", []):
+            try:
+                with open(out_file) as f:
+                    for finding in self.parse(f, config.target):
+                        yield finding
+                        count += 1
+            except (OSError, ValueError):
+                self.error("ffuf output parse failed")
+                return
+
+        self.info(f"ffuf found {count} paths")
+
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """ffuf -of json output, streaming its results array."""
+        for result in iter_json_array(stream, "results"):
             url    = result.get("url", "")
             status = result.get("status", 0)
             length = result.get("length", 0)
@@ -291,8 +337,6 @@ class FfufPlugin(SROFPlugin):
                 },
             )
 
-        self.info(f"ffuf found {len(data.get('results', []))} paths")
-
 
 # ─── TRUFFLEHOG ──────────────────────────────────────────────────────────────
 @register
@@ -303,9 +347,10 @@ class TrufflehogPlugin(SROFPlugin):
     description = "Scan git repos / URLs for leaked secrets (700+ rules)"
     tags        = ["secrets", "leak", "git", "api-key"]
     author      = "XiaoYao @ Alfanet"
+    produces    = ["vuln"]
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("trufflehog"):
+        if not which("trufflehog"):
             self.warn("trufflehog not installed. Install: https://github.com/trufflesecurity/trufflehog")
             return
 
@@ -313,17 +358,22 @@ class TrufflehogPlugin(SROFPlugin):
         self.info(f"TruffleHog scanning {target}")
 
         cmd = ["trufflehog", "git", target, "--json", "--only-verified"]
-        rc, out, err = _run(cmd, timeout=300)
-        if rc == -2:
+        try:
+            proc = ToolProcess(cmd, timeout=300, job_id=config.job_id).start()
+        except FileNotFoundError:
             self.warn("trufflehog not found")
             return
 
-        for line in out.strip().splitlines():
-            try:
-                d = json.loads(line)
-            except Exception:
-                continue
+        with proc:
+            yield from self.parse(proc.stdout, target)
+        if proc.timed_out:
+            self.warn("trufflehog timed out")
 
+        self.info("TruffleHog scan complete")
+
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """trufflehog --json output (JSONL)."""
+        for d in iter_json_lines(stream):
             det_type = d.get("DetectorName", "Unknown")
             raw      = d.get("Raw", "")[:80]
             source   = d.get("SourceMetadata", {})
@@ -339,8 +389,6 @@ class TrufflehogPlugin(SROFPlugin):
                 metadata={"tool": "trufflehog", "detector": det_type},
             )
 
-        self.info("TruffleHog scan complete")
-
 
 # ─── DNS RESOLVER (pure Python, no external tool needed) ─────────────────────
 @register
@@ -351,9 +399,12 @@ class DnsResolvePlugin(SROFPlugin):
     description = "Resolve A/AAAA records for a list of subdomains"
     tags        = ["dns", "resolve", "pure-python"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["subdomain"]
+    produces    = ["host", "ip"]
+    batch       = 100
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        hosts = config.get("hosts", [config.target])
+        hosts = config.inputs or config.get("hosts", [config.target])
         self.info(f"Resolving {len(hosts)} hosts")
 
         for host in hosts:
@@ -2,22 +2,11 @@
 SROF · Scan Plugins
 Vulnerability scanning: Nuclei, Xray, fscan, nikto
 """
-import subprocess, shutil, json, re, tempfile, os
-from typing import Generator
-from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity
-
-
-def _which(cmd):  return shutil.which(cmd) is not None
-def _run(cmd, timeout=120):
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return r.returncode, r.stdout, r.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", "timeout"
-    except FileNotFoundError:
-        return -2, "", f"not found: {cmd[0]}"
-    except Exception as e:
-        return -3, "", str(e)
+import shutil, json, re
+from typing import Generator, TextIO
+from core.plugin import (SROFPlugin, PluginConfig, Finding, register, PluginCategory, Severity,
+                         iter_json_lines)
+from core.runner import ToolProcess, run_tool, temp_output, which
 
 
 SEV_MAP = {
@@ -39,9 +28,14 @@ class NucleiPlugin(SROFPlugin):
     description = "Template-based vulnerability scanner (9000+ templates)"
     tags        = ["vuln-scan", "poc", "templates", "oast"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["url"]
+    produces    = ["vuln"]
+    batch       = 200
+    weight      = 2
+    max_parallel = 2
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("nuclei"):
+        if not which("nuclei"):
             self.warn("nuclei not installed.\n"
                       "Install: go install github.com/projectdiscovery/nuclei/v3/cmd/nuclei@latest\n"
                       "Update templates: nuclei -update-templates")
@@ -49,35 +43,47 @@ class NucleiPlugin(SROFPlugin):
 
         severity  = config.get("severity", "critical,high,medium")
         templates = config.get("templates", "")
-        target    = config.target
-
-        self.info(f"Nuclei scanning {target} [severity: {severity}]")
-
-        cmd = [
-            "nuclei",
-            "-u", target,
-            "-severity", severity,
-            "-json", "-silent",
-            "-timeout", str(config.timeout),
-            "-c", str(config.threads),
-        ]
-        if templates:
-            cmd += ["-t", templates]
-        if config.proxy:
-            cmd += ["-proxy", config.proxy]
-
-        rc, out, err = _run(cmd, timeout=600)
-        if rc == -2:
-            self.warn("nuclei binary not found")
-            return
+        targets   = config.inputs or [config.target]
+        target    = targets[0] if len(targets) == 1 else ""
+
+        self.info(f"Nuclei scanning {target or f'{len(targets)} URLs'} [severity: {severity}]")
 
         count = 0
-        for line in out.strip().splitlines():
+        with temp_output(".txt") as list_file:
+            with open(list_file, "w") as f:
+                f.write("\n".join(targets))
+            cmd = [
+                "nuclei",
+                "-l", list_file,
+                "-severity", severity,
+                "-json", "-silent",
+                "-timeout", str(config.timeout),
+                "-c", str(config.threads),
+            ]
+            if templates:
+                cmd += ["-t", templates]
+            if config.proxy:
+                cmd += ["-proxy", config.proxy]
+
             try:
-                d = json.loads(line)
-            except Exception:
-                continue
+                proc = ToolProcess(cmd, timeout=max(600, 60 * len(targets)),
+                                   job_id=config.job_id).start()
+            except FileNotFoundError:
+                self.warn("nuclei binary not found")
+                return
+
+            with proc:
+                for finding in self.parse(proc.stdout, target):
+                    yield finding
+                    count += 1
+        if proc.timed_out:
+            self.warn(f"nuclei timed out; {count} issues before the cutoff")
+
+        self.info(f"Nuclei found {count} issues")
 
+    def parse(self, stream: TextIO, target: str = "") -> Generator[Finding, None, None]:
+        """nuclei -json output (JSONL)."""
+        for d in iter_json_lines(stream):
             sev      = d.get("info", {}).get("severity", "info").lower()
             name     = d.get("info", {}).get("name", d.get("template-id", ""))
             matched  = d.get("matched-at", target)
@@ -105,9 +111,6 @@ class NucleiPlugin(SROFPlugin):
                 source=self.id,
                 metadata={"tool": "nuclei", "severity": sev},
             )
-            count += 1
-
-        self.info(f"Nuclei found {count} issues")
 
 
 # ─── XRAY ────────────────────────────────────────────────────────────────────
@@ -119,6 +122,8 @@ class XrayPlugin(SROFPlugin):
     description = "Passive scanner from Chaitin (OWASP Top10 coverage)"
     tags        = ["passive-scan", "owasp", "chaitin"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["url"]
+    produces    = ["vuln"]
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
         xray_bin = shutil.which("xray") or shutil.which("xray_linux_amd64") \
@@ -128,33 +133,28 @@ class XrayPlugin(SROFPlugin):
             self.warn("xray not found. Download: https://github.com/chaitin/xray/releases")
             return
 
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-            out_file = tmp.name
-
         target = config.target
         self.info(f"Xray scanning {target}")
 
-        cmd = [
-            xray_bin, "webscan",
-            "--basic-crawler", target,
-            "--json-output", out_file,
-        ]
-        if config.proxy:
-            cmd += ["--http-proxy", config.proxy]
-
-        rc, _, err = _run(cmd, timeout=300)
-        if rc == -2:
-            self.warn("xray binary not found")
-            if os.path.exists(out_file):
-                os.unlink(out_file)
-            return
+        with temp_output(".json") as out_file:
+            cmd = [
+                xray_bin, "webscan",
+                "--basic-crawler", target,
+                "--json-output", out_file,
+            ]
+            if config.proxy:
+                cmd += ["--http-proxy", config.proxy]
 
-        try:
-            with open(out_file) as f:
-                content = f.read()
-            os.unlink(out_file)
-        except Exception:
-            return
+            rc, _, err = run_tool(cmd, timeout=300, job_id=config.job_id)
+            if rc == -2:
+                self.warn("xray binary not found")
+                return
+
+            try:
+                with open(out_file) as f:
+                    content = f.read()
+            except Exception:
+                return
 
         for line in content.strip().splitlines():
             try:
@@ -199,6 +199,10 @@ class FscanPlugin(SROFPlugin):
     description = "Internal network scanner: port + service + weak creds + PoC"
     tags        = ["intranet", "weak-creds", "hvv", "PoC"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["ip"]
+    produces    = ["vuln"]
+    weight      = 4
+    max_parallel = 1
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
         fscan_bin = shutil.which("fscan") or shutil.which("fscan_amd64")
@@ -207,23 +211,20 @@ class FscanPlugin(SROFPlugin):
             return
 
         target = config.target
-        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, mode="w") as tmp:
-            out_file = tmp.name
-
         self.info(f"fscan scanning {target}")
-        cmd = [fscan_bin, "-h", target, "-o", out_file, "-np", "-nobr"]
-        rc, out, err = _run(cmd, timeout=600)
-        if rc == -2:
-            self.warn("fscan not found")
-            if os.path.exists(out_file): os.unlink(out_file)
-            return
 
-        try:
-            with open(out_file) as f:
-                lines = f.readlines()
-            os.unlink(out_file)
-        except Exception:
-            lines = out.splitlines()
+        with temp_output(".txt") as out_file:
+            cmd = [fscan_bin, "-h", target, "-o", out_file, "-np", "-nobr"]
+            rc, out, err = run_tool(cmd, timeout=600, job_id=config.job_id)
+            if rc == -2:
+                self.warn("fscan not found")
+                return
+
+            try:
+                with open(out_file) as f:
+                    lines = f.readlines()
+            except Exception:
+                lines = out.splitlines()
 
         for line in lines:
             line = line.strip()
@@ -263,34 +264,32 @@ class NiktoPlugin(SROFPlugin):
     description = "Web server scanner: dangerous files, outdated software"
     tags        = ["web-server", "cve", "configuration"]
     author      = "XiaoYao @ Alfanet"
+    consumes    = ["url"]
+    produces    = ["vuln"]
 
     def run(self, config: PluginConfig) -> Generator[Finding, None, None]:
-        if not _which("nikto"):
+        if not which("nikto"):
             self.warn("nikto not installed. Install: https://github.com/sullo/nikto")
             return
 
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-            out_file = tmp.name
+        with temp_output(".json") as out_file:
+            cmd = [
+                "nikto", "-h", config.target,
+                "-o", out_file, "-Format", "json", "-nointeractive",
+            ]
+            if config.proxy:
+                cmd += ["-useproxy", config.proxy]
 
-        cmd = [
-            "nikto", "-h", config.target,
-            "-o", out_file, "-Format", "json", "-nointeractive",
-        ]
-        if config.proxy:
-            cmd += ["-useproxy", config.proxy]
-
-        rc, _, _ = _run(cmd, timeout=300)
-        if rc == -2:
-            self.warn("nikto not found")
-            if os.path.exists(out_file): os.unlink(out_file)
-            return
+            rc, _, _ = run_tool(cmd, timeout=300, job_id=config.job_id)
+            if rc == -2:
+                self.warn("nikto not found")
+                return
 
-        try:
-            with open(out_file) as f:
-                data = json.load(f)
-            os.unlink(out_file)
-        except Exception:
-            return
+            try:
+                with open(out_file) as f:
+                    data = json.load(f)
+            except Exception:
+                return
 
         for vuln in data.get("vulnerabilities", []):
             url  = vuln.get("url", config.target)
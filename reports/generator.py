@@ -19,6 +19,8 @@ SEV_EMOJI = {
     "info":     "⚪",
 }
 
+SEVERITIES = ("critical", "high", "medium", "low", "info")
+
 SEV_COLOR = {
     "critical": "#ff3a6e",
     "high":     "#ff6b35",
@@ -41,9 +43,15 @@ def generate(workspace_id: int = 1,
 
     ws      = WorkspaceRepo.get(workspace_id) or {"name": "default", "id": workspace_id}
     targets = TargetRepo.list_by_workspace(workspace_id)
-    vulns   = VulnRepo.list_by_workspace(workspace_id)
     stats   = VulnRepo.stats_by_workspace(workspace_id)
 
+    def vulns():
+        # Streamed per severity, so rows arrive already grouped and only
+        # the evidence a section actually renders gets decoded.
+        for sev in SEVERITIES:
+            yield from VulnRepo.iter_by_workspace(workspace_id, severity=sev,
+                                                  decode="lazy")
+
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -53,12 +61,12 @@ def generate(workspace_id: int = 1,
 
     if fmt in ("md", "both"):
         md_path = output_dir / f"SROF_Report_{name}_{ts}.md"
-        md_path.write_text(_markdown(ws, targets, vulns, stats), encoding="utf-8")
+        md_path.write_text(_markdown(ws, targets, vulns(), stats), encoding="utf-8")
         paths["md"] = md_path
 
     if fmt in ("html", "both"):
         html_path = output_dir / f"SROF_Report_{name}_{ts}.html"
-        html_path.write_text(_html_report(ws, targets, vulns, stats), encoding="utf-8")
+        html_path.write_text(_html_report(ws, targets, vulns(), stats), encoding="utf-8")
         paths["html"] = html_path
 
     return paths
@@ -67,7 +75,7 @@ def generate(workspace_id: int = 1,
 # ── MARKDOWN ─────────────────────────────────────────────────────────────────
 def _markdown(ws, targets, vulns, stats) -> str:
     now  = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    total = len(vulns)
+    total = sum(stats.values())
     lines = [
         f"# 渗透测试报告 · SROF",
         f"",
@@ -84,7 +92,7 @@ def _markdown(ws, targets, vulns, stats) -> str:
         f"## 漏洞统计",
         f"",
     ]
-    for sev in ("critical", "high", "medium", "low", "info"):
+    for sev in SEVERITIES:
         cnt = stats.get(sev, 0)
         bar = "█" * min(cnt, 30)
         lines.append(f"- {SEV_EMOJI[sev]} **{sev.upper()}**: {cnt}  `{bar}`")
@@ -99,36 +107,32 @@ def _markdown(ws, targets, vulns, stats) -> str:
 
     lines += ["", "---", "", "## 漏洞详情", ""]
 
-    grouped = {}
+    current = None
     for v in vulns:
-        grouped.setdefault(v["severity"], []).append(v)
-
-    for sev in ("critical", "high", "medium", "low", "info"):
-        vs = grouped.get(sev, [])
-        if not vs:
-            continue
-        lines.append(f"### {SEV_EMOJI[sev]} {sev.upper()} ({len(vs)})")
-        lines.append("")
-        for v in vs:
+        sev = v["severity"]
+        if sev != current:
+            current = sev
+            lines.append(f"### {SEV_EMOJI[sev]} {sev.upper()} ({stats.get(sev, 0)})")
+            lines.append("")
+        lines += [
+            f"#### {v['name']}",
+            f"",
+            f"- **目标**: `{v['host']}:{v.get('port') or ''}`",
+            f"- **CVE**: {v.get('cve') or '—'}",
+            f"- **CVSS**: {v.get('cvss') or '—'}",
+            f"- **插件**: `{v['plugin_id']}`",
+            f"",
+            f"{v.get('description') or '无描述'}",
+            f"",
+        ]
+        ev = v.get("evidence") or {}
+        if ev.get("request"):
             lines += [
-                f"#### {v['name']}",
-                f"",
-                f"- **目标**: `{v['host']}:{v.get('port') or ''}`",
-                f"- **CVE**: {v.get('cve') or '—'}",
-                f"- **CVSS**: {v.get('cvss') or '—'}",
-                f"- **插件**: `{v['plugin_id']}`",
-                f"",
-                f"{v.get('description') or '无描述'}",
-                f"",
+                "```http",
+                str(ev["request"])[:800],
+                "```",
+                "",
             ]
-            ev = v.get("evidence") or {}
-            if ev.get("request"):
-                lines += [
-                    "```http",
-                    str(ev["request"])[:800],
-                    "```",
-                    "",
-                ]
 
     lines += [
         "---",
@@ -142,13 +146,13 @@ def _markdown(ws, targets, vulns, stats) -> str:
 # ── HTML ─────────────────────────────────────────────────────────────────────
 def _html_report(ws, targets, vulns, stats) -> str:
     now   = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    total = len(vulns)
+    total = sum(stats.values())
 
     def e(s): return html.escape(str(s or ""))
 
     # Stat cards
     stat_cards = ""
-    for sev in ("critical", "high", "medium", "low", "info"):
+    for sev in SEVERITIES:
         cnt   = stats.get(sev, 0)
         color = SEV_COLOR[sev]
         stat_cards += f"""
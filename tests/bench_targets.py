@@ -0,0 +1,57 @@
+"""
+SROF · Target import benchmark
+Compares TargetRepo.bulk_add with one TargetRepo.add per host.
+
+Run: python -m tests.bench_targets [hosts]
+"""
+import os, sys, time, tempfile
+from pathlib import Path
+
+# Never the user's database: always a fresh one
+os.environ["SROF_DB"] = str(Path(tempfile.mkdtemp(prefix="srof_bench_")) / "bench.db")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.database import WorkspaceRepo, TargetRepo, Target   # noqa: E402
+
+
+def _scope(n: int) -> list:
+    # Mix of names, host:port, URLs and repeats, like a real scope file.
+    lines = []
+    for i in range(n):
+        if i % 10 == 0:
+            lines.append(f"https://app{i}.bench.example.com:8443/login")
+        elif i % 10 == 1:
+            lines.append(f"api{i}.bench.example.com:8080")
+        else:
+            lines.append(f"host{i}.bench.example.com")
+    return lines + lines[: n // 10]
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main(n: int = 100000):
+    lines = _scope(n)
+    ws_bulk = WorkspaceRepo.create("bench_bulk")
+    ws_fresh = WorkspaceRepo.create("bench_fresh")
+    ws_loop = WorkspaceRepo.create("bench_loop")
+
+    bulk = _timed(lambda: TargetRepo.bulk_add(ws_bulk, lines))
+    again = _timed(lambda: TargetRepo.bulk_add(ws_bulk, lines))
+    small = _timed(lambda: TargetRepo.bulk_add(ws_fresh, lines, chunk=5000))
+    sample = lines[: min(len(lines), 5000)]
+    loop = _timed(lambda: [TargetRepo.add(Target(host=h, workspace_id=ws_loop))
+                           for h in sample])
+
+    print(f"entries            {len(lines):>10}")
+    print(f"bulk_add           {len(lines) / bulk:>10.0f} /s")
+    print(f"bulk_add (re-run)  {len(lines) / again:>10.0f} /s")
+    print(f"bulk_add chunk=5k  {len(lines) / small:>10.0f} /s")
+    print(f"add() per host     {len(sample) / loop:>10.0f} /s  ({len(sample)} entries)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
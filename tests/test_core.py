@@ -10,8 +10,8 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-# Use a temporary DB for all tests
-os.environ["SROF_DB"] = str(Path(tempfile.gettempdir()) / "srof_test.db")
+# Use a fresh temporary DB for every test session
+os.environ["SROF_DB"] = str(Path(tempfile.mkdtemp(prefix="srof_test_")) / "srof_test.db")
 
 
 # ─── Plugin System ────────────────────────────────────────────────────────────
@@ -145,6 +145,694 @@ class TestDatabase:
         JobRepo.log(job_id, "test.plugin", "Test log message", "info")
 
 
+# ─── Connection Pool ──────────────────────────────────────────────────────────
+class TestConnectionPool:
+    def test_connection_reused_within_thread(self):
+        from core.database import get_connection
+        assert get_connection() is get_connection()
+
+    def test_connection_per_thread(self):
+        import threading
+        from core.database import get_connection
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(get_connection()))
+        t.start(); t.join()
+        assert seen[0] is not get_connection()
+
+    def test_pragmas_applied(self):
+        from core.database import get_connection, PRAGMAS
+        conn = get_connection()
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == PRAGMAS["busy_timeout"]
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    def test_configure_rejects_unknown_pragma(self):
+        from core.database import configure_db
+        with pytest.raises(ValueError):
+            configure_db(not_a_pragma=1)
+
+    def test_ignored_insert_returns_existing_id(self):
+        from core.database import WorkspaceRepo
+        ws_id = WorkspaceRepo.create("pool_lastrowid_ws")
+        WorkspaceRepo.create("pool_lastrowid_other_ws")
+        assert WorkspaceRepo.create("pool_lastrowid_ws") == ws_id
+
+    def test_nested_get_db_rolls_back_as_one(self):
+        from core.database import get_db, WorkspaceRepo
+        with pytest.raises(RuntimeError):
+            with get_db():
+                WorkspaceRepo.create("nested_rollback_ws")
+                raise RuntimeError("boom")
+        names = [w["name"] for w in WorkspaceRepo.list_all()]
+        assert "nested_rollback_ws" not in names
+
+
+# ─── Asset Dedup ──────────────────────────────────────────────────────────────
+class TestAssetDedup:
+    def test_repeat_asset_merges_into_one_row(self):
+        from core.database import WorkspaceRepo, TargetRepo, AssetRepo, Target, Asset
+        ws_id = WorkspaceRepo.create("dedup_test_ws")
+        tid   = TargetRepo.add(Target(host="dedup.example.com", workspace_id=ws_id))
+        a1 = AssetRepo.add(Asset(tid, "url", "https://dedup.example.com", "recon.httpx",
+                                 {"status_code": 200, "title": "Home"}))
+        a2, a3 = AssetRepo.bulk_add([
+            Asset(tid, "url", "https://dedup.example.com", "recon.ffuf", {"status_code": 403}),
+            Asset(tid, "url", "https://dedup.example.com", "recon.httpx", {}),
+        ])
+        assert a1 == a2 == a3
+        rows = AssetRepo.list_by_target(tid)
+        assert len(rows) == 1
+        assert rows[0]["metadata"] == {"status_code": 403, "title": "Home"}
+        assert rows[0]["sources"] == ["recon.httpx", "recon.ffuf"]
+        assert rows[0]["last_seen"] >= rows[0]["discovered_at"]
+
+    def test_migration_folds_existing_duplicates(self, tmp_path):
+        import sqlite3
+        from core.database import get_connection, SCHEMA, _exec_script
+        path = tmp_path / "dupes.db"
+        legacy = sqlite3.connect(str(path))
+        _exec_script(legacy, SCHEMA)
+        legacy.execute("PRAGMA user_version=1")
+        legacy.execute("INSERT INTO targets(id, host) VALUES(1, 'h')")
+        for src, meta in (("a", '{"x": 1}'), ("b", '{"y": 2}')):
+            legacy.execute("INSERT INTO assets(target_id, type, value, source, metadata)"
+                           " VALUES(1, 'url', 'u', ?, ?)", (src, meta))
+        legacy.execute("INSERT INTO vulnerabilities(target_id, asset_id, plugin_id, name,"
+                       " severity) VALUES(1, 2, 'p', 'n', 'low')")
+        legacy.commit(); legacy.close()
+
+        conn = get_connection(path)
+        rows = conn.execute("SELECT id, metadata, sources FROM assets").fetchall()
+        assert [tuple(r) for r in rows] == [(1, '{"x": 1, "y": 2}', '["a", "b"]')]
+        assert conn.execute("SELECT asset_id FROM vulnerabilities").fetchone()[0] == 1
+
+
+# ─── Streaming Queries ────────────────────────────────────────────────────────
+class TestStreamingQueries:
+    def test_keyset_pages_cover_all_rows(self):
+        from core.database import WorkspaceRepo, TargetRepo, AssetRepo, Target, Asset
+        ws_id = WorkspaceRepo.create("paging_test_ws")
+        tid   = TargetRepo.add(Target(host="paging.example.com", workspace_id=ws_id))
+        AssetRepo.bulk_add([Asset(tid, "subdomain", f"s{i}.example.com", "test")
+                            for i in range(25)])
+        seen, after = [], 0
+        while True:
+            page = AssetRepo.page_by_target(tid, after_id=after, limit=10)
+            if not page:
+                break
+            seen += [a["value"] for a in page]
+            after = page[-1]["id"]
+        assert len(seen) == 25 == len(set(seen))
+        assert len(list(AssetRepo.iter_by_target(tid, chunk=7))) == 25
+
+    def test_lazy_decoding(self):
+        from core.database import (WorkspaceRepo, TargetRepo, VulnRepo, Target,
+                                   Vulnerability, LazyRecord)
+        ws_id = WorkspaceRepo.create("lazy_test_ws")
+        tid   = TargetRepo.add(Target(host="lazy.example.com", workspace_id=ws_id))
+        VulnRepo.add(Vulnerability(tid, "test", "SQLi", "critical",
+                                   evidence={"request": "GET / HTTP/1.1"}))
+        row = next(VulnRepo.iter_by_workspace(ws_id, decode="lazy"))
+        assert isinstance(row, LazyRecord)
+        assert row["evidence"]["request"] == "GET / HTTP/1.1"
+        raw = next(VulnRepo.iter_by_workspace(ws_id, decode=False))
+        assert isinstance(raw["evidence"], str)
+
+    def test_report_streams_vulns(self, tmp_path):
+        from reports.generator import generate
+        from core.database import WorkspaceRepo, TargetRepo, VulnRepo, Target, Vulnerability
+        ws_id = WorkspaceRepo.create("report_stream_ws")
+        tid   = TargetRepo.add(Target(host="report.example.com", workspace_id=ws_id))
+        VulnRepo.add(Vulnerability(tid, "test", "SQLi", "critical",
+                                   evidence={"request": "GET / HTTP/1.1"}))
+        paths = generate(ws_id, output_dir=tmp_path)
+        md = paths["md"].read_text(encoding="utf-8")
+        assert "CRITICAL (1)" in md and "GET / HTTP/1.1" in md
+        assert "SQLi" in paths["html"].read_text(encoding="utf-8")
+
+
+# ─── Query Plans ──────────────────────────────────────────────────────────────
+def _plan(sql, params):
+    from core.database import get_db
+    with get_db() as db:
+        return [r[3] for r in db.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def _assert_indexed(plan):
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("severity", [None, "high"])
+    def test_vuln_listing_uses_rank_index(self, severity):
+        from core.database import VulnRepo
+        q, params = VulnRepo._list_query(1, severity)
+        _assert_indexed(_plan(q + " ORDER BY v.severity_rank, v.id", params))
+        _assert_indexed(_plan(q + " AND v.id > ? ORDER BY v.id LIMIT 10", params + [0]))
+
+    def test_vuln_stats_uses_covering_index(self):
+        plan = _plan("SELECT severity, COUNT(*) FROM vulnerabilities"
+                     " WHERE workspace_id=? GROUP BY severity", [1])
+        _assert_indexed(plan)
+        assert "COVERING INDEX" in plan[0]
+
+    def test_vuln_listing_order(self):
+        from core.database import (WorkspaceRepo, TargetRepo, VulnRepo, Target,
+                                   Vulnerability)
+        ws_id = WorkspaceRepo.create("rank_test_ws")
+        tid   = TargetRepo.add(Target(host="rank.example.com", workspace_id=ws_id))
+        for sev in ("info", "critical", "low", "high", "medium"):
+            VulnRepo.add(Vulnerability(tid, "test", sev, sev))
+        assert [v["severity"] for v in VulnRepo.list_by_workspace(ws_id)] == \
+            ["critical", "high", "medium", "low", "info"]
+        assert [v["severity"] for v in VulnRepo.list_by_workspace(ws_id, "low")] == ["low"]
+
+
+# ─── Metadata Columns ─────────────────────────────────────────────────────────
+class TestMetadataColumns:
+    def test_find_by_hot_metadata_keys(self):
+        from core.database import WorkspaceRepo, TargetRepo, AssetRepo, Target, Asset
+        ws_id = WorkspaceRepo.create("json_cols_ws")
+        tid   = TargetRepo.add(Target(host="json.example.com", workspace_id=ws_id))
+        AssetRepo.bulk_add([
+            Asset(tid, "url", "https://json.example.com/admin", "recon.httpx",
+                  {"status_code": 403, "technologies": ["Nginx", "PHP"], "is_cdn": True}),
+            Asset(tid, "url", "https://json.example.com/", "recon.httpx",
+                  {"status_code": 200, "technologies": ["Nginx"], "is_cdn": False}),
+            Asset(tid, "service", "json.example.com:445", "recon.nmap",
+                  {"port": 445, "service": "microsoft-ds"}),
+        ])
+        values = lambda **kw: [a["value"] for a in AssetRepo.find(ws_id, **kw)]
+        assert values(status_code=403) == ["https://json.example.com/admin"]
+        assert values(port=445, service="microsoft-ds") == ["json.example.com:445"]
+        assert values(is_cdn=True) == ["https://json.example.com/admin"]
+        assert len(values(technology="nginx")) == 2
+
+        AssetRepo.add(Asset(tid, "url", "https://json.example.com/", "recon.httpx",
+                            {"technologies": ["Nginx", "React"]}))
+        assert values(technology="react") == ["https://json.example.com/"]
+
+    def test_metadata_filters_use_indexes(self):
+        _assert_indexed(_plan("SELECT * FROM assets WHERE target_id=? AND status_code=?",
+                              [1, 403]))
+        _assert_indexed(_plan("SELECT * FROM asset_technologies WHERE tech=?", ["nginx"]))
+        from core.database import VulnRepo
+        q, params = VulnRepo._list_query(1, template_id="CVE-2021-44228")
+        _assert_indexed(_plan(q, params))
+
+
+# ─── Vuln Fingerprints ────────────────────────────────────────────────────────
+class TestVulnFingerprints:
+    def test_location_normalization(self):
+        from core.database import normalize_location, vuln_fingerprint
+        assert normalize_location("HTTPS://Example.com:443/a/?id=1&b=2#x") == \
+            "https://example.com/a?b&id"
+        assert normalize_location("http://example.com:8080") == "http://example.com:8080/"
+        assert vuln_fingerprint("scan.nuclei", "X", "https://a.com/?q=1",
+                                {"template_id": "t"}) == \
+            vuln_fingerprint("scan.nuclei", "Y", "https://A.com?q=2", {"template_id": "t"})
+
+    def test_rescans_classify_new_recurring_resolved(self):
+        from core.engine import Engine
+        from core.plugin import (SROFPlugin, PluginConfig, Finding, register,
+                                 PluginCategory)
+        from core.database import WorkspaceRepo, TargetRepo, VulnRepo, Target
+
+        @register
+        class VulnScanPlugin(SROFPlugin):
+            id       = "test.vulnscan"
+            name     = "Vuln Scan"
+            category = PluginCategory.SCAN
+
+            def run(self, config: PluginConfig):
+                for path in config.get("paths", []):
+                    yield Finding(type="vuln", value=f"https://fp.example.com/{path}?id=1",
+                                  title=f"SQLi {path}", severity="high", source=self.id,
+                                  evidence={"template_id": "sqli-" + path})
+
+        ws_id  = WorkspaceRepo.create("fingerprint_test_ws")
+        tid    = TargetRepo.add(Target(host="fp.example.com", workspace_id=ws_id))
+        engine = Engine(max_workers=1)
+        done   = []
+        engine.on_event(lambda evt, data: evt == "job_done" and done.append(data))
+
+        run = lambda paths: engine.run(ws_id, tid, ["test.vulnscan"],
+                                       PluginConfig(target="fp.example.com",
+                                                    extra={"paths": paths}))
+        j1 = run(["a", "b"])
+        j2 = run(["b", "c"])
+        assert done[0]["vulns"] == {"new": 2, "recurring": 0, "resolved": 0}
+        assert done[1]["vulns"] == {"new": 1, "recurring": 1, "resolved": 1}
+
+        vulns = {v["location"]: v for v in VulnRepo.list_by_workspace(ws_id)}
+        assert len(vulns) == 3
+        b = vulns["https://fp.example.com/b?id=1"]
+        assert (b["occurrences"], b["first_job_id"], b["job_id"]) == (2, j1, j2)
+
+    def test_migration_keeps_distinct_legacy_vulns(self, tmp_path):
+        import sqlite3
+        from core.database import get_connection, vuln_fingerprint, SCHEMA, _exec_script
+        path = tmp_path / "legacy_vulns.db"
+        legacy = sqlite3.connect(str(path))
+        _exec_script(legacy, SCHEMA)
+        legacy.execute("PRAGMA user_version=1")
+        legacy.execute("INSERT INTO targets(id, host) VALUES(1, 'h')")
+        rows = [('{"url": "https://h/a"}', "d", 10), ('{"url": "https://h/b"}', "d", 20),
+                ('{"url": "https://h/b"}', "d", 30), ("{}", "one", 40), ("{}", "other", 50)]
+        for evidence, desc, found_at in rows:
+            legacy.execute("INSERT INTO vulnerabilities(target_id, plugin_id, name, severity,"
+                           " description, evidence, found_at) VALUES(1, 'p', 'n', 'low', ?, ?, ?)",
+                           (desc, evidence, found_at))
+        legacy.commit(); legacy.close()
+
+        conn = get_connection(path)
+        got = conn.execute("SELECT id, location, fingerprint, occurrences, last_seen"
+                           " FROM vulnerabilities ORDER BY id").fetchall()
+        assert [(r["id"], r["location"], r["occurrences"], r["last_seen"]) for r in got] == [
+            (1, "https://h/a", 1, 10), (2, "https://h/b", 2, 30), (4, "", 1, 40), (5, "", 1, 50)]
+        # A rescan of the same finding lands on the backfilled row.
+        assert got[1]["fingerprint"] == vuln_fingerprint("p", "n", "https://h/b/",
+                                                         {"url": "https://h/b"})
+        assert len({r["fingerprint"] for r in got}) == 4
+
+    def test_rescan_after_upgrade_matches_legacy_rows(self, tmp_path, monkeypatch):
+        import json, sqlite3
+        from core import database
+        from core.plugin import Finding
+        from core.writer import FindingWriter
+        path = tmp_path / "legacy_rescan.db"
+        legacy = sqlite3.connect(str(path))
+        database._exec_script(legacy, database.SCHEMA)
+        legacy.execute("PRAGMA user_version=1")
+        legacy.execute("INSERT INTO targets(id, host) VALUES(1, 'h.example.com')")
+        url = "https://h.example.com/item?id=1"
+        xray = Finding(type="vuln", value=url, title=f"Xray: SQLI at {url}", severity="critical",
+                       description="Xray detected sqli", source="scan.xray",
+                       evidence={"payload": "1'", "detail": {"payload": "1'"}},
+                       metadata={"tool": "xray", "vuln_type": "sqli"})
+        nuclei = Finding(type="vuln", value="https://h.example.com/login", title="Exposed Login",
+                         severity="info", source="scan.nuclei",
+                         evidence={"request": "GET /login HTTP/1.1\r\nHost: h.example.com\r\n",
+                                   "response": "", "template_id": "login-panel", "matcher": ""},
+                         metadata={"tool": "nuclei", "severity": "info"})
+        for f in (xray, nuclei):                    # as the pre-fingerprint engine stored them
+            legacy.execute("INSERT INTO vulnerabilities(target_id, plugin_id, name, severity,"
+                           " description, evidence) VALUES(1, ?, ?, ?, ?, ?)",
+                           (f.source, f.title, f.severity, f.description, json.dumps(f.evidence)))
+        legacy.commit(); legacy.close()
+
+        monkeypatch.setattr(database, "DB_PATH", path)
+        writer = FindingWriter()
+        ids = [writer.submit(f, 1, 0).result(timeout=5) for f in (xray, nuclei)]
+        writer.close()
+        assert ids == [1, 2]
+        rows = database.get_connection(path).execute(
+            "SELECT id, occurrences FROM vulnerabilities ORDER BY id").fetchall()
+        assert [tuple(r) for r in rows] == [(1, 2), (2, 2)]
+
+
+# ─── Job Diff ─────────────────────────────────────────────────────────────────
+class TestJobDiff:
+    def test_diff_between_jobs(self):
+        from core.engine import Engine
+        from core.plugin import (SROFPlugin, PluginConfig, Finding, register,
+                                 PluginCategory)
+        from core.database import WorkspaceRepo, TargetRepo, DiffRepo, Target
+
+        @register
+        class HostListPlugin(SROFPlugin):
+            id       = "test.hostlist"
+            name     = "Host List"
+            category = PluginCategory.RECON
+
+            def run(self, config: PluginConfig):
+                for host in config.get("hosts", []):
+                    yield Finding(type="asset", value=host, source=self.id,
+                                  metadata={"asset_type": "subdomain"})
+
+        ws_id  = WorkspaceRepo.create("diff_test_ws")
+        tid    = TargetRepo.add(Target(host="diff.example.com", workspace_id=ws_id))
+        engine = Engine(max_workers=1)
+        run = lambda hosts: engine.run(ws_id, tid, ["test.hostlist"],
+                                       PluginConfig(target="diff.example.com",
+                                                    extra={"hosts": hosts}))
+        j1 = run(["a.diff.example.com", "b.diff.example.com"])
+        j2 = run(["b.diff.example.com", "c.diff.example.com"])
+
+        d = DiffRepo.diff(j1, j2, kinds=("asset",))["asset"]
+        values = lambda rows: sorted(r["value"] for r in rows)
+        assert values(d["added"]) == ["c.diff.example.com"]
+        assert values(d["removed"]) == ["a.diff.example.com"]
+        assert values(d["unchanged"]) == ["b.diff.example.com"]
+        assert DiffRepo.summary(j2, j1)["asset"] == {"added": 1, "removed": 1, "unchanged": 1}
+
+    def test_diff_queries_use_provenance_indexes(self):
+        from core.database import DiffRepo
+        for kind in ("asset", "vuln"):
+            for change in ("added", "removed", "unchanged"):
+                plan = _plan(DiffRepo._query(kind, change), {"a": 1, "b": 2, "ws": 1})
+                _assert_indexed(plan)
+                assert any("job_id>" in step or "job_id<" in step for step in plan), plan
+
+
+# ─── Workspace Stats ──────────────────────────────────────────────────────────
+class TestWorkspaceStats:
+    def test_counts_follow_inserts_updates_and_deletes(self):
+        from core.database import (WorkspaceRepo, TargetRepo, AssetRepo, VulnRepo,
+                                   StatsRepo, Target, Asset, Vulnerability, get_db)
+        ws_id = WorkspaceRepo.create("stats_test_ws")
+        t1 = TargetRepo.add(Target(host="stats1.example.com", workspace_id=ws_id))
+        t2 = TargetRepo.add(Target(host="stats2.example.com", workspace_id=ws_id))
+        for tid in (t1, t2):
+            AssetRepo.add(Asset(tid, "subdomain", f"a.{tid}.example.com", "recon.subfinder"))
+            VulnRepo.add(Vulnerability(tid, "scan.nuclei", "XSS", "high"))
+        VulnRepo.add(Vulnerability(t1, "scan.nikto", "Banner", "info"))
+
+        stats = StatsRepo.get(ws_id)
+        assert stats["severity"] == {"high": 2, "info": 1}
+        assert stats["plugin"] == {"scan.nuclei": 2, "scan.nikto": 1}
+        assert stats["asset_type"] == {"subdomain": 2}
+        assert VulnRepo.stats_by_workspace(ws_id) == {"high": 2, "info": 1}
+
+        with get_db() as db:
+            db.execute("UPDATE vulnerabilities SET status='fixed' WHERE target_id=? "
+                       "AND severity='high'", (t1,))
+            db.execute("DELETE FROM targets WHERE id=?", (t2,))
+        stats = StatsRepo.get(ws_id)
+        assert stats["status"] == {"open": 1, "fixed": 1}
+        assert stats["severity"] == {"high": 1, "info": 1}
+        assert stats["asset_type"] == {"subdomain": 1}
+
+        StatsRepo.rebuild(ws_id)
+        assert StatsRepo.get(ws_id) == stats
+
+
+# ─── Full-Text Search ─────────────────────────────────────────────────────────
+class TestSearch:
+    def test_search_across_kinds_is_workspace_scoped(self):
+        from core.database import (WorkspaceRepo, TargetRepo, AssetRepo, VulnRepo,
+                                   JobRepo, SearchRepo, Target, Asset, Vulnerability)
+        ws_id = WorkspaceRepo.create("search_test_ws")
+        other = WorkspaceRepo.create("search_other_ws")
+        tid   = TargetRepo.add(Target(host="search.example.com", workspace_id=ws_id))
+        oid   = TargetRepo.add(Target(host="search.example.org", workspace_id=other))
+        VulnRepo.add(Vulnerability(tid, "scan.nuclei", "Apache Log4Shell RCE", "critical",
+                                   description="JNDI lookup in User-Agent"))
+        VulnRepo.add(Vulnerability(oid, "scan.nuclei", "Log4Shell elsewhere", "critical"))
+        AssetRepo.add(Asset(tid, "url", "https://search.example.com/log4j-console", "recon.ffuf"))
+        job = JobRepo.create(ws_id, "scan")
+        JobRepo.log(job, "scan.nuclei", "matched log4shell template on search.example.com")
+
+        hits = SearchRepo.query(ws_id, "log4")
+        assert {h["kind"] for h in hits} == {"vuln", "asset", "log"}
+        assert all("elsewhere" not in h["title"] for h in hits)
+
+        vuln = SearchRepo.query(ws_id, "jndi", kinds=("vuln",))
+        assert len(vuln) == 1 and "[JNDI]" in vuln[0]["snippet"]
+
+    def test_search_tolerates_fts_syntax(self):
+        from core.database import SearchRepo, WorkspaceRepo
+        ws_id = WorkspaceRepo.create("search_test_ws")
+        assert SearchRepo.query(ws_id, 'NEAR( "unbalanced OR') == []
+        assert SearchRepo.query(ws_id, "   ") == []
+
+    def test_fts_created_once_fts5_is_available(self, tmp_path, monkeypatch):
+        from core import database
+        monkeypatch.setattr(database, "_fts5_available", lambda db: False)
+        conn = database.get_connection(tmp_path / "nofts.db")
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name='fts_logs'").fetchone() is None
+        with database.get_db(tmp_path / "nofts.db") as db:
+            db.execute("INSERT INTO workspaces(id, name) VALUES(1, 'w')")
+            db.execute("INSERT INTO scan_jobs(id, workspace_id, type) VALUES(1, 1, 'scan')")
+            db.execute("INSERT INTO plugin_logs(job_id, plugin_id, message)"
+                       " VALUES(1, 'scan.nuclei', 'matched log4shell')")
+        monkeypatch.undo()                    # SQLite upgraded; the next start sees FTS5
+        assert database._ensure_fts(conn)
+        hits = conn.execute("SELECT rowid FROM fts_logs WHERE fts_logs MATCH 'log4shell'").fetchall()
+        assert len(hits) == 1
+
+        def fts_schema(db):
+            return db.execute("SELECT name, sql FROM sqlite_master WHERE name LIKE 'fts_%'"
+                              " OR name LIKE 'trg_fts_%' ORDER BY name").fetchall()
+        fresh = database.get_connection(tmp_path / "fresh.db")
+        assert [tuple(r) for r in fts_schema(conn)] == [tuple(r) for r in fts_schema(fresh)]
+
+
+# ─── Migrations ───────────────────────────────────────────────────────────────
+class TestMigrations:
+    def test_fresh_db_is_at_latest_version(self, tmp_path):
+        from core.database import get_connection, schema_version, MIGRATIONS
+        conn = get_connection(tmp_path / "fresh.db")
+        assert schema_version(conn) == MIGRATIONS[-1][0]
+
+    def test_legacy_db_is_upgraded(self, tmp_path):
+        import sqlite3
+        from core.database import get_connection, schema_version, MIGRATIONS
+        path = tmp_path / "legacy.db"
+        legacy = sqlite3.connect(str(path))
+        legacy.execute("CREATE TABLE workspaces (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                       " name TEXT NOT NULL UNIQUE, description TEXT,"
+                       " created_at INTEGER, updated_at INTEGER)")
+        legacy.execute("INSERT INTO workspaces(name) VALUES('old')")
+        legacy.commit(); legacy.close()
+
+        conn = get_connection(path)
+        assert schema_version(conn) == MIGRATIONS[-1][0]
+        assert conn.execute("SELECT name FROM workspaces").fetchone()[0] == "old"
+
+    def test_migrations_are_sequential(self):
+        from core.database import MIGRATIONS
+        assert [m[0] for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+# ─── Log Sink ─────────────────────────────────────────────────────────────────
+class TestLogSink:
+    def _rows(self, job_id):
+        from core.database import get_db
+        with get_db() as db:
+            return [tuple(r) for r in db.execute(
+                "SELECT level, message FROM plugin_logs WHERE job_id=? ORDER BY id",
+                (job_id,))]
+
+    def test_level_filter_batching_and_repeats(self):
+        from core.database import WorkspaceRepo, JobRepo
+        from core.logsink import LogSink
+        job = JobRepo.create(WorkspaceRepo.create("logsink_test_ws"), "recon")
+        sink = LogSink(batch_size=1000, flush_interval=60, repeat_limit=2)
+        sink.open_job(job, "info")
+        sink.log(job, "recon.dns_resolve", "Cannot resolve x", "debug")
+        sink.log(job, "recon.dns_resolve", "Resolving 3 hosts", "info")
+        for _ in range(5):
+            sink.log(job, "recon.dns_resolve", "timeout", "warn")
+        assert self._rows(job) == []          # still buffered
+        sink.close_job(job)
+        sink.close()
+        assert self._rows(job) == [
+            ("info", "Resolving 3 hosts"),
+            ("warn", "timeout"), ("warn", "timeout"),
+            ("warn", "timeout (suppressed 3 repeats)"),
+        ]
+
+    def test_file_sink_can_replace_db(self, tmp_path):
+        from core.database import WorkspaceRepo, JobRepo
+        from core.logsink import LogSink
+        job = JobRepo.create(WorkspaceRepo.create("logsink_test_ws"), "recon")
+        sink = LogSink(to_db=False, log_file=tmp_path / "plugins.log")
+        sink.open_job(job, "debug")
+        sink.log(job, "recon.nmap", "nmap scanning 10.0.0.1", "debug")
+        sink.close_job(job)
+        sink.close()
+        assert self._rows(job) == []
+        assert "nmap scanning 10.0.0.1" in (tmp_path / "plugins.log").read_text()
+        assert sink._file_log.handlers == []       # file closed with the last job
+
+    def test_expired_repeats_are_dropped(self):
+        import time
+        from core.database import WorkspaceRepo, JobRepo
+        from core.logsink import LogSink
+        job = JobRepo.create(WorkspaceRepo.create("logsink_test_ws"), "recon")
+        sink = LogSink(batch_size=1000, flush_interval=60, repeat_limit=1, repeat_window=0.05)
+        sink.open_job(job, "info")
+        for i in range(100):
+            sink.log(job, "recon.httpx", f"probing host{i}", "info")
+        sink.log(job, "recon.httpx", "probing host0", "info")
+        time.sleep(0.1)
+        sink.flush()
+        assert sink._repeats == {}
+        sink.close_job(job)
+        sink.close()
+        assert ("info", "probing host0 (suppressed 1 repeats)") in self._rows(job)
+
+
+# ─── Maintenance ──────────────────────────────────────────────────────────────
+class TestMaintenance:
+    def test_retention_and_compaction(self):
+        import time
+        from core.database import WorkspaceRepo, JobRepo, get_db
+        from core import maintenance
+        ws_id = WorkspaceRepo.create("maintenance_test_ws")
+        jobs = [JobRepo.create(ws_id, "recon") for _ in range(3)]
+        for j in jobs:
+            JobRepo.finish(j)
+            JobRepo.bulk_log([(j, "test", "info", f"line {i}", None, time.time())
+                              for i in range(20)])
+        old = int(time.time()) - 90 * 86400
+        with get_db() as db:
+            db.execute("UPDATE plugin_logs SET ts=? WHERE job_id=? AND message='line 0'",
+                       (old, jobs[-1]))
+
+        policy = maintenance.RetentionPolicy(log_max_age_days=30, keep_jobs=1, chunk=7)
+        report = maintenance.run(policy)
+        assert report["removed"]["logs"] >= 1 + 2 * 20
+        assert report["removed"]["jobs"] >= 2
+        with get_db() as db:
+            assert db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            left = db.execute("SELECT job_id, COUNT(*) FROM plugin_logs WHERE job_id IN "
+                              "(?,?,?) GROUP BY job_id", jobs).fetchall()
+        assert [tuple(r) for r in left] == [(jobs[-1], 19)]
+        assert set(report["after"]) == {"file_bytes", "wal_bytes", "page_count",
+                                        "free_pages", "page_size"}
+
+
+# ─── Evidence Store ───────────────────────────────────────────────────────────
+class TestEvidenceStore:
+    def test_evidence_is_deduplicated_compressed_and_lazy(self):
+        from core.database import (WorkspaceRepo, TargetRepo, VulnRepo, EvidenceStore,
+                                   SearchRepo, Target, Vulnerability, LazyRecord, get_db)
+        ws_id = WorkspaceRepo.create("evidence_test_ws")
+        evidence = {"template_id": "exposed-panel",
+                    "request": "GET /admin HTTP/1.1",
+                    "response": "HTTP/1.1 200 OK\r\n\r\n" + "<html>zebrafish</html>" * 200}
+        before = EvidenceStore.stats()["blobs"]
+        ids = []
+        for host in ("ev1.example.com", "ev2.example.com"):
+            tid = TargetRepo.add(Target(host=host, workspace_id=ws_id))
+            ids.append(VulnRepo.add(Vulnerability(tid, "scan.nuclei", "Admin panel", "medium",
+                                                  evidence=dict(evidence))))
+
+        stats = EvidenceStore.stats()
+        assert stats["blobs"] == before + 1
+        with get_db() as db:
+            rows = db.execute("SELECT evidence, evidence_ref, template_id FROM vulnerabilities"
+                              " WHERE id IN (?,?)", ids).fetchall()
+            codec = db.execute("SELECT codec, size, length(data) FROM evidence_blobs"
+                               " WHERE hash=?", (rows[0]["evidence_ref"],)).fetchone()
+        assert {r["evidence_ref"] for r in rows} == {rows[0]["evidence_ref"]}
+        assert all(r["evidence"] == '{"template_id": "exposed-panel"}' for r in rows)
+        assert all(r["template_id"] == "exposed-panel" for r in rows)
+        assert codec[0] == "zlib" and codec[2] < codec[1] // 10
+
+        row = next(VulnRepo.iter_by_workspace(ws_id, decode="lazy"))
+        assert isinstance(row, LazyRecord) and isinstance(dict.get(row, "evidence"), str)
+        assert row["evidence"] == evidence
+        assert VulnRepo.evidence(ids[1]) == evidence
+        assert VulnRepo.list_by_workspace(ws_id)[0]["evidence"] == evidence
+        hits = SearchRepo.query(ws_id, "zebrafish", kinds=("vuln",))
+        assert sorted(h["id"] for h in hits) == sorted(ids)
+
+    def test_migration_moves_inline_evidence(self, tmp_path):
+        from core.database import get_connection, _m010_evidence_store
+        conn = get_connection(tmp_path / "evidence.db")
+        conn.execute("INSERT INTO workspaces(name) VALUES('w')")
+        conn.execute("INSERT INTO targets(workspace_id, host) VALUES(1, 'h')")
+        conn.execute("INSERT INTO vulnerabilities(target_id, workspace_id, plugin_id, name,"
+                     " severity, evidence, fingerprint) VALUES(1, 1, 'p', 'n', 'low', ?, 'fp')",
+                     ('{"template_id": "t", "response": "old inline body"}',))
+        _m010_evidence_store(conn)
+        conn.commit()
+        row = conn.execute("SELECT evidence, evidence_ref FROM vulnerabilities").fetchone()
+        assert row["evidence"] == '{"template_id": "t"}'
+        text = conn.execute("SELECT evidence_text(codec, data) FROM evidence_blobs WHERE hash=?",
+                            (row["evidence_ref"],)).fetchone()[0]
+        assert "old inline body" in text
+
+    def test_plain_sqlite_connection_can_write_vulns(self, tmp_path):
+        import sqlite3
+        from core.database import get_connection, EvidenceStore, SearchRepo
+        path = tmp_path / "plain.db"
+        conn = get_connection(path)
+        ref = EvidenceStore.put({"response": "walrus body"}, path)
+        plain = sqlite3.connect(str(path))        # no evidence_text() here
+        plain.execute("INSERT INTO workspaces(name) VALUES('w')")
+        plain.execute("INSERT INTO targets(workspace_id, host) VALUES(1, 'h')")
+        plain.execute("INSERT INTO vulnerabilities(target_id, workspace_id, plugin_id, name,"
+                      " severity, evidence, evidence_ref, fingerprint)"
+                      " VALUES(1, 1, 'p', 'Open walrus', 'low', '{}', ?, 'fp')", (ref,))
+        plain.execute("UPDATE vulnerabilities SET description='edited'")
+        plain.commit()
+        plain.close()
+
+        def match(word):
+            return conn.execute("SELECT rowid FROM fts_vulns WHERE fts_vulns MATCH ?",
+                                (word,)).fetchall()
+        assert len(match("walrus")) == 1 and not match("body")
+        SearchRepo.index_evidence_in(conn)
+        assert len(match("body")) == 1
+
+    def test_orphaned_blobs_are_pruned(self):
+        from core.database import (WorkspaceRepo, TargetRepo, VulnRepo, EvidenceStore,
+                                   Target, Vulnerability, get_db)
+        from core import maintenance
+        ws_id = WorkspaceRepo.create("evidence_gc_ws")
+        tid = TargetRepo.add(Target(host="gc.example.com", workspace_id=ws_id))
+        vid = VulnRepo.add(Vulnerability(tid, "scan.xray", "XSS", "high",
+                                         evidence={"detail": {"payload": "<svg/onload=gc>"}}))
+        ref = EvidenceStore.put({"detail": {"payload": "<svg/onload=gc>"}})
+        with get_db() as db:
+            db.execute("DELETE FROM vulnerabilities WHERE id=?", (vid,))
+        assert maintenance.prune_evidence(maintenance.RetentionPolicy(chunk=1)) >= 1
+        with get_db() as db:
+            assert db.execute("SELECT 1 FROM evidence_blobs WHERE hash=?", (ref,)).fetchone() is None
+
+
+# ─── Target Import ────────────────────────────────────────────────────────────
+class TestTargetImport:
+    def test_parse_targets(self):
+        from core.database import parse_targets
+        assert list(parse_targets("Example.COM.")) == [("example.com", None, "https")]
+        assert list(parse_targets("*.example.com:8080")) == [("example.com", 8080, "https")]
+        assert list(parse_targets("http://a.example.com:81/x?y=1")) == [("a.example.com", 81, "http")]
+        assert list(parse_targets("[::1]:443")) == [("::1", 443, "https")]
+        assert list(parse_targets("2001:db8::1")) == [("2001:db8::1", None, "https")]
+        assert [h for h, _, _ in parse_targets("10.0.0.0/30")] == ["10.0.0.1", "10.0.0.2"]
+        assert list(parse_targets("  # comment")) == []
+        assert list(parse_targets("Example.com/login")) == [("example.com", None, "https")]
+        assert list(parse_targets("example.com:8080/a/b")) == [("example.com", 8080, "https")]
+        for bad in ("10.0.0.0/8", "host:abc", "host:70000"):
+            with pytest.raises(ValueError):
+                list(parse_targets(bad))
+
+    def test_bulk_add_skips_bad_lines(self):
+        from core.database import WorkspaceRepo, TargetRepo
+        ws_id = WorkspaceRepo.create("import_bad_lines_ws")
+        errors = []
+        ids = TargetRepo.bulk_add(ws_id, ["a.example.com", "host:abc", "10.0.0.0/8",
+                                          "b.example.com/login"], chunk=1, errors=errors)
+        assert set(ids) == {("a.example.com", None), ("b.example.com", None)}
+        assert [(n, line) for n, line, _ in errors] == [(2, "host:abc"), (3, "10.0.0.0/8")]
+
+    def test_bulk_add_dedups_in_sql(self, tmp_path):
+        from core.database import WorkspaceRepo, TargetRepo, Target
+        ws_id = WorkspaceRepo.create("import_test_ws")
+        existing = TargetRepo.add(Target(host="old.example.com", workspace_id=ws_id))
+        assert TargetRepo.add(Target(host="old.example.com", workspace_id=ws_id)) == existing
+
+        scope = tmp_path / "scope.txt"
+        scope.write_text("# scope\nold.example.com\nNEW.example.com\nnew.example.com.\n"
+                         "new.example.com:8443\nhttps://new.example.com:8443/\n"
+                         "192.168.1.0/30\n", encoding="utf-8")
+        ids = TargetRepo.bulk_add(ws_id, scope, chunk=2)
+        assert set(ids) == {("old.example.com", None), ("new.example.com", None),
+                            ("new.example.com", 8443),
+                            ("192.168.1.1", None), ("192.168.1.2", None)}
+        assert ids[("old.example.com", None)] == existing
+        rows = TargetRepo.list_by_workspace(ws_id)
+        assert len(rows) == 5
+        assert TargetRepo.bulk_add(ws_id, ["new.example.com:8443"]) == \
+            {("new.example.com", 8443): ids[("new.example.com", 8443)]}
+        assert len(TargetRepo.list_by_workspace(ws_id)) == 5
+
+
 # ─── Module Imports ───────────────────────────────────────────────────────────
 class TestModuleImports:
     def test_recon_plugins_import(self):
@@ -187,6 +875,59 @@ class TestEngine:
         engine = Engine(max_workers=2)
         assert engine is not None
 
+    def test_failed_commit_is_reported_in_the_job(self, monkeypatch):
+        from core.engine import Engine
+        from core.writer import FindingWriter
+        from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory
+        from core.database import WorkspaceRepo, TargetRepo, JobRepo, Target, get_db
+
+        @register
+        class DoomedPlugin(SROFPlugin):
+            id       = "test.doomed"
+            name     = "Doomed"
+            category = PluginCategory.SCAN
+
+            def run(self, config: PluginConfig):
+                yield Finding(type="vuln", value="https://doomed.example.com/", title="XSS",
+                              severity="high", source=self.id)
+
+        class Broken(FindingWriter):
+            def _persist(self, batch):
+                raise RuntimeError("disk I/O error")
+
+        monkeypatch.setenv("SROF_SPOOL", "0")
+        ws_id = WorkspaceRepo.create("writer_failure_ws")
+        tid = TargetRepo.add(Target(host="doomed.example.com", workspace_id=ws_id))
+        job = Engine(max_workers=1, writer=Broken()).run(
+            ws_id, tid, ["test.doomed"], PluginConfig(target="doomed.example.com"))
+        row = JobRepo.get(job)
+        assert row["status"] == "error" and "1 findings failed to commit" in row["error_msg"]
+        with get_db() as db:
+            logged = db.execute("SELECT level, message FROM plugin_logs WHERE job_id=?"
+                                " AND plugin_id='core.writer'", (job,)).fetchall()
+        assert [tuple(r) for r in logged] == [("error", "1 findings failed to commit: disk I/O error")]
+
+    def test_failing_job_body_is_settled(self, monkeypatch):
+        from core.engine import Engine
+        from core.pipeline import Pipeline
+        from core.plugin import PluginConfig
+        from core.database import WorkspaceRepo, TargetRepo, JobRepo, Target
+
+        def boom(self, *args, **kw):
+            raise RuntimeError("pipeline exploded")
+        monkeypatch.setattr(Pipeline, "run", boom)
+        ws_id = WorkspaceRepo.create("engine_body_error_ws")
+        tid = TargetRepo.add(Target(host="boom.example.com", workspace_id=ws_id))
+        engine, events = Engine(max_workers=1), []
+        engine.on_event(lambda evt, data: events.append(evt))
+        job = engine.run_pipeline(ws_id, tid, [], PluginConfig(target="boom.example.com"))
+        row = JobRepo.get(job)
+        assert row["status"] == "error" and "pipeline exploded" in row["error_msg"]
+        assert "job_error" in events and "job_done" not in events
+        assert job not in engine._active_jobs
+        if engine._spool:
+            assert not engine._spool.path(job).exists()
+
     def test_get_engine_singleton(self):
         from core.engine import get_engine
         e1 = get_engine()
@@ -200,3 +941,875 @@ class TestEngine:
         engine.on_event(lambda evt, data: events.append(evt))
         # Just verify callback registration doesn't crash
         assert engine is not None
+
+
+# ─── Finding Writer ───────────────────────────────────────────────────────────
+class TestFindingWriter:
+    def test_writer_batches_and_links_vuln_to_asset(self):
+        from core.plugin import Finding
+        from core.writer import FindingWriter
+        from core.database import WorkspaceRepo, TargetRepo, Target, get_db
+        ws_id = WorkspaceRepo.create("writer_test_ws")
+        tid   = TargetRepo.add(Target(host="writer.example.com", workspace_id=ws_id))
+        writer = FindingWriter(batch_size=3, flush_interval=5)
+        a = writer.submit(Finding(type="asset", value="https://writer.example.com",
+                                  source="test"), tid, 0)
+        v = writer.submit(Finding(type="vuln", value="https://writer.example.com",
+                                  title="XSS", severity="high", source="test"), tid, 0)
+        i = writer.submit(Finding(type="info", value="note"), tid, 0)
+        assert writer.flush(timeout=5)
+        writer.close()
+        assert i.result() is None
+        with get_db() as db:
+            row = db.execute("SELECT asset_id FROM vulnerabilities WHERE id=?",
+                             (v.result(),)).fetchone()
+        assert row["asset_id"] == a.result()
+
+    def test_engine_persists_through_writer(self):
+        from core.engine import Engine
+        from core.plugin import PluginConfig
+        from core.database import WorkspaceRepo, TargetRepo, AssetRepo, Target
+        ws_id = WorkspaceRepo.create("engine_writer_ws")
+        tid   = TargetRepo.add(Target(host="engine.example.com", workspace_id=ws_id))
+        engine = Engine(max_workers=1)
+        engine.run(ws_id, tid, ["test.dummy"], PluginConfig(target="engine.example.com"))
+        assert [a["value"] for a in AssetRepo.list_by_target(tid)] == ["test_value"]
+
+
+# ─── Findings Spool ───────────────────────────────────────────────────────────
+class TestFindingSpool:
+    def _job(self, host):
+        from core.database import WorkspaceRepo, TargetRepo, JobRepo, Target
+        ws_id = WorkspaceRepo.create("spool_test_ws")
+        tid = TargetRepo.add(Target(host=host, workspace_id=ws_id))
+        job = JobRepo.create(ws_id, "scan")
+        JobRepo.start(job)
+        return tid, job
+
+    def test_recover_replays_interrupted_job_once(self, tmp_path):
+        import json, subprocess, sys
+        from core.plugin import Finding
+        from core.spool import FindingSpool
+        from core.database import JobRepo, AssetRepo
+        tid, job = self._job("spool.example.com")
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        spool = FindingSpool(tmp_path)
+        with open(spool.path(job), "w", encoding="utf-8") as f:
+            f.write(json.dumps({"job_id": job, "pid": dead.pid}) + "\n")
+            for seq, value in enumerate(("a.spool.example.com", "b.spool.example.com"), 1):
+                finding = Finding(type="asset", value=value, source="recon.subfinder")
+                f.write(json.dumps({"seq": seq, "target_id": tid,
+                                    "finding": finding.to_dict()}) + "\n")
+            f.write('{"seq": 3, "target_id": ')          # torn by the crash
+
+        assert spool.recover() == {job: 2}
+        assert sorted(a["value"] for a in AssetRepo.list_by_target(tid)) == \
+            ["a.spool.example.com", "b.spool.example.com"]
+        row = JobRepo.get(job)
+        assert row["status"] == "error" and row["spool_seq"] == 2
+        assert not spool.path(job).exists()
+        assert spool.recover() == {}
+
+    def test_windows_owner_probe_never_signals(self, monkeypatch):
+        from core import spool
+
+        def kill(pid, sig):
+            raise AssertionError("os.kill terminates processes on Windows")
+        monkeypatch.setattr(spool.os, "kill", kill)
+        monkeypatch.setattr(spool, "_win_pid_alive", lambda pid: pid == 4242)
+        monkeypatch.setattr(spool.os, "name", "nt")
+        assert spool._pid_alive(4242) and not spool._pid_alive(4343)
+
+    def test_full_writer_queue_throttles_but_keeps_committing(self, tmp_path):
+        from core.plugin import Finding
+        from core.spool import FindingSpool
+        from core.writer import FindingWriter
+        from core.database import JobRepo, VulnRepo
+
+        tid, job = self._job("shed.example.com")
+        spool, writer = FindingSpool(tmp_path), FindingWriter(batch_size=2, max_queue=1)
+        spool.open_job(job)
+        futs = [spool.append(job, tid, Finding(type="vuln", value=f"https://shed.example.com/{i}",
+                                               title="Open redirect", severity="low",
+                                               source="scan.nuclei"), writer)
+                for i in range(5)]
+        assert all(f.result(timeout=5) for f in futs)
+        assert JobRepo.get(job)["spool_seq"] == 5
+        assert spool.drain(job, writer) == 0
+        assert spool.close_job(job) is True
+        writer.close()
+        assert VulnRepo.job_summary(job)["new"] == 5
+
+    def test_unsettled_spool_is_kept_and_replayed_once(self, tmp_path):
+        from core.plugin import Finding
+        from core.spool import FindingSpool
+        from core.writer import FindingWriter
+        from core.database import JobRepo, get_db
+
+        class Lossy(FindingWriter):                 # loses the job's first line
+            def submit(self, finding, target_id, job_id, seq=None, block=True):
+                return None if seq == 1 else super().submit(finding, target_id, job_id, seq)
+
+        tid, job = self._job("gap.example.com")
+        spool, writer = FindingSpool(tmp_path), Lossy()
+        spool.open_job(job)
+        for i in range(3):
+            spool.append(job, tid, Finding(type="vuln", value=f"https://gap.example.com/{i}",
+                                           title="XSS", severity="medium", source="scan.xray"),
+                         writer)
+        writer.close()                              # lines 2 and 3 committed, 1 lost
+        assert JobRepo.get(job)["spool_seq"] == 0
+        assert spool.close_job(job) is False
+        assert spool.path(job).exists()
+
+        writer = FindingWriter()                    # a fresh process knows nothing
+        assert spool.drain(job, writer) == 1
+        assert JobRepo.get(job)["spool_seq"] == 3
+        assert spool.close_job(job) is True
+        writer.close()
+        with get_db() as db:
+            rows = db.execute("SELECT occurrences FROM vulnerabilities WHERE target_id=?",
+                              (tid,)).fetchall()
+        assert [r[0] for r in rows] == [1, 1, 1]
+
+
+# ─── Sharding ─────────────────────────────────────────────────────────────────
+class TestSharding:
+    @pytest.fixture
+    def sharded(self, tmp_path, monkeypatch):
+        from core import database
+        monkeypatch.setattr(database, "DB_PATH", tmp_path / "catalog.db")
+        database.enable_sharding(tmp_path / "workspaces")
+        yield tmp_path / "workspaces"
+        database.disable_sharding()
+
+    def test_populated_database_is_not_sharded(self, tmp_path):
+        from core.database import (WorkspaceRepo, TargetRepo, Target, enable_sharding,
+                                   workspace_path, _shards)
+        ws_id = WorkspaceRepo.create("shard_populated_ws")
+        TargetRepo.add(Target(host="populated.shard.example.com", workspace_id=ws_id))
+        with pytest.raises(RuntimeError, match="targets"):
+            enable_sharding(tmp_path / "workspaces")
+        assert not _shards.enabled and workspace_path(ws_id) is None
+        assert not (tmp_path / "workspaces").exists()
+        assert [t["host"] for t in TargetRepo.list_by_workspace(ws_id)] == \
+            ["populated.shard.example.com"]
+
+    def test_repositories_route_by_workspace(self, sharded):
+        from core.plugin import Finding
+        from core.writer import FindingWriter
+        from core.database import (WorkspaceRepo, TargetRepo, VulnRepo, AssetRepo, JobRepo,
+                                   Target, SHARD_ID_SHIFT, get_db)
+        ws_a = WorkspaceRepo.create("shard_a_ws")
+        ws_b = WorkspaceRepo.create("shard_b_ws")
+        ta = TargetRepo.add(Target(host="a.shard.example.com", workspace_id=ws_a))
+        tb = TargetRepo.add(Target(host="b.shard.example.com", workspace_id=ws_b))
+        assert (ta >> SHARD_ID_SHIFT, tb >> SHARD_ID_SHIFT) == (ws_a, ws_b)
+        assert {p.name for p in sharded.iterdir() if p.suffix == ".db"} == \
+            {f"ws-{ws_a}.db", f"ws-{ws_b}.db"}
+        with get_db() as db:
+            assert db.execute("SELECT COUNT(*) FROM targets WHERE id IN (?,?)",
+                              (ta, tb)).fetchone()[0] == 0
+
+        job = JobRepo.create(ws_a, "scan")
+        JobRepo.start(job)
+        writer = FindingWriter()
+        futs = [writer.submit(Finding(type="vuln", value=f"https://{h}/", title="Shard XSS",
+                                      severity="high", source="scan.xray"), t, job)
+                for h, t in (("a.shard.example.com", ta), ("b.shard.example.com", tb))]
+        writer.flush()
+        writer.close()
+        assert [f.result() >> SHARD_ID_SHIFT for f in futs] == [ws_a, ws_b]
+        assert [v["host"] for v in VulnRepo.list_by_workspace(ws_b)] == ["b.shard.example.com"]
+        assert JobRepo.get(job)["status"] == "running"
+        assert VulnRepo.job_summary(job)["new"] == 1
+        assert AssetRepo.list_by_target(tb) == []
+
+    def test_cross_workspace_reads_attach_shards(self, sharded):
+        from core.database import (WorkspaceRepo, TargetRepo, VulnRepo, SearchRepo, StatsRepo,
+                                   Target, Vulnerability, _attached)
+        wss = [WorkspaceRepo.create(f"shard_global_{i}_ws") for i in range(10)]
+        for ws_id in wss:
+            tid = TargetRepo.add(Target(host=f"{ws_id}.global.example.com", workspace_id=ws_id))
+            VulnRepo.add(Vulnerability(tid, "scan.nuclei", "Quokka takeover", "critical"))
+
+        hits = SearchRepo.query_all("quokka", kinds=("vuln",))
+        assert sorted(h["workspace_id"] for h in hits) == sorted(wss)
+        assert len(SearchRepo.query(wss[3], "quokka")) == 1
+        assert StatsRepo.totals("severity")["critical"] >= 10
+        assert StatsRepo.get(wss[0], "severity") == {"critical": 1}
+        groups = [list(schemas) for _, schemas in _attached(per=4)]
+        assert groups[0][0] == "main" and sum(map(len, groups)) == len(wss) + 1
+
+
+
+# ─── Workspace Snapshots ──────────────────────────────────────────────────────
+class TestSnapshot:
+    def test_export_import_round_trip(self, tmp_path):
+        import time
+        from core.database import (WorkspaceRepo, TargetRepo, AssetRepo, VulnRepo, JobRepo,
+                                   StatsRepo, SearchRepo, Target, Asset, Vulnerability)
+        from core.snapshot import export_workspace, import_workspace
+        ws_id = WorkspaceRepo.create("snapshot_src_ws", "acme engagement")
+        job = JobRepo.create(ws_id, "scan")
+        evidence = {"template_id": "git-config", "response": "[core] narwhal " * 50}
+        for i in range(7):
+            tid = TargetRepo.add(Target(host=f"h{i}.snap.example.com", workspace_id=ws_id))
+            aid = AssetRepo.add(Asset(tid, "url", f"https://h{i}.snap.example.com/.git/config",
+                                      "httpx", {"status_code": 200}, job_id=job))
+            VulnRepo.add(Vulnerability(tid, "scan.nuclei", "Git config", "high",
+                                       evidence=dict(evidence), asset_id=aid, job_id=job,
+                                       location=f"https://h{i}.snap.example.com/.git/config"))
+        JobRepo.bulk_log([(job, "scan.nuclei", "info", f"line {i}", None, time.time())
+                          for i in range(11)])
+        JobRepo.finish(job, 7)
+
+        path = tmp_path / "acme.srofsnap"
+        counts = export_workspace(ws_id, path, chunk=3)
+        assert counts["evidence"] == 1 and counts["vulnerabilities"] == 7
+        assert counts["plugin_logs"] == 11 and path.stat().st_size == counts["bytes"]
+        with pytest.raises(ValueError):
+            import_workspace(path)                      # name already taken
+
+        new_ws = import_workspace(path, name="snapshot_copy_ws")
+        assert WorkspaceRepo.get(new_ws)["description"] == "acme engagement"
+        vulns = VulnRepo.list_by_workspace(new_ws)
+        assert len(vulns) == 7 and all(v["evidence"] == evidence for v in vulns)
+        new_job = vulns[0]["job_id"]
+        assert new_job != job and JobRepo.get(new_job)["status"] == "done"
+        for v in vulns:
+            assets = AssetRepo.list_by_target(v["target_id"])
+            assert [a["id"] for a in assets] == [v["asset_id"]]
+            assert assets[0]["job_id"] == new_job
+        assert StatsRepo.get(new_ws) == StatsRepo.get(ws_id)
+        assert len(SearchRepo.query(new_ws, "narwhal", kinds=("vuln",))) == 7
+        assert VulnRepo.job_summary(new_job)["new"] == 7
+
+    def test_truncated_snapshot_leaves_nothing(self, tmp_path):
+        from core.database import WorkspaceRepo, TargetRepo, Target
+        from core.snapshot import export_workspace, import_workspace
+        ws_id = WorkspaceRepo.create("snapshot_trunc_ws")
+        for i in range(20):
+            TargetRepo.add(Target(host=f"t{i}.trunc.example.com", workspace_id=ws_id))
+        path = tmp_path / "trunc.srofsnap"
+        export_workspace(ws_id, path, chunk=5)
+        path.write_bytes(path.read_bytes()[:-40])
+        before = len(WorkspaceRepo.list_all())
+        with pytest.raises(ValueError):
+            import_workspace(path, name="snapshot_trunc_copy_ws")
+        assert len(WorkspaceRepo.list_all()) == before
+
+
+# ─── Offline Import ───────────────────────────────────────────────────────────
+NMAP_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<nmaprun scanner="nmap" args="nmap -sV -oX out.xml 10.0.0.0/30">
+<host><status state="up"/><address addr="10.0.0.1" addrtype="ipv4"/>
+<hostnames><hostname name="gw.import.example.com" type="PTR"/></hostnames>
+<ports>
+<port protocol="tcp" portid="22"><state state="open"/><service name="ssh" product="OpenSSH" version="9.6"/></port>
+<port protocol="tcp" portid="23"><state state="closed"/></port>
+</ports></host>
+<host><status state="up"/><address addr="10.0.0.2" addrtype="ipv4"/><hostnames/>
+<ports><port protocol="tcp" portid="443"><state state="open"/><service name="https"/></port></ports>
+</host>
+<runstats><finished time="1"/></runstats>
+</nmaprun>
+"""
+
+
+class TestOfflineImport:
+    def test_iter_json_array_streams_small_chunks(self):
+        import io, json
+        from core.plugin import iter_json_array
+        doc = {"commandline": "ffuf -u https://x/FUZZ -o results.json", "time": "t",
+               "results": [{"url": f"https://x/{i}", "status": 200, "length": 10 ** i}
+                           for i in range(12)],
+               "config": {"matchers": {"status": "200"}}}
+        items = list(iter_json_array(io.StringIO(json.dumps(doc, indent=1)), "results", chunk=7))
+        assert items == doc["results"]
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO('{"results": [{"url": "a"}, {"url"'), "results"))
+
+    def test_nmap_parse_streams_hosts(self):
+        import io
+        import modules.recon.plugins
+        from core.plugin import PluginRegistry
+        nmap = PluginRegistry.get("recon.nmap")()
+        found = [(f.value, f.metadata["service"]) for f in nmap.parse(io.StringIO(NMAP_XML))]
+        assert found == [("gw.import.example.com:22", "ssh"), ("10.0.0.2:443", "https")]
+        assert [f.value for f in nmap.parse(io.StringIO(NMAP_XML), "t.example.com")] == \
+            ["t.example.com:22", "t.example.com:443"]
+
+    def test_import_directory(self, tmp_path):
+        import json
+        from core.database import WorkspaceRepo, TargetRepo, AssetRepo, VulnRepo, JobRepo
+        from core.importer import detect, import_path
+        (tmp_path / "nmap.xml").write_text(NMAP_XML, encoding="utf-8")
+        (tmp_path / "nuclei.jsonl").write_text("\n".join(json.dumps(
+            {"template-id": "tomcat-default-login", "matched-at": f"https://app{i}.import.example.com/manager",
+             "info": {"name": "Tomcat default login", "severity": "high"}}) for i in range(3))
+            + "\nnot json\n", encoding="utf-8")
+        (tmp_path / "ffuf.json").write_text(json.dumps(
+            {"commandline": "ffuf", "results": [
+                {"url": "https://app0.import.example.com/admin", "status": 403, "length": 1}]}),
+            encoding="utf-8")
+        (tmp_path / "subs.txt").write_text("app0.import.example.com\napp9.import.example.com\n",
+                                           encoding="utf-8")
+        (tmp_path / "notes.md").write_text("# scope notes\n", encoding="utf-8")
+        assert [detect(tmp_path / n) for n in ("nmap.xml", "nuclei.jsonl", "ffuf.json",
+                                                "subs.txt", "notes.md")] == \
+            ["nmap", "nuclei", "ffuf", "subfinder", None]
+
+        ws_id = WorkspaceRepo.create("offline_import_ws")
+        reports = import_path(tmp_path, ws_id)
+        assert {Path(r.path).name: r.findings for r in reports} == \
+            {"ffuf.json": 1, "nmap.xml": 2, "nuclei.jsonl": 3, "subs.txt": 2}
+        assert all(r.error == "" and r.rate > 0 for r in reports)
+
+        hosts = {t["host"]: t["id"] for t in TargetRepo.list_by_workspace(ws_id)}
+        assert set(hosts) == {"gw.import.example.com", "10.0.0.2", "app0.import.example.com",
+                              "app1.import.example.com", "app2.import.example.com",
+                              "app9.import.example.com"}
+        assert {a["value"] for a in AssetRepo.list_by_target(hosts["app0.import.example.com"])} == \
+            {"https://app0.import.example.com/admin", "app0.import.example.com"}
+        vulns = VulnRepo.list_by_workspace(ws_id)
+        assert len(vulns) == 3 and vulns[0]["evidence"]["template_id"] == "tomcat-default-login"
+        job = JobRepo.get(vulns[0]["job_id"])
+        assert (job["type"], job["status"], job["result_count"]) == ("import", "done", 8)
+
+
+# ─── Inventory ────────────────────────────────────────────────────────────────
+class TestInventory:
+    def test_inventory_facts(self):
+        from core.database import inventory_facts
+        assert inventory_facts("service", "10.1.2.3:443", {"port": 443, "service": "https"}) == \
+            {"host": "10.1.2.3", "ip": "10.1.2.3", "port": 443, "protocol": "tcp",
+             "service": "https"}
+        assert inventory_facts("dns", "a.example.com → 10.0.0.9",
+                               {"host": "A.example.com", "ip": "10.0.0.9"}) == \
+            {"host": "a.example.com", "ip": "10.0.0.9"}
+        assert inventory_facts("url", "http://a.example.com:8080/x", {"status_code": 200}) == \
+            {"host": "a.example.com", "port": 8080, "protocol": "tcp", "service": "http",
+             "url": "http://a.example.com:8080/x", "status_code": 200}
+        assert inventory_facts("url", "192.168.5.5:445 open")["port"] == 445
+        assert inventory_facts("url", "[+] weak password admin/admin") == {}
+
+    def test_writer_populates_inventory(self):
+        from core.plugin import Finding
+        from core.writer import FindingWriter
+        from core.database import WorkspaceRepo, TargetRepo, InventoryRepo, Target
+        ws_id = WorkspaceRepo.create("inventory_test_ws")
+        tid = TargetRepo.add(Target(host="inv.example.com", workspace_id=ws_id))
+        findings = [
+            Finding(type="asset", value="app.inv.example.com → 10.20.0.5", source="recon.dns_resolve",
+                    metadata={"asset_type": "dns", "host": "app.inv.example.com", "ip": "10.20.0.5"}),
+            Finding(type="asset", value="mail.inv.example.com → 192.0.2.7", source="recon.dns_resolve",
+                    metadata={"asset_type": "dns", "host": "mail.inv.example.com", "ip": "192.0.2.7"}),
+            Finding(type="asset", value="app.inv.example.com:8443", source="recon.nmap",
+                    metadata={"asset_type": "service", "port": 8443, "service": "https-alt",
+                              "product": "nginx"}),
+            Finding(type="asset", value="https://app.inv.example.com:8443/login", source="recon.httpx",
+                    metadata={"asset_type": "url", "status_code": 200}),
+            Finding(type="asset", value="https://mail.inv.example.com/", source="recon.httpx",
+                    metadata={"asset_type": "url", "status_code": 302}),
+            Finding(type="asset", value="app.inv.example.com:22", source="recon.nmap",
+                    metadata={"asset_type": "service", "port": 22, "service": "ssh"}),
+        ]
+        writer = FindingWriter()
+        for f in findings:
+            writer.submit(f, tid, 0)
+        writer.close()
+
+        web = InventoryRepo.services(ws_id, names=("https", "https-alt"), cidr="10.0.0.0/8")
+        assert [(s["host"], s["port"], s["service"], s["product"]) for s in web] == \
+            [("app.inv.example.com", 8443, "https-alt", "nginx")]
+        assert [s["host"] for s in InventoryRepo.services(ws_id, names=("https",))] == \
+            ["mail.inv.example.com"]
+        assert [h["name"] for h in InventoryRepo.hosts(ws_id, "10.20.0.0/16")] == \
+            ["app.inv.example.com"]
+        assert [u["url"] for u in InventoryRepo.urls(ws_id, status_code=302)] == \
+            ["https://mail.inv.example.com/"]
+
+        before = InventoryRepo.services(ws_id)
+        InventoryRepo.rebuild(ws_id)
+        assert [(s["host"], s["port"], s["service"]) for s in InventoryRepo.services(ws_id)] == \
+            [(s["host"], s["port"], s["service"]) for s in before]
+
+    def test_cidr_service_query_is_indexed(self):
+        from core.database import cidr_range
+        lo, hi = cidr_range("10.0.0.0/8")
+        plan = _plan("SELECT s.id FROM services s WHERE s.workspace_id=? AND s.name IN ('http','https')"
+                     " AND s.host_id IN (SELECT hi.host_id FROM ips i JOIN host_ips hi"
+                     " ON hi.ip_id = i.id WHERE i.workspace_id=? AND i.ip_key BETWEEN ? AND ?)",
+                     [1, 1, lo, hi])
+        _assert_indexed(plan)
+
+
+# ─── Tool Runner ──────────────────────────────────────────────────────────────
+def _py(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+class TestToolRunner:
+    def test_stdout_streams_before_exit(self):
+        import time
+        from core.runner import ToolProcess
+        code = "import time\nprint('first', flush=True)\ntime.sleep(3)\nprint('second')"
+        start = time.monotonic()
+        with ToolProcess(_py(code), timeout=30) as proc:
+            assert proc.stdout.readline() == "first\n"
+            assert time.monotonic() - start < 2.5
+            assert proc.stdout.readline() == "second\n"
+        assert proc.returncode == 0 and not proc.timed_out
+
+    def test_timeout_kills_and_keeps_partial_output(self):
+        from core.runner import run_tool, RC_TIMEOUT
+        code = "import time\nprint('partial', flush=True)\ntime.sleep(30)"
+        rc, out, err = run_tool(_py(code), timeout=0.5)
+        assert (rc, out, err) == (RC_TIMEOUT, "partial\n", "timeout")
+
+    def test_stderr_ring_buffer_is_bounded(self):
+        from core.runner import run_tool
+        code = "import sys\nfor i in range(5000): print('line', i, file=sys.stderr)\nsys.exit(3)"
+        rc, out, err = run_tool(_py(code), stderr_lines=10)
+        assert rc == 3 and out == ""
+        assert err.splitlines() == [f"line {i}" for i in range(4990, 5000)]
+
+    def test_registered_with_job_while_running(self):
+        from core.runner import ToolProcess, running
+        with ToolProcess(_py("import time; time.sleep(0.5)"), job_id=4242) as proc:
+            assert running(4242) == [proc]
+        assert running(4242) == []
+
+    def test_leaving_early_kills_tool(self):
+        from core.runner import ToolProcess
+        code = "import time\nwhile True:\n    print('x', flush=True)\n    time.sleep(0.01)"
+
+        def gen():
+            with ToolProcess(_py(code), timeout=30) as proc:
+                yield proc
+                for line in proc.stdout:
+                    yield line
+
+        g = gen()
+        proc = next(g)
+        assert next(g) == "x\n"
+        g.close()
+        assert proc.returncode is not None and proc.returncode != 0
+
+    def test_missing_tool(self):
+        from core.runner import run_tool, RC_NOT_FOUND
+        rc, out, err = run_tool(["srof-no-such-tool"])
+        assert rc == RC_NOT_FOUND and "srof-no-such-tool" in err
+
+
+# ─── Cancellation ─────────────────────────────────────────────────────────────
+def _pid_gone(pid: int, wait: float = 5.0) -> bool:
+    import time
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+# Prints the pid of a grandchild that ignores SIGTERM, then sleeps.
+_TREE = ("import subprocess, sys, time\n"
+         "g = subprocess.Popen([sys.executable, '-c', 'import signal, time\\n"
+         "signal.signal(signal.SIGTERM, signal.SIG_IGN)\\ntime.sleep(60)'])\n"
+         "print(g.pid, flush=True)\ntime.sleep(60)")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="process groups")
+class TestCancellation:
+    def test_cancel_job_kills_tree(self):
+        import time
+        from core.runner import ToolProcess, Cancelled, cancel_job, release_job, running
+        with pytest.raises(Cancelled):
+            with ToolProcess(_py(_TREE), timeout=60, job_id=5151) as proc:
+                grandchild = int(proc.stdout.readline())
+                start = time.monotonic()
+                assert cancel_job(5151, grace=0.5) == 1
+                assert proc.stdout.read() == ""
+        assert time.monotonic() - start < 5
+        assert _pid_gone(proc.pid) and _pid_gone(grandchild)
+        assert running(5151) == []
+        with pytest.raises(Cancelled):
+            ToolProcess(_py("pass"), job_id=5151).start()
+        release_job(5151)
+        with ToolProcess(_py("pass"), job_id=5151) as proc:
+            pass
+        assert proc.returncode == 0
+
+    @pytest.mark.parametrize("waitid", [True, False])
+    def test_close_sweeps_group_after_leader_exits(self, waitid, monkeypatch):
+        import time
+        from core.runner import ToolProcess, Cancelled, cancel_job, release_job
+        if not waitid:
+            monkeypatch.delattr(os, "waitid", raising=False)     # as on macOS
+        code = ("import subprocess, sys, time\n"          # grandchild off our stdout
+                "g = subprocess.Popen([sys.executable, '-c', 'import signal, time\\n"
+                "signal.signal(signal.SIGTERM, signal.SIG_IGN)\\nprint(flush=True)\\n"
+                "time.sleep(60)'], stdout=subprocess.PIPE)\n"
+                "g.stdout.readline()\nprint(g.pid, flush=True)\ntime.sleep(60)")
+        with pytest.raises(Cancelled):
+            with ToolProcess(_py(code), timeout=60, job_id=5252) as proc:
+                grandchild = int(proc.stdout.readline())
+                start = time.monotonic()
+                cancel_job(5252, grace=60)          # only the sweep can kill it in time
+                assert proc.stdout.read() == ""
+        release_job(5252)
+        assert _pid_gone(grandchild) and time.monotonic() - start < 15
+
+    def test_engine_cancel(self):
+        import time
+        from core.engine import Engine
+        from core.plugin import SROFPlugin, PluginConfig, Finding, register, PluginCategory
+        from core.runner import ToolProcess, temp_output, running
+        from core.database import WorkspaceRepo, TargetRepo, Target, JobRepo
+
+        paths = []
+
+        @register
+        class SlowToolPlugin(SROFPlugin):
+            id = "test.slow_tool"
+            name = "Slow Tool"
+            category = PluginCategory.UTIL
+
+            def run(self, config: PluginConfig):
+                with temp_output(".json") as out_file:
+                    paths.append(out_file)
+                    with ToolProcess(_py(_TREE), timeout=600, job_id=config.job_id) as proc:
+                        for line in proc.stdout:
+                            yield Finding(type="info", value=line.strip(), source=self.id)
+
+        ws_id = WorkspaceRepo.create("cancel_ws")
+        tid = TargetRepo.add(Target(host="cancel.example.com", workspace_id=ws_id))
+        engine = Engine(max_workers=1)
+        done = []
+        engine.on_event(lambda evt, data: done.append(data) if evt == "job_done" else None)
+        job_id = engine.run(ws_id, tid, ["test.slow_tool", "test.slow_tool"],
+                            PluginConfig(target="cancel.example.com"), blocking=False)
+        deadline = time.monotonic() + 10
+        while not running(job_id) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert running(job_id)
+
+        start = time.monotonic()
+        engine.cancel(job_id, grace=0.5)
+        while not done and time.monotonic() - start < 10:
+            time.sleep(0.05)
+        assert done and done[0]["cancelled"]
+        assert time.monotonic() - start < 5
+        assert JobRepo.get(job_id)["status"] == "cancelled"
+        assert len(paths) == 1 and not os.path.exists(paths[0])
+        assert running(job_id) == []
+        from core import runner
+        assert job_id not in runner._cancelled
+
+    def test_cancelled_status_sticks(self):
+        from core.database import WorkspaceRepo, JobRepo
+        job_id = JobRepo.create(WorkspaceRepo.create("cancel_status_ws"), "mixed")
+        JobRepo.cancel(job_id)
+        JobRepo.start(job_id)          # a worker that lost the race
+        JobRepo.finish(job_id, 3)
+        assert JobRepo.get(job_id)["status"] == "cancelled"
+
+
+# ─── Pipeline ─────────────────────────────────────────────────────────────────
+class TestPipeline:
+    @staticmethod
+    def _register():
+        import time
+        from core.plugin import SROFPlugin, Finding, register, PluginCategory
+        log = {"mid": [], "sink": [], "src_done": None}
+
+        @register
+        class PipeSource(SROFPlugin):
+            id = "test.pipe_src"
+            category = PluginCategory.UTIL
+            consumes = ["domain"]
+            produces = ["subdomain"]
+
+            def run(self, config):
+                for i in range(6):
+                    yield Finding(type="asset", value=f"h{i}.{config.target}", source=self.id,
+                                  metadata={"asset_type": "subdomain"})
+                    time.sleep(0.1)
+                log["src_done"] = time.monotonic()
+
+        @register
+        class PipeMiddle(SROFPlugin):
+            id = "test.pipe_mid"
+            category = PluginCategory.UTIL
+            consumes = ["subdomain"]
+            produces = ["url"]
+            batch = 2
+
+            def run(self, config):
+                log["mid"].append((time.monotonic(), list(config.inputs)))
+                for host in config.inputs:
+                    yield Finding(type="asset", value=f"https://{host}/", source=self.id,
+                                  metadata={"asset_type": "url"})
+
+        @register
+        class PipeSink(SROFPlugin):
+            id = "test.pipe_sink"
+            category = PluginCategory.UTIL
+            consumes = ["url"]
+            produces = ["vuln"]
+            requires = ["test.pipe_src"]
+
+            def run(self, config):
+                log["sink"].append((time.monotonic(), config.target))
+                yield Finding(type="vuln", value=config.target, title="x", source=self.id)
+
+        return log
+
+    def test_plan(self):
+        from core.pipeline import Pipeline
+        self._register()
+        # requires pulls in the source; edges follow the declared kinds
+        plan = Pipeline(["test.pipe_sink", "test.pipe_mid"]).plan()
+        assert [s["plugin"] for s in plan] == ["test.pipe_src", "test.pipe_mid", "test.pipe_sink"]
+        assert plan[1]["from"] == ["test.pipe_src"]
+        assert plan[2]["from"] == ["test.pipe_mid"] and plan[2]["after"] == ["test.pipe_src"]
+
+    def test_cycle_rejected(self):
+        from core.pipeline import Pipeline
+        from core.plugin import SROFPlugin, register, PluginCategory
+        for pid, kinds in (("test.cyc_a", ("x", "y")), ("test.cyc_b", ("y", "x"))):
+            register(type(pid, (SROFPlugin,), {
+                "id": pid, "category": PluginCategory.UTIL,
+                "consumes": [kinds[0]], "produces": [kinds[1]],
+                "run": lambda self, config: iter(())}))
+        with pytest.raises(ValueError, match="cycle"):
+            Pipeline(["test.cyc_a", "test.cyc_b"])
+
+    def test_finding_inputs(self):
+        from core.pipeline import finding_inputs
+        from core.plugin import Finding
+        dns = Finding(type="asset", value="a.example.com → 10.0.0.1",
+                      metadata={"asset_type": "dns", "host": "a.example.com", "ip": "10.0.0.1"})
+        assert finding_inputs(dns) == {"host": "a.example.com", "ip": "10.0.0.1"}
+        assert finding_inputs(Finding(type="vuln", value="https://x/")) == {"vuln": "https://x/"}
+
+    def test_stages_overlap(self):
+        from core.engine import Engine
+        from core.plugin import PluginConfig
+        from core.database import WorkspaceRepo, TargetRepo, Target, JobRepo, VulnRepo
+        log = self._register()
+        ws_id = WorkspaceRepo.create("pipeline_ws")
+        tid = TargetRepo.add(Target(host="pipe.example.com", workspace_id=ws_id))
+        engine = Engine(max_workers=4)
+        job_id = engine.run_pipeline(ws_id, tid, ["test.pipe_src", "test.pipe_mid", "test.pipe_sink"],
+                                     PluginConfig(target="pipe.example.com"), batch_wait=0.05)
+
+        job = JobRepo.get(job_id)
+        assert job["type"] == "pipeline" and job["status"] == "done"
+        assert job["result_count"] == 18
+        assert all(1 <= len(b) <= 2 for _, b in log["mid"])
+        assert sorted(h for _, b in log["mid"] for h in b) == [f"h{i}.pipe.example.com" for i in range(6)]
+        # the middle stage starts while the source is still streaming
+        assert min(t for t, _ in log["mid"]) < log["src_done"]
+        # sink waits for the source it requires, yet runs once per URL
+        assert sorted(t for _, t in log["sink"]) == \
+            sorted(f"https://h{i}.pipe.example.com/" for i in range(6))
+        assert VulnRepo.job_summary(job_id)
+
+
+# ─── Multi-Target Jobs ────────────────────────────────────────────────────────
+class TestMultiTarget:
+    @staticmethod
+    def _register(delay=0.05):
+        import time, threading
+        from core.plugin import SROFPlugin, Finding, register, PluginCategory
+        state = {"active": 0, "peak": 0, "lock": threading.Lock()}
+
+        @register
+        class FanOutPlugin(SROFPlugin):
+            id = "test.fan_out"
+            category = PluginCategory.UTIL
+
+            def run(self, config):
+                with state["lock"]:
+                    state["active"] += 1
+                    state["peak"] = max(state["peak"], state["active"])
+                try:
+                    time.sleep(delay)
+                    yield Finding(type="asset", value=f"https://{config.target}/", source=self.id,
+                                  metadata={"asset_type": "url", "port": config.get("port")})
+                finally:
+                    with state["lock"]:
+                        state["active"] -= 1
+
+        return state
+
+    def test_fan_out(self, tmp_path):
+        from core.engine import Engine
+        from core.plugin import PluginConfig
+        from core.database import WorkspaceRepo, JobRepo, get_db, workspace_path
+        state = self._register()
+        ws_id = WorkspaceRepo.create("multi_ws")
+        scope = tmp_path / "scope.txt"
+        scope.write_text("\n".join(f"h{i}.multi.example.com" for i in range(20)) +
+                         "\nweb.multi.example.com:8443\n")
+        events = []
+        engine = Engine(max_workers=8)
+        engine.on_event(lambda evt, data: events.append(data) if evt == "target_done" else None)
+        job_id = engine.run_targets(ws_id, scope, ["test.fan_out"], PluginConfig(target=""),
+                                    concurrency=3)
+
+        job = JobRepo.get(job_id)
+        assert job["type"] == "multi" and job["status"] == "done" and job["result_count"] == 21
+        assert 1 < state["peak"] <= 3
+        assert JobRepo.progress(job_id) == {"total": 21, "findings": 21, "done": 21}
+        assert sorted(e["done"] for e in events) == list(range(1, 22))
+        with get_db(workspace_path(ws_id)) as db:
+            rows = db.execute("SELECT t.host, a.value, t.status, a.metadata FROM assets a"
+                              " JOIN targets t ON t.id = a.target_id"
+                              " WHERE t.workspace_id=?", (ws_id,)).fetchall()
+        assert len(rows) == 21
+        assert all(r["value"] == f"https://{r['host']}/" and r["status"] == "done" for r in rows)
+        assert any('"port": 8443' in r["metadata"] for r in rows)
+
+    def test_select_ids(self):
+        from core.database import WorkspaceRepo, TargetRepo, Target
+        ws_id = WorkspaceRepo.create("select_ws")
+        a = TargetRepo.add(Target(host="a.sel.example.com", workspace_id=ws_id, tags=["prod"]))
+        b = TargetRepo.add(Target(host="b.sel.example.com", workspace_id=ws_id))
+        c = TargetRepo.add(Target(host="c.other.example.org", workspace_id=ws_id, tags=["prod"]))
+        assert TargetRepo.select_ids(ws_id) == [a, b, c]
+        assert TargetRepo.select_ids(ws_id, tag="prod") == [a, c]
+        assert TargetRepo.select_ids(ws_id, host="*.sel.example.com") == [a, b]
+        TargetRepo.update_status(b, "done")
+        assert TargetRepo.select_ids(ws_id, status="pending", host="*.sel.*") == [a]
+
+    def test_cancel_marks_unstarted_targets(self):
+        import time, threading
+        from core.engine import Engine
+        from core.plugin import PluginConfig
+        from core.database import WorkspaceRepo, TargetRepo, JobRepo
+        self._register(delay=0.2)
+        ws_id = WorkspaceRepo.create("multi_cancel_ws")
+        ids = list(TargetRepo.bulk_add(ws_id, [f"c{i}.multi.example.com" for i in range(30)]).values())
+        finished = threading.Event()
+        engine = Engine()
+        engine.on_event(lambda evt, data: finished.set() if evt == "job_done" else None)
+        job_id = engine.run_targets(ws_id, ids, ["test.fan_out"], PluginConfig(target=""),
+                                    concurrency=2, blocking=False)
+        deadline = time.monotonic() + 10
+        while not JobRepo.progress(job_id).get("done") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        engine.cancel(job_id)
+        assert finished.wait(10)
+        progress = JobRepo.progress(job_id)
+        assert JobRepo.get(job_id)["status"] == "cancelled"
+        assert progress["total"] == 30 and progress.get("cancelled", 0) > 20
+        assert "queued" not in progress and "running" not in progress
+
+
+# ─── Shared Scheduler ─────────────────────────────────────────────────────────
+class TestScheduler:
+    @staticmethod
+    def _kind(pid, category="util", weight=1, max_parallel=0):
+        return type("Kind", (), {"id": pid, "category": category,
+                                 "weight": weight, "max_parallel": max_parallel})
+
+    @staticmethod
+    def _probe():
+        import time, threading
+        state = {"active": {}, "peak": {}, "order": [], "lock": threading.Lock()}
+
+        def task(name, *groups, delay=0.05):
+            with state["lock"]:
+                state["order"].append(name)
+                for g in groups:
+                    state["active"][g] = state["active"].get(g, 0) + 1
+                    state["peak"][g] = max(state["peak"].get(g, 0), state["active"][g])
+            time.sleep(delay)
+            with state["lock"]:
+                for g in groups:
+                    state["active"][g] -= 1
+            return name
+        return state, task
+
+    def test_weights_and_caps(self):
+        from concurrent.futures import wait
+        from core.scheduler import Scheduler
+        state, task = self._probe()
+        sched = Scheduler(slots=4, category_caps={"scan": 1})
+        nmap = self._kind("recon.nmap", "recon", weight=3, max_parallel=1)
+        light = self._kind("recon.light", "recon")
+        scan = self._kind("scan.x", "scan")
+        futs = [sched.submit(task, "nmap", "nmap", "slots3", plugin=nmap) for _ in range(3)]
+        futs += [sched.submit(task, "light", "slots1", plugin=light) for _ in range(6)]
+        futs += [sched.submit(task, "scan", "scan", plugin=scan) for _ in range(3)]
+        wait(futs, timeout=10)
+        assert all(f.result() for f in futs)
+        assert state["peak"]["nmap"] == 1 and state["peak"]["scan"] == 1
+        # one nmap (3 slots) leaves room for a single light run
+        assert state["peak"]["slots3"] + state["peak"]["slots1"] <= 4
+        assert sched.stats() == {"slots": 4, "used": 0, "queued": 0, "running": {}}
+
+    def test_heavy_run_keeps_its_place(self):
+        import threading
+        from core.scheduler import Scheduler
+        state, task = self._probe()
+        sched = Scheduler(slots=2)
+        gate = threading.Event()
+        first = sched.submit(gate.wait, 5, plugin=self._kind("a"))
+        heavy = sched.submit(task, "heavy", plugin=self._kind("heavy", weight=2))
+        light = sched.submit(task, "light", plugin=self._kind("b"))
+        assert sched.stats()["queued"] == 2        # a free slot, yet light waits
+        gate.set()
+        assert first.result(5) and heavy.result(5) and light.result(5)
+        assert state["order"] == ["heavy", "light"]
+
+    def test_job_limit_and_cancel(self):
+        import threading
+        from core.scheduler import Scheduler, parse_limits
+        sched = Scheduler(slots=4)
+        sched.limit_job(7, 1)
+        gate = threading.Event()
+        running = sched.submit(gate.wait, 5, job_id=7)
+        queued = [sched.submit(lambda: "skipped", job_id=7) for _ in range(3)]
+        assert sched.stats()["queued"] == 3
+        assert sched.cancel_job(7) == 3
+        assert [f.result(5) for f in queued] == ["skipped"] * 3
+        gate.set()
+        assert running.result(5)
+        assert parse_limits("recon.nmap=1, scan=2") == {"recon.nmap": 1, "scan": 2}
+        with pytest.raises(ValueError):
+            parse_limits("recon.nmap")
+
+    def test_jobs_share_slots(self):
+        import threading
+        from core.engine import Engine
+        from core.plugin import SROFPlugin, Finding, register, PluginCategory, PluginConfig
+        from core.database import WorkspaceRepo, TargetRepo, Target
+        state, task = self._probe()
+
+        @register
+        class SharedPlugin(SROFPlugin):
+            id = "test.shared_slot"
+            category = PluginCategory.UTIL
+
+            def run(self, config):
+                task("run", "all")
+                yield Finding(type="info", value=config.target, source=self.id)
+
+        ws_id = WorkspaceRepo.create("sched_ws")
+        tid = TargetRepo.add(Target(host="sched.example.com", workspace_id=ws_id))
+        engine = Engine(max_workers=2)
+        done = threading.Semaphore(0)
+        engine.on_event(lambda evt, data: done.release() if evt == "job_done" else None)
+        for _ in range(3):
+            engine.run(ws_id, tid, ["test.shared_slot"] * 3,
+                       PluginConfig(target="sched.example.com"), blocking=False)
+        assert all(done.acquire(timeout=10) for _ in range(3))
+        assert len(state["order"]) == 9 and state["peak"]["all"] == 2